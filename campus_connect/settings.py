@@ -3,6 +3,8 @@ Django settings for campus_connect project.
 Generated for Campus Connect - Smart Lost & Found System
 """
 
+import os
+import tempfile
 from pathlib import Path
 from decouple import config
 
@@ -168,6 +170,19 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+# Seconds an SMTP connect or reply may take before the send fails
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=30, cast=int)
+
+# Email outbox (see users/outbox.py): views queue emails and
+# `manage.py send_outbox` sends them in batches of EMAIL_OUTBOX_BATCH_SIZE,
+# at most EMAIL_OUTBOX_RATE per second (0: no limit), retrying failures after
+# EMAIL_OUTBOX_RETRY_DELAY seconds (doubling) up to EMAIL_OUTBOX_MAX_ATTEMPTS
+# times. Idle workers look for new emails every EMAIL_OUTBOX_POLL_INTERVAL.
+EMAIL_OUTBOX_BATCH_SIZE = config('EMAIL_OUTBOX_BATCH_SIZE', default=50, cast=int)
+EMAIL_OUTBOX_RATE = config('EMAIL_OUTBOX_RATE', default=1.0, cast=float)
+EMAIL_OUTBOX_RETRY_DELAY = config('EMAIL_OUTBOX_RETRY_DELAY', default=60, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
+EMAIL_OUTBOX_POLL_INTERVAL = config('EMAIL_OUTBOX_POLL_INTERVAL', default=5.0, cast=float)
 
 # Messages Framework (for flash messages)
 from django.contrib.messages import constants as messages
@@ -180,14 +195,168 @@ MESSAGE_TAGS = {
     messages.ERROR: 'error',
 }
 
-# Channels configuration (development InMemory channel layer)
-# For production, use Redis channel layer
+# Cache configuration
+# LocMemCache is per-process; point CACHE_BACKEND/CACHE_LOCATION at a
+# shared cache (e.g. django.core.cache.backends.redis.RedisCache) when
+# running more than one worker.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='campus-connect'),
+    }
+}
+
+# Backends whose entries live in one process only
+PROCESS_LOCAL_CACHES = [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+]
+SHARED_CACHE = CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+# With a shared cache, sessions and request.user come from the cache (see
+# users/backends.py): sessions are written through to the database, user
+# snapshots are dropped when a user changes and kept at most
+# USER_CACHE_TIMEOUT seconds. A per-process cache would keep logouts and
+# password changes from reaching the other workers, so database sessions
+# and the uncached backend are used instead (the users.E001/E002 checks
+# refuse cached ones on such a cache outside DEBUG).
+if SHARED_CACHE:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    AUTHENTICATION_BACKENDS = [
+        'users.backends.CachedModelBackend',
+        # Still resolves sessions that were logged in through it
+        'django.contrib.auth.backends.ModelBackend',
+    ]
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+    AUTHENTICATION_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
+USER_CACHE_TIMEOUT = config('USER_CACHE_TIMEOUT', default=300, cast=int)
+
+# Item listing counts
+# Exact counts are cached per filter combination; once the items table
+# grows past the threshold the planner's row estimate is used instead.
+ITEM_COUNT_CACHE_TIMEOUT = config('ITEM_COUNT_CACHE_TIMEOUT', default=300, cast=int)
+ITEM_COUNT_ESTIMATE_THRESHOLD = config('ITEM_COUNT_ESTIMATE_THRESHOLD', default=100000, cast=int)
+
+# Item view counting (see items/view_counter.py)
+# Views are buffered in memory and written in batches every flush interval;
+# repeat views by the same visitor inside the dedupe window are ignored.
+ITEM_VIEW_FLUSH_INTERVAL = config('ITEM_VIEW_FLUSH_INTERVAL', default=10, cast=int)
+ITEM_VIEW_MAX_PENDING = config('ITEM_VIEW_MAX_PENDING', default=1000, cast=int)
+ITEM_VIEW_DEDUPE_SECONDS = config('ITEM_VIEW_DEDUPE_SECONDS', default=1800, cast=int)
+
+# Item photo variants (see items/images.py)
+# Resized WebP/JPEG renditions are generated on this many background
+# threads after an upload; 0 generates them inline (tests, scripts).
+ITEM_IMAGE_WORKERS = config('ITEM_IMAGE_WORKERS', default=2, cast=int)
+# Seconds the list of an image's finished renditions is cached
+ITEM_VARIANT_CACHE_TIMEOUT = config('ITEM_VARIANT_CACHE_TIMEOUT', default=86400, cast=int)
+
+# Item photo uploads (see items/uploads.py)
+# Uploads are header-checked against these limits on the request; EXIF
+# stripping and rotation run in a pool of this many processes (0 = inline).
+ITEM_IMAGE_MAX_DIMENSION = config('ITEM_IMAGE_MAX_DIMENSION', default=8000, cast=int)
+ITEM_IMAGE_MAX_PIXELS = config('ITEM_IMAGE_MAX_PIXELS', default=40_000_000, cast=int)
+ITEM_UPLOAD_PROCESSES = config('ITEM_UPLOAD_PROCESSES', default=2, cast=int)
+
+# Rendered item cards (see items/cards.py); 0 disables the fragment cache
+ITEM_CARD_CACHE_TIMEOUT = config('ITEM_CARD_CACHE_TIMEOUT', default=86400, cast=int)
+
+# Channels configuration
+# The Unix socket layer (chat/layers.py) fans group messages out across
+# all worker processes on this host without an external broker. For a
+# multi-host deployment, use the Redis channel layer instead.
+# CHANNEL_SOCKET_DIR is shared by every worker process of this deployment
+# and must be private to their user (it is created with mode 0700); outside
+# DEBUG it has to be set, e.g. to /run/campus-connect/channels.
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        'BACKEND': 'chat.layers.UnixSocketChannelLayer',
+        'CONFIG': {
+            'socket_dir': config(
+                'CHANNEL_SOCKET_DIR',
+                default=os.path.join(tempfile.gettempdir(), 'campus-connect-channels') if DEBUG else '',
+            ),
+        },
     },
 }
 
+# Chat message persistence (see chat/writer.py and chat/ids.py)
+# Messages are broadcast at once and written in batches of up to
+# CHAT_WRITE_BATCH_SIZE, at least every CHAT_WRITE_FLUSH_INTERVAL seconds.
+# Worker id slots are locked in CHAT_ID_LOCK_DIR, which must be private to
+# the workers' user (created with mode 0700); outside DEBUG it has to be
+# set, e.g. to /run/campus-connect/ids.
+CHAT_WRITE_BATCH_SIZE = config('CHAT_WRITE_BATCH_SIZE', default=100, cast=int)
+CHAT_WRITE_FLUSH_INTERVAL = config('CHAT_WRITE_FLUSH_INTERVAL', default=0.05, cast=float)
+CHAT_ID_LOCK_DIR = config(
+    'CHAT_ID_LOCK_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'campus-connect-ids') if DEBUG else '',
+)
+
+# Conversation participant sets are cached (chat/membership.py) in
+# CHAT_MEMBERSHIP_CACHE (set below) for at most this many seconds.
+CHAT_MEMBERSHIP_TTL = config('CHAT_MEMBERSHIP_TTL', default=60, cast=int)
+
+# Messages per chat history window (initial thread render and each older page)
+CHAT_HISTORY_PAGE_SIZE = config('CHAT_HISTORY_PAGE_SIZE', default=50, cast=int)
+
+# Read receipts are coalesced per (user, conversation) and applied this
+# often, in seconds (see chat/receipts.py); 0 applies each one at once.
+CHAT_READ_RECEIPT_INTERVAL = config('CHAT_READ_RECEIPT_INTERVAL', default=1.0, cast=float)
+
+# Chat socket framing (see chat/framing.py and chat/server.py). Clients of
+# the binary msgpack subprotocol get the events of this many seconds in one
+# frame (0 sends each at once); CHAT_SOCKET_DEFLATE lets chat.server accept
+# permessage-deflate.
+CHAT_FRAME_BATCH_WINDOW = config('CHAT_FRAME_BATCH_WINDOW', default=0.01, cast=float)
+CHAT_SOCKET_DEFLATE = config('CHAT_SOCKET_DEFLATE', default=True, cast=bool)
+
+# Presence and typing indicators (see chat/presence.py). Changes are sent at
+# most once per conversation per tick; presence lives in the
+# CHAT_PRESENCE_CACHE cache and expires after CHAT_PRESENCE_TTL seconds
+# without a heartbeat. Every chat worker process must see the same cache:
+# the default one if it is shared, otherwise a file-based cache in
+# CHAT_PRESENCE_DIR, shared by the processes of this host like the channel
+# layer (private to their user; outside DEBUG it has to be set, e.g. to
+# /run/campus-connect/presence).
+CHAT_PRESENCE_TICK = config('CHAT_PRESENCE_TICK', default=0.5, cast=float)
+CHAT_PRESENCE_HEARTBEAT = config('CHAT_PRESENCE_HEARTBEAT', default=20, cast=int)
+CHAT_PRESENCE_TTL = config('CHAT_PRESENCE_TTL', default=60, cast=int)
+CHAT_TYPING_TIMEOUT = config('CHAT_TYPING_TIMEOUT', default=5, cast=float)
+if SHARED_CACHE:
+    CHAT_PRESENCE_CACHE = 'default'
+else:
+    CHAT_PRESENCE_CACHE = 'presence'
+    CACHES['presence'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config(
+            'CHAT_PRESENCE_DIR',
+            default=os.path.join(tempfile.gettempdir(), 'campus-connect-presence') if DEBUG else '',
+        ),
+    }
+# Participant sets must be dropped in every process at once, too
+CHAT_MEMBERSHIP_CACHE = CHAT_PRESENCE_CACHE
+
+# Chat socket flow control (see chat/limits.py). Inbound commands per second
+# (and burst) per connection and per user; outbound events queued per
+# connection, bytes written to a socket whose transport buffer is already
+# full (chat.server), and what to do with clients that don't keep up
+# ("drop" or "disconnect").
+CHAT_SEND_RATE = config('CHAT_SEND_RATE', default=5.0, cast=float)
+CHAT_SEND_BURST = config('CHAT_SEND_BURST', default=20, cast=int)
+CHAT_USER_SEND_RATE = config('CHAT_USER_SEND_RATE', default=10.0, cast=float)
+CHAT_USER_SEND_BURST = config('CHAT_USER_SEND_BURST', default=40, cast=int)
+CHAT_OUTBOUND_QUEUE_SIZE = config('CHAT_OUTBOUND_QUEUE_SIZE', default=256, cast=int)
+CHAT_SOCKET_SEND_BUFFER = config('CHAT_SOCKET_SEND_BUFFER', default=256 * 1024, cast=int)
+CHAT_SLOW_CONSUMER_POLICY = config('CHAT_SLOW_CONSUMER_POLICY', default='drop')
+
+# Cold storage (see chat/archive.py): `manage.py archive_chat_messages` moves
+# messages older than CHAT_ARCHIVE_AFTER_DAYS out of the Message table, in
+# compressed segments of up to CHAT_ARCHIVE_SEGMENT_SIZE messages.
+CHAT_ARCHIVE_AFTER_DAYS = config('CHAT_ARCHIVE_AFTER_DAYS', default=365, cast=int)
+CHAT_ARCHIVE_SEGMENT_SIZE = config('CHAT_ARCHIVE_SEGMENT_SIZE', default=500, cast=int)
+
 # Jazzmin Admin Configuration
 JAZZMIN_SETTINGS = {
     "site_title": "Campus Connect Admin",
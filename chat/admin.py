@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Conversation, Message
+from .models import ArchivedMessageSegment, Conversation, ConversationMembership, Message
 
 
 @admin.register(Conversation)
@@ -24,3 +24,19 @@ class MessageAdmin(admin.ModelAdmin):
     def short_content(self, obj):
         return (obj.content[:60] + '...') if len(obj.content) > 60 else obj.content
     short_content.short_description = 'Content'
+
+
+@admin.register(ConversationMembership)
+class ConversationMembershipAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'conversation', 'unread_count', 'last_message_preview', 'last_message_at')
+    search_fields = ('user__username', 'last_message_preview')
+    ordering = ('-last_message_at',)
+    raw_id_fields = ('user', 'conversation', 'last_message_sender')
+
+
+@admin.register(ArchivedMessageSegment)
+class ArchivedMessageSegmentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'conversation', 'first_message_id', 'last_message_id', 'message_count', 'archived_at')
+    ordering = ('-archived_at',)
+    raw_id_fields = ('conversation',)
+    exclude = ('data',)
@@ -5,3 +5,9 @@ class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat'
     verbose_name = 'Real-time Chat'
+
+    def ready(self):
+        # Register signal handlers (membership cache, etc.)
+        from . import signals  # noqa: F401
+        # Register system checks (private runtime directories)
+        from . import checks  # noqa: F401
@@ -0,0 +1,136 @@
+"""
+Cold storage for old chat messages.
+
+Messages older than CHAT_ARCHIVE_AFTER_DAYS are moved out of the Message
+table (manage.py archive_chat_messages), so the hot table, its index and
+the admin only hold recent history. Per conversation, the oldest
+messages are packed CHAT_ARCHIVE_SEGMENT_SIZE at a time into an
+ArchivedMessageSegment: msgpack rows, zlib-compressed. Each segment is
+written and its messages deleted in a transaction of its own, so locks
+are held for one small batch at a time and an interrupted run loses
+nothing.
+
+Archiving always takes a conversation's oldest messages, so archived ids
+are all lower than the hot ones and message_window() (chat.history) can
+simply continue in the archive when a history page runs out of hot rows.
+"""
+
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import msgpack
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .ids import first_id_at
+from .models import ArchivedMessageSegment, Conversation, Message
+
+User = get_user_model()
+
+UNIX_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def _pack(messages):
+    rows = [
+        # created_at in µs since the Unix epoch
+        (m.id, m.sender_id, m.content, (m.created_at - UNIX_EPOCH) // MICROSECOND, m.is_read)
+        for m in messages
+    ]
+    return zlib.compress(msgpack.packb(rows))
+
+
+def _unpack(segment):
+    """A segment's messages, oldest first (unsaved, without sender)."""
+    rows = msgpack.unpackb(zlib.decompress(segment.data))
+    return [
+        Message(
+            id=message_id,
+            conversation_id=segment.conversation_id,
+            sender_id=sender_id,
+            content=content,
+            created_at=UNIX_EPOCH + created_at * MICROSECOND,
+            is_read=is_read,
+        )
+        for message_id, sender_id, content, created_at, is_read in rows
+    ]
+
+
+def archive_conversation(conversation_id, cutoff, segment_size=None):
+    """
+    Move the conversation's messages created before `cutoff` into
+    segments of up to `segment_size` messages. Returns the number of
+    messages archived.
+    """
+    segment_size = segment_size or settings.CHAT_ARCHIVE_SEGMENT_SIZE
+    # created_at also excludes old-style ids of recent messages
+    eligible = Message.objects.filter(
+        conversation_id=conversation_id,
+        created_at__lt=cutoff,
+    ).order_by('id')
+    cutoff_id = first_id_at(cutoff)
+    if cutoff_id:
+        # Ids are time-ordered: a range on the (conversation, id) index.
+        # A cutoff before the id epoch only has old-style ids before it.
+        eligible = eligible.filter(id__lt=cutoff_id)
+    archived = 0
+    while True:
+        with transaction.atomic():
+            messages = list(eligible[:segment_size])
+            if not messages:
+                return archived
+            ArchivedMessageSegment.objects.create(
+                conversation_id=conversation_id,
+                first_message_id=messages[0].id,
+                last_message_id=messages[-1].id,
+                message_count=len(messages),
+                data=_pack(messages),
+            )
+            Message.objects.filter(pk__in=[m.id for m in messages]).delete()
+        archived += len(messages)
+
+
+def archive_messages(older_than=None, segment_size=None):
+    """
+    Archive every conversation's messages older than `older_than` (a
+    timedelta, CHAT_ARCHIVE_AFTER_DAYS by default). Yields
+    (conversation id, messages archived) for each conversation touched.
+    """
+    if older_than is None:
+        older_than = timedelta(days=settings.CHAT_ARCHIVE_AFTER_DAYS)
+    cutoff = timezone.now() - older_than
+    conversation_ids = Conversation.objects.order_by('pk').values_list('pk', flat=True)
+    for conversation_id in conversation_ids.iterator():
+        archived = archive_conversation(conversation_id, cutoff, segment_size)
+        if archived:
+            yield conversation_id, archived
+
+
+def archived_window(conversation_id, before=None, limit=None):
+    """
+    Up to `limit` archived messages older than message id `before`,
+    newest first, with their senders. Returns (messages, has_more).
+    Only the segments needed are read and decompressed.
+    """
+    if limit is None:
+        limit = settings.CHAT_HISTORY_PAGE_SIZE
+    segments = ArchivedMessageSegment.objects.filter(conversation_id=conversation_id)
+    if before is not None:
+        segments = segments.filter(first_message_id__lt=before)
+    if not limit:
+        return [], segments.exists()
+    rows = []
+    senders = {}
+    for segment in segments.order_by('-last_message_id').iterator(chunk_size=4):
+        if len(rows) > limit:
+            break
+        messages = [m for m in reversed(_unpack(segment)) if before is None or m.id < before]
+        senders.update(User.objects.in_bulk({m.sender_id for m in messages} - senders.keys()))
+        for m in messages:
+            # Messages of deleted users go with them, as in the hot table
+            if m.sender_id in senders:
+                m.sender = senders[m.sender_id]
+                rows.append(m)
+    return rows[:limit], len(rows) > limit
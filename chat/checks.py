@@ -0,0 +1,92 @@
+"""
+System checks for the chat app.
+Registered in ChatConfig.ready().
+"""
+
+import os
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from .paths import private_dir_problem
+
+
+@register(Tags.security)
+def check_socket_dir(app_configs, **kwargs):
+    """The Unix socket channel layer needs a private socket_dir."""
+    layer = settings.CHANNEL_LAYERS.get('default', {})
+    if layer.get('BACKEND') != 'chat.layers.UnixSocketChannelLayer':
+        return []
+    socket_dir = layer.get('CONFIG', {}).get('socket_dir')
+    if not socket_dir:
+        return [Error(
+            'UnixSocketChannelLayer has no socket_dir.',
+            hint='Set CHANNEL_SOCKET_DIR to a directory only the workers can use, '
+                 'e.g. /run/campus-connect/channels.',
+            id='chat.E001',
+        )]
+    if os.path.lexists(socket_dir):
+        problem = private_dir_problem(socket_dir)
+        if problem:
+            return [Error(problem, id='chat.E002')]
+    return []
+
+
+@register(Tags.security)
+def check_id_lock_dir(app_configs, **kwargs):
+    """Message id worker slots are locked in a private CHAT_ID_LOCK_DIR."""
+    lock_dir = settings.CHAT_ID_LOCK_DIR
+    if not lock_dir:
+        return [Error(
+            'CHAT_ID_LOCK_DIR is not set.',
+            hint='Set it to a directory only the workers can use, e.g. /run/campus-connect/ids.',
+            id='chat.E003',
+        )]
+    if os.path.lexists(lock_dir):
+        problem = private_dir_problem(lock_dir)
+        if problem:
+            return [Error(problem, id='chat.E004')]
+    return []
+
+
+
+@register(Tags.caches, Tags.security)
+def check_presence_cache(app_configs, **kwargs):
+    """
+    Presence keys (chat.presence) and participant sets (chat.membership)
+    must be seen by every process serving chat sockets, and a file-based
+    cache for them (which unpickles what it reads) must be private.
+    """
+    errors = []
+    for alias in dict.fromkeys([settings.CHAT_PRESENCE_CACHE, settings.CHAT_MEMBERSHIP_CACHE]):
+        errors.extend(_chat_cache_errors(alias))
+    return errors
+
+
+def _chat_cache_errors(alias):
+    cache = settings.CACHES.get(alias, {})
+    if cache.get('BACKEND') == 'django.core.cache.backends.filebased.FileBasedCache':
+        location = cache.get('LOCATION')
+        if not location:
+            return [Error(
+                f'The file-based cache {alias!r} has no location.',
+                hint='Set CHAT_PRESENCE_DIR to a directory only the workers can use, '
+                     'e.g. /run/campus-connect/presence.',
+                id='chat.E006',
+            )]
+        if os.path.lexists(location):
+            problem = private_dir_problem(location)
+            if problem:
+                return [Error(problem, id='chat.E006')]
+        return []
+    if settings.DEBUG or cache.get('BACKEND') not in settings.PROCESS_LOCAL_CACHES:
+        return []
+    if settings.CHANNEL_LAYERS.get('default', {}).get('BACKEND') == 'channels.layers.InMemoryChannelLayer':
+        # Chat only works within one process anyway
+        return []
+    return [Error(
+        f'The chat cache {alias!r} (CHAT_PRESENCE_CACHE/CHAT_MEMBERSHIP_CACHE) is per-process.',
+        hint='Use a shared cache (e.g. Redis) or a file-based one in a private directory, '
+             'or serve chat from a single process with channels.layers.InMemoryChannelLayer.',
+        id='chat.E005',
+    )]
@@ -1,60 +1,208 @@
-import json
+import asyncio
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import Conversation, Message
+from . import framing, limits
+from .ids import next_id
+from .membership import ais_member, amembers
+from .presence import online_users, presence_hub
+from .receipts import receipt_buffer
+from .writer import message_writer
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.binary = False
+        self.present = False
+        # Events waiting for the client, bounded (see chat.limits)
+        self.outbox = []
+        self.outbox_ready = asyncio.Event()
+        self.sender_task = None
+        self.dropped = 0
+        self.closing = False
+        self.throttled = False
+
     async def connect(self):
-        self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
+        self.conversation_id = int(self.scope['url_route']['kwargs']['conversation_id'])
         self.room_group_name = f"chat_{self.conversation_id}"
+        # Binary msgpack frames if the client asks for them (chat.framing)
+        self.binary = framing.SUBPROTOCOL in self.scope.get('subprotocols', [])
 
-        # Ensure user is authenticated
+        # Ensure user is authenticated and takes part in this conversation
         user = self.scope.get('user')
         if not user or not user.is_authenticated:
             await self.close()
             return
+        if not await ais_member(self.conversation_id, user.id):
+            await self.close()
+            return
+
+        # Inbound rate limits: this socket, and all of the user's sockets
+        self.bucket = limits.connection_bucket()
+        self.user_bucket = limits.user_bucket(user.id)
 
         # Join room group
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+        await self.accept(subprotocol=framing.SUBPROTOCOL if self.binary else None)
+        self.sender_task = asyncio.ensure_future(self.sender())
+        limits.consumers.add(self)
+        limits.warn_without_backpressure()
+
+        # Announced to the others on the next presence tick
+        presence_hub.connect(self.conversation_id, user.id)
+        self.present = True
+        # Who is here (and typing) right now; clients assume nobody
+        others = (await amembers(self.conversation_id)) - {user.id}
+        online = await online_users(self.conversation_id, others)
+        states = [
+            (other, other in online, presence_hub.is_typing(self.conversation_id, other))
+            for other in sorted(others)
+        ]
+        states = [state for state in states if state[1] or state[2]]
+        if states:
+            await self.forward(framing.presence_event(states))
 
     async def disconnect(self, close_code):
+        if self.sender_task is not None:
+            self.sender_task.cancel()
+        if self.present:
+            presence_hub.disconnect(self.conversation_id, self.scope['user'].id)
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        # Don't leave this connection's messages (or receipts) waiting;
+        # the flush tasks retry what fails with a database error
+        for buffer in (message_writer, receipt_buffer):
+            try:
+                await buffer.flush()
+            except Exception:
+                logger.exception('Flushing %s on disconnect failed', type(buffer).__name__)
 
     async def receive(self, text_data=None, bytes_data=None):
-        data = json.loads(text_data or '{}')
-        message = data.get('message', '').strip()
-        sender_id = self.scope['user'].id
+        if bytes_data is not None:
+            commands = framing.decode_frame(bytes_data)
+        else:
+            commands = framing.decode_json(text_data)
+        user = self.scope['user']
+        for kind, value in commands:
+            if not await self.allow():
+                continue
+            if kind == framing.READ:
+                await self.receive_read(user, value)
+            elif kind == framing.TYPING:
+                await self.receive_typing(user)
+            elif isinstance(value, str):
+                await self.receive_message(user, value)
+
+    async def allow(self):
+        """Take a token for one inbound command."""
+        if self.bucket.take() and self.user_bucket.take():
+            self.throttled = False
+            return True
+        limits.metrics['inbound_throttled'] += 1
+        if not self.throttled:
+            # Once per streak, or the notices would be the flood
+            self.throttled = True
+            retry_after = max(self.bucket.retry_after(), self.user_bucket.retry_after())
+            await self.forward(framing.throttled_event(retry_after))
+        return False
 
+    async def receive_message(self, user, message):
+        message = message.strip()
         if not message:
             return
 
-        # Persist message
-        msg = await self._save_message(self.conversation_id, sender_id, message)
+        # Participants can be removed while connected (cached, no query)
+        if not await ais_member(self.conversation_id, user.id):
+            await self.close()
+            return
+
+        # Queue for a batched write; id and timestamp are final already
+        msg = await message_writer.write(self.conversation_id, user.id, message)
+        presence_hub.stopped_typing(self.conversation_id, user.id)
+
+        # Broadcast to room, encoded once for every recipient
+        await self.channel_layer.group_send(self.room_group_name, framing.message_event(msg, user))
 
-        # Broadcast to room
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat.message',
-                'message': msg.content,
-                'sender': msg.sender.username,
-                'sender_id': msg.sender_id,
-                'created_at': msg.created_at.isoformat(),
-                'id': msg.id,
-            }
-        )
+    async def receive_read(self, user, message_id):
+        """A read receipt: "I have read up to message_id"."""
+        if not isinstance(message_id, int) or isinstance(message_id, bool) or message_id <= 0:
+            return
+        if not await ais_member(self.conversation_id, user.id):
+            await self.close()
+            return
+        # Ids are time-ordered: nobody can have read a message not sent yet
+        message_id = min(message_id, next_id())
+        # Coalesced per (user, conversation) and applied in one go
+        await receipt_buffer.acknowledge(user.id, self.conversation_id, message_id)
+
+    async def receive_typing(self, user):
+        """A keystroke; coalesced into presence updates (chat.presence)."""
+        if not await ais_member(self.conversation_id, user.id):
+            await self.close()
+            return
+        presence_hub.typing(self.conversation_id, user.id)
 
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps(event))
-
-    @database_sync_to_async
-    def _save_message(self, conversation_id, sender_id, content):
-        conv = Conversation.objects.get(pk=conversation_id)
-        msg = Message.objects.create(conversation=conv, sender_id=sender_id, content=content)
-        conv.touch()
-        return msg
+        await self.forward(event)
+
+    async def chat_read(self, event):
+        await self.forward(event)
+
+    async def chat_presence(self, event):
+        await self.forward(event)
+
+    async def forward(self, event):
+        """Queue a pre-encoded event for the client."""
+        if self.closing:
+            return
+        if len(self.outbox) >= settings.CHAT_OUTBOUND_QUEUE_SIZE:
+            await self.overflow()
+            return
+        self.outbox.append(event['packed'] if self.binary else event['json'])
+        self.outbox_ready.set()
+
+    async def overflow(self):
+        """The client doesn't keep up; apply CHAT_SLOW_CONSUMER_POLICY."""
+        if settings.CHAT_SLOW_CONSUMER_POLICY != limits.DISCONNECT:
+            limits.metrics['outbound_dropped'] += 1
+            self.dropped += 1
+            return
+        if not self.closing:
+            self.closing = True
+            limits.metrics['slow_consumer_disconnects'] += 1
+            logger.warning(
+                'Closing slow chat socket of user %s (%d events queued)',
+                self.scope['user'].id, len(self.outbox),
+            )
+            self.outbox = []
+            await self.close(code=limits.CLOSE_SLOW_CONSUMER)
+
+    async def sender(self):
+        """Write queued events to the socket, batching binary frames."""
+        while True:
+            await self.outbox_ready.wait()
+            if self.binary and settings.CHAT_FRAME_BATCH_WINDOW > 0:
+                # Binary clients get the events of a short window in one frame
+                await asyncio.sleep(settings.CHAT_FRAME_BATCH_WINDOW)
+            self.outbox_ready.clear()
+            await self.flush_outbox()
+
+    async def flush_outbox(self):
+        events, self.outbox = self.outbox, []
+        if self.dropped:
+            # Tell the client what it missed, e.g. to reload the history
+            notice = framing.overflow_event(self.dropped)
+            events.append(notice['packed'] if self.binary else notice['json'])
+            self.dropped = 0
+        if not events:
+            return
+        if self.binary:
+            await self.send(bytes_data=framing.frame(events))
+        else:
+            for text in events:
+                await self.send(text_data=text)
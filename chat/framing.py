@@ -0,0 +1,159 @@
+"""
+Wire formats of the chat socket.
+
+Two subprotocols are spoken on ws/chat/<id>/:
+
+- JSON text frames (the default, used by the thread page): one event
+  per frame, shaped like serialize_message() plus a "type" key
+  ("chat.message" or "chat.read").
+
+- "campus-chat.msgpack" (opt-in via Sec-WebSocket-Protocol): binary
+  frames holding a msgpack array of one or more events. Events are
+  arrays led by a small integer kind instead of a type string:
+
+      [MESSAGE, id, sender_id, sender, content, created_at_ms]
+      [READ, reader_id, message_id]
+      [PRESENCE, [[user_id, online, typing], ...]]
+      [THROTTLED, retry_after_ms]
+      [OVERFLOW, dropped_events]
+
+  Clients send frames of the same shape with commands:
+
+      [MESSAGE, content]
+      [READ, message_id]
+      [TYPING, true]
+
+Events are encoded once, when they are broadcast: the channel layer
+message carries both the JSON text and the msgpack bytes, and each
+consumer only forwards the form its client asked for. A msgpack array
+is its header followed by the encoded items, so a batched frame is a
+join of already-encoded events.
+"""
+
+import json
+import struct
+
+import msgpack
+
+
+SUBPROTOCOL = 'campus-chat.msgpack'
+
+# Event / command kinds
+MESSAGE = 0
+READ = 1
+PRESENCE = 2
+TYPING = 3
+THROTTLED = 4
+OVERFLOW = 5
+
+
+def _event(type, payload, packed):
+    return {
+        'type': type,
+        'json': json.dumps({'type': type, **payload}),
+        'packed': msgpack.packb(packed, use_bin_type=True),
+    }
+
+
+def message_event(message, sender):
+    """The channel layer message broadcasting a new chat message."""
+    created_at = message.created_at
+    return _event(
+        'chat.message',
+        {
+            'message': message.content,
+            'sender': sender.username,
+            'sender_id': sender.id,
+            'created_at': created_at.isoformat(),
+            'id': message.id,
+        },
+        [
+            MESSAGE, message.id, sender.id, sender.username, message.content,
+            int(created_at.timestamp() * 1000),
+        ],
+    )
+
+
+def read_event(reader_id, message_id):
+    """The channel layer message broadcasting a read receipt."""
+    return _event(
+        'chat.read',
+        {'reader_id': reader_id, 'message_id': message_id},
+        [READ, reader_id, message_id],
+    )
+
+
+def presence_event(states):
+    """The channel layer message with (user_id, online, typing) changes."""
+    return _event(
+        'chat.presence',
+        {'users': [{'id': u, 'online': online, 'typing': typing} for u, online, typing in states]},
+        [PRESENCE, [list(state) for state in states]],
+    )
+
+
+def throttled_event(retry_after):
+    """Tells one client its commands are being dropped (chat.limits)."""
+    return _event(
+        'chat.throttled',
+        {'retry_after': round(retry_after, 3)},
+        [THROTTLED, int(retry_after * 1000)],
+    )
+
+
+def overflow_event(dropped):
+    """Tells one slow client how many events it missed (chat.limits)."""
+    return _event('chat.overflow', {'dropped': dropped}, [OVERFLOW, dropped])
+
+
+def _array_header(length):
+    if length < 16:
+        return bytes([0x90 | length])
+    if length < 1 << 16:
+        return struct.pack('>BH', 0xdc, length)
+    return struct.pack('>BI', 0xdd, length)
+
+
+def frame(packed_events):
+    """One binary frame carrying several pre-encoded events."""
+    return _array_header(len(packed_events)) + b''.join(packed_events)
+
+
+def event_count(data):
+    """How many events a frame() holds, from its array header."""
+    unpacker = msgpack.Unpacker()
+    unpacker.feed(data[:5])
+    return unpacker.read_array_header()
+
+
+def decode_frame(data):
+    """
+    The (kind, value) commands in a client's binary frame. Malformed
+    frames and commands are ignored.
+    """
+    try:
+        commands = msgpack.unpackb(data, raw=False)
+    except (ValueError, msgpack.UnpackException):
+        return []
+    if not isinstance(commands, list):
+        return []
+    return [
+        (command[0], command[1])
+        for command in commands
+        if isinstance(command, list) and len(command) == 2 and command[0] in (MESSAGE, READ, TYPING)
+    ]
+
+
+def decode_json(text):
+    """The (kind, value) command in a client's JSON frame."""
+    try:
+        data = json.loads(text or '{}')
+    except ValueError:
+        return []
+    if not isinstance(data, dict):
+        return []
+    if data.get('type') == 'read':
+        return [(READ, data.get('message_id'))]
+    if data.get('type') == 'typing':
+        return [(TYPING, True)]
+    return [(MESSAGE, data.get('message', ''))]
@@ -0,0 +1,51 @@
+"""
+Windowed message history for chat threads.
+
+A thread page renders only the newest CHAT_HISTORY_PAGE_SIZE messages;
+older ones are fetched a page at a time from chat:history with
+?before=<message id>. Message ids are time-ordered (chat.ids), so
+"before id X" is a keyset condition on the (conversation, id) index and
+every page costs the same however long the conversation is.
+
+Messages moved to cold storage (chat.archive) all have lower ids than
+the hot ones, so a window that runs out of hot rows continues in the
+archive and clients page through both alike.
+"""
+
+from django.conf import settings
+
+from .archive import archived_window
+from .models import Message
+
+
+def message_window(conversation_id, before=None, limit=None):
+    """
+    Up to `limit` messages older than message id `before` (or the newest
+    ones), oldest first. Returns (messages, has_more).
+    """
+    limit = limit or settings.CHAT_HISTORY_PAGE_SIZE
+    messages = Message.objects.filter(conversation_id=conversation_id)
+    if before is not None:
+        messages = messages.filter(id__lt=before)
+    rows = list(messages.select_related('sender').order_by('-id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not has_more:
+        # Past the hot window: read through to the archive
+        archived, has_more = archived_window(
+            conversation_id, before=rows[-1].id if rows else before, limit=limit - len(rows)
+        )
+        rows.extend(archived)
+    rows.reverse()
+    return rows, has_more
+
+
+def serialize_message(message):
+    """A message in the same shape as the websocket chat.message event."""
+    return {
+        'id': message.id,
+        'message': message.content,
+        'sender': message.sender.username,
+        'sender_id': message.sender_id,
+        'created_at': message.created_at.isoformat(),
+    }
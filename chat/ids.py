@@ -0,0 +1,99 @@
+"""
+Time-ordered message ids.
+
+Messages are written in batches (chat.writer), but their id and
+timestamp are needed the moment they are broadcast. Ids are therefore
+generated in-process, snowflake style:
+
+    | 41 bits: ms since EPOCH | 4 bits: worker | 8 bits: sequence |
+
+That's 53 bits, so ids stay exact as JavaScript numbers, sort in send
+order (history pagination relies on this) and never collide across
+worker processes: each process claims one of 16 worker slots by locking
+a file in CHAT_ID_LOCK_DIR for as long as it runs. That directory must be
+private to the workers' user (see chat.paths).
+"""
+
+import fcntl
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .paths import ensure_private_dir
+
+
+# 2024-01-01T00:00:00Z in ms
+EPOCH = 1704067200000
+
+WORKER_BITS = 4
+SEQUENCE_BITS = 8
+MAX_WORKERS = 1 << WORKER_BITS
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+class IdGenerator:
+    """Generates unique, increasing 53-bit ids for one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._worker = None
+        self._lock_file = None
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _claim_worker(self):
+        """Lock the first free worker slot (again, after a fork)."""
+        lock_dir = settings.CHAT_ID_LOCK_DIR
+        if not lock_dir:
+            raise ImproperlyConfigured('CHAT_ID_LOCK_DIR is not set.')
+        ensure_private_dir(lock_dir)
+        for worker in range(MAX_WORKERS):
+            lock_file = open(os.path.join(lock_dir, f'worker-{worker}.lock'), 'w')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+            self._lock_file = lock_file
+            return worker
+        raise RuntimeError(f'All {MAX_WORKERS} message id worker slots are in use')
+
+    def next_id(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._worker = self._claim_worker()
+                self._pid = os.getpid()
+                self._last_ms = -1
+
+            now = int(time.time() * 1000) - EPOCH
+            if now < self._last_ms:
+                # Clock stepped back: keep counting from the last timestamp
+                now = self._last_ms
+            if now == self._last_ms:
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    # Sequence exhausted in this ms; borrow the next one
+                    now += 1
+                    self._sequence = 0
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (now << (WORKER_BITS + SEQUENCE_BITS)) | (self._worker << SEQUENCE_BITS) | self._sequence
+
+
+generator = IdGenerator()
+
+
+def next_id():
+    """A new message id (used as the Message.id default)."""
+    return generator.next_id()
+
+
+def first_id_at(when):
+    """The smallest id a message created at datetime `when` can have."""
+    ms = int(when.timestamp() * 1000) - EPOCH
+    return max(ms, 0) << (WORKER_BITS + SEQUENCE_BITS)
@@ -0,0 +1,136 @@
+"""
+Per-user inbox state.
+
+The inbox used to load every conversation of the user with its
+participants, and there was no cheap way to know what was unread.
+ConversationMembership keeps, per (user, conversation), the unread count,
+the last read message id and a snapshot of the last message:
+
+- join() creates the rows when participants are added (chat.signals);
+  what was said before a user joined counts as read.
+- record_messages() is called by chat.writer in the same transaction as
+  each batch insert: one UPDATE per conversation bumps the other
+  participants' unread counts and moves the snapshot forward.
+- mark_read() moves a user's read position and recounts what is left,
+  so it stays exact even while new messages are being written.
+
+The inbox is then one query on the (user, last_message_at) index (plus
+one for participant names), and the navbar badge (chat:unread_count) is
+a SUM over the same rows.
+"""
+
+from django.db.models import Case, Count, F, IntegerField, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Conversation, ConversationMembership, Message
+
+
+PREVIEW_LENGTH = ConversationMembership._meta.get_field('last_message_preview').max_length
+
+
+def _preview(content):
+    content = ' '.join(content.split())
+    if len(content) > PREVIEW_LENGTH:
+        content = content[:PREVIEW_LENGTH - 1] + '…'
+    return content
+
+
+def join(conversation_ids, user_ids):
+    """Create the memberships of some users in some conversations."""
+    rows = []
+    for conversation in Conversation.objects.filter(pk__in=conversation_ids):
+        last = conversation.messages.order_by('-id').first()
+        snapshot = {'last_message_at': conversation.last_message_at or timezone.now()}
+        if last is not None:
+            snapshot = {
+                'last_read_message_id': last.id,
+                'last_message_id': last.id,
+                'last_message_preview': _preview(last.content),
+                'last_message_sender_id': last.sender_id,
+                'last_message_at': last.created_at,
+            }
+        rows.extend(
+            ConversationMembership(user_id=user_id, conversation=conversation, **snapshot)
+            for user_id in user_ids
+        )
+    ConversationMembership.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def record_messages(messages):
+    """Count a batch of new messages into its conversations' memberships."""
+    by_conversation = {}
+    for message in messages:
+        by_conversation.setdefault(message.conversation_id, []).append(message)
+
+    for conversation_id, batch in by_conversation.items():
+        newest = max(batch, key=lambda m: m.id)
+        sent_by = {}
+        for message in batch:
+            sent_by[message.sender_id] = sent_by.get(message.sender_id, 0) + 1
+
+        # Everyone's count goes up by the batch size, minus their own messages
+        own = Case(
+            *(When(user_id=sender_id, then=Value(count)) for sender_id, count in sent_by.items()),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        # Batches from different processes may land out of order
+        newer = Q(last_message_id__lt=newest.id) | Q(last_message_id__isnull=True)
+
+        def snapshot(field, value):
+            return Case(
+                When(newer, then=Value(value)),
+                default=F(field),
+                output_field=ConversationMembership._meta.get_field(field),
+            )
+
+        ConversationMembership.objects.filter(conversation_id=conversation_id).update(
+            unread_count=F('unread_count') + len(batch) - own,
+            last_message_id=snapshot('last_message_id', newest.id),
+            last_message_preview=snapshot('last_message_preview', _preview(newest.content)),
+            last_message_sender=snapshot('last_message_sender_id', newest.sender_id),
+            last_message_at=snapshot('last_message_at', newest.created_at),
+        )
+
+
+def mark_read(user_id, conversation_id, message_id):
+    """
+    Mark a conversation read up to (and including) message_id. Returns
+    False if the user had already read that far.
+    """
+    still_unread = (
+        Message.objects.filter(conversation_id=conversation_id, id__gt=message_id)
+        .exclude(sender_id=user_id)
+        .order_by()
+        .values('conversation')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return bool(
+        ConversationMembership.objects.filter(
+            Q(last_read_message_id__lt=message_id) | Q(last_read_message_id__isnull=True),
+            user_id=user_id,
+            conversation_id=conversation_id,
+        ).update(
+            last_read_message_id=message_id,
+            unread_count=Coalesce(Subquery(still_unread), 0),
+        )
+    )
+
+
+def unread_total(user_id):
+    """Unread messages across all of a user's conversations."""
+    return ConversationMembership.objects.filter(user_id=user_id).aggregate(
+        total=Coalesce(Sum('unread_count'), 0)
+    )['total']
+
+
+def inbox_for(user):
+    """A user's memberships, most recent conversation first."""
+    return (
+        ConversationMembership.objects.filter(user=user)
+        .select_related('conversation', 'last_message_sender')
+        .prefetch_related('conversation__participants')
+        .order_by('-last_message_at')
+    )
@@ -0,0 +1,308 @@
+"""
+A channel layer for several worker processes on one host, without Redis.
+
+InMemoryChannelLayer only reaches consumers in its own process, so chat
+breaks as soon as two daphne workers serve one conversation. This layer
+keeps InMemoryChannelLayer's queues, groups and expiry rules for the
+channels of its own process and connects the processes of a host with
+Unix datagram sockets in a shared directory (socket_dir):
+
+- Every receiving process binds <socket_dir>/<token>.sock, and its specific
+  channel names carry that token ("specific.uds<token>!abc..."), so a
+  send() to another process's channel is one datagram to its socket.
+- Group membership is kept by the process that owns the channel
+  (group_add/group_discard for a remote channel are forwarded to it),
+  with the usual group_expiry. group_send() delivers to local members
+  and sends one datagram per peer process, which delivers to its own
+  members. Peers are discovered by listing socket_dir; sockets of dead
+  processes are removed on the first failed send.
+
+socket_dir must be private to the user the workers run as (see
+chat.paths): it is created with mode 0700, and the layer refuses to
+start if it belongs to someone else or others can get in.
+
+Messages are msgpack-encoded (like channels_redis), so they must hold
+only msgpack types and fit in max_message_size. Normal channels (without
+"!") stay process-local, as with InMemoryChannelLayer.
+
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'chat.layers.UnixSocketChannelLayer',
+            'CONFIG': {'socket_dir': '/run/campus-connect/channels'},
+        },
+    }
+"""
+
+import asyncio
+import atexit
+import os
+import random
+import socket
+import string
+import time
+from copy import deepcopy
+
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+from django.core.exceptions import ImproperlyConfigured
+
+from .paths import ensure_private_dir
+
+
+# Datagram kinds
+SEND = 's'
+GROUP_SEND = 'g'
+GROUP_ADD = 'a'
+GROUP_DISCARD = 'd'
+
+TOKEN_PREFIX = 'uds'
+
+
+def _random_string(length):
+    return ''.join(random.choice(string.ascii_letters) for _ in range(length))
+
+
+class UnixSocketChannelLayer(InMemoryChannelLayer):
+    """InMemoryChannelLayer fanned out across local processes."""
+
+    def __init__(
+        self,
+        socket_dir=None,
+        send_timeout=1.0,
+        peer_refresh=1.0,
+        max_message_size=64 * 1024,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        if not socket_dir:
+            raise ImproperlyConfigured('UnixSocketChannelLayer needs a socket_dir.')
+        self.socket_dir = str(socket_dir)
+        self.send_timeout = send_timeout
+        self.peer_refresh = peer_refresh
+        self.max_message_size = max_message_size
+        self._pid = None
+        self._sock = None
+        self._listener = None
+        self._reader_loop = None
+        self._peers = []
+        self._peers_listed_at = 0.0
+
+    # Process socket
+
+    @property
+    def token(self):
+        self._bind()
+        return self._token
+
+    def _path(self, token):
+        return os.path.join(self.socket_dir, f'{token}.sock')
+
+    def _bind(self):
+        """Set up this process's token and send socket (again, after a fork)."""
+        if self._pid == os.getpid():
+            return
+        ensure_private_dir(self.socket_dir)
+        self._pid = os.getpid()
+        self._token = f'{TOKEN_PREFIX}{self._pid}{_random_string(6)}'
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        self._listener = None
+        self._reader_loop = None
+        self._peers_listed_at = 0.0
+
+    def _listen(self):
+        """
+        Bind this process's socket. Only processes that receive do this,
+        so send-only processes (e.g. WSGI workers) are never peers.
+        """
+        self._bind()
+        if self._listener is None:
+            path = self._path(self._token)
+            self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._listener.setblocking(False)
+            self._listener.bind(path)
+            atexit.register(self._unlink, path)
+        return self._listener
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _ensure_reader(self):
+        """Read incoming datagrams on the running event loop."""
+        listener = self._listen()
+        loop = asyncio.get_running_loop()
+        if self._reader_loop is loop:
+            return
+        if self._reader_loop is not None and not self._reader_loop.is_closed():
+            # Still served by the loop that started receiving
+            return
+        loop.add_reader(listener.fileno(), self._on_readable)
+        self._reader_loop = loop
+
+    def _owner(self, channel):
+        """The token of the process owning a specific channel, else None."""
+        if '!' not in channel:
+            return None
+        token = channel[:channel.index('!')].rsplit('.', 1)[-1]
+        return token if token.startswith(TOKEN_PREFIX) else None
+
+    def _is_local(self, channel):
+        owner = self._owner(channel)
+        return owner is None or owner == self.token
+
+    def _list_peers(self):
+        now = time.monotonic()
+        if now - self._peers_listed_at > self.peer_refresh:
+            own = f'{self.token}.sock'
+            self._peers = [
+                entry.name[:-len('.sock')]
+                for entry in os.scandir(self.socket_dir)
+                if entry.name.endswith('.sock') and entry.name != own
+            ]
+            self._peers_listed_at = now
+        return self._peers
+
+    # Datagrams
+
+    def _encode(self, kind, name, payload):
+        data = msgpack.packb([kind, name, payload], use_bin_type=True)
+        if len(data) > self.max_message_size:
+            raise ValueError(
+                f'Channel message of {len(data)} bytes exceeds max_message_size'
+            )
+        return data
+
+    async def _send_datagram(self, token, data):
+        """
+        Send one datagram to a peer process. Returns False if the peer is
+        gone or stayed full for send_timeout.
+        """
+        path = self._path(token)
+        deadline = time.monotonic() + self.send_timeout
+        delay = 0.0005
+        while True:
+            try:
+                self._sock.sendto(data, path)
+                return True
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The process exited without cleaning up
+                self._unlink(path)
+                if token in self._peers:
+                    self._peers.remove(token)
+                return False
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    return False
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+
+    def _on_readable(self):
+        while True:
+            try:
+                data = self._listener.recv(self.max_message_size + 1)
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                kind, name, payload = msgpack.unpackb(data, raw=False)
+            except (ValueError, msgpack.UnpackException):
+                continue
+            if kind == SEND:
+                try:
+                    self._deliver(name, payload)
+                except ChannelFull:
+                    pass
+            elif kind == GROUP_SEND:
+                self._deliver_group(name, payload)
+            elif kind == GROUP_ADD:
+                self.groups.setdefault(name, {})[payload] = time.time()
+            elif kind == GROUP_DISCARD:
+                self._discard_local(name, payload)
+
+    # Local delivery
+
+    def _deliver(self, channel, message):
+        queue = self.channels.setdefault(
+            channel, asyncio.Queue(maxsize=self.get_capacity(channel))
+        )
+        try:
+            queue.put_nowait((time.time() + self.expiry, deepcopy(message)))
+        except asyncio.QueueFull:
+            raise ChannelFull(channel)
+
+    def _deliver_group(self, group, message):
+        self._clean_expired()
+        for channel in list(self.groups.get(group, {})):
+            try:
+                self._deliver(channel, message)
+            except ChannelFull:
+                pass
+
+    def _discard_local(self, group, channel):
+        group_channels = self.groups.get(group)
+        if group_channels:
+            group_channels.pop(channel, None)
+            if not group_channels:
+                self.groups.pop(group, None)
+
+    # Channel layer API
+
+    async def new_channel(self, prefix='specific.'):
+        self._ensure_reader()
+        return f'{prefix}.{self.token}!{_random_string(12)}'
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        assert '__asgi_channel__' not in message
+        if self._is_local(channel):
+            self._deliver(channel, message)
+            return
+        data = self._encode(SEND, channel, message)
+        if not await self._send_datagram(self._owner(channel), data):
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self._ensure_reader()
+        return await super().receive(channel)
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        if self._is_local(channel):
+            self.groups.setdefault(group, {})[channel] = time.time()
+        else:
+            await self._send_datagram(
+                self._owner(channel), self._encode(GROUP_ADD, group, channel)
+            )
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        if self._is_local(channel):
+            self._discard_local(group, channel)
+        else:
+            await self._send_datagram(
+                self._owner(channel), self._encode(GROUP_DISCARD, group, channel)
+            )
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        self.require_valid_group_name(group)
+        data = self._encode(GROUP_SEND, group, message)
+        self._deliver_group(group, message)
+        peers = self._list_peers()
+        if peers:
+            await asyncio.gather(*(self._send_datagram(peer, data) for peer in peers))
+
+    async def close(self):
+        if self._reader_loop is not None and not self._reader_loop.is_closed():
+            try:
+                self._reader_loop.remove_reader(self._listener.fileno())
+            except RuntimeError:
+                pass
+        self._reader_loop = None
@@ -0,0 +1,122 @@
+"""
+Flow control for chat sockets.
+
+Inbound: every command a client sends (message, read receipt, typing)
+takes a token from two buckets, one for the connection and one shared
+by all of the user's connections in this process, so neither a
+spamming tab nor many tabs can flood the worker or the message writer.
+Commands over the limit are dropped and the client is told once per
+streak (chat.throttled).
+
+Outbound: each ChatConsumer queues at most CHAT_OUTBOUND_QUEUE_SIZE
+events for its client, and the socket under it (chat.server) buffers at
+most CHAT_SOCKET_SEND_BUFFER bytes beyond what its transport holds. When
+a slow reader fills either, CHAT_SLOW_CONSUMER_POLICY decides: "drop"
+discards further events and tells the client how many it missed once it
+catches up (chat.overflow), "disconnect" closes the socket (with
+CLOSE_SLOW_CONSUMER, or aborts it if the socket itself is full).
+The socket limit needs `python -m chat.server`: under plain daphne or
+runserver only the consumer's queue applies, and the first chat socket
+of the process logs a warning about it.
+
+Counters and the current queue depths of this process are available as
+JSON to staff at chat:metrics.
+"""
+
+import logging
+import os
+import time
+import weakref
+from collections import Counter
+
+from django.conf import settings
+
+
+# Application close code for slow readers (4000-4999 are free to use)
+CLOSE_SLOW_CONSUMER = 4008
+
+DROP = 'drop'
+DISCONNECT = 'disconnect'
+
+logger = logging.getLogger(__name__)
+
+# Process-wide counters: inbound_throttled, outbound_dropped,
+# slow_consumer_disconnects, ...
+metrics = Counter()
+
+# Open consumers, for queue depth gauges
+consumers = weakref.WeakSet()
+
+# Set by chat.server, whose sockets enforce CHAT_SOCKET_SEND_BUFFER
+socket_backpressure = False
+_warned_no_backpressure = False
+
+_user_buckets = weakref.WeakValueDictionary()
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def retry_after(self):
+        """Seconds until the next token."""
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+def connection_bucket():
+    return TokenBucket(settings.CHAT_SEND_RATE, settings.CHAT_SEND_BURST)
+
+
+def user_bucket(user_id):
+    """
+    The bucket shared by a user's connections. Consumers hold a
+    reference; it goes away with the user's last connection.
+    """
+    bucket = _user_buckets.get(user_id)
+    if bucket is None:
+        bucket = _user_buckets[user_id] = TokenBucket(
+            settings.CHAT_USER_SEND_RATE, settings.CHAT_USER_SEND_BURST
+        )
+    return bucket
+
+
+def warn_without_backpressure():
+    """Log once per process if sockets aren't served by chat.server."""
+    global _warned_no_backpressure
+    if socket_backpressure or _warned_no_backpressure:
+        return
+    _warned_no_backpressure = True
+    logger.warning(
+        'Chat sockets are not served by `python -m chat.server`: '
+        'CHAT_SOCKET_SEND_BUFFER is not enforced and CHAT_SLOW_CONSUMER_POLICY (%r) '
+        'only applies to the outbound queue.', settings.CHAT_SLOW_CONSUMER_POLICY,
+    )
+
+
+def snapshot():
+    """This process's counters and outbound queue gauges."""
+    depths = [len(consumer.outbox) for consumer in list(consumers)]
+    return {
+        'pid': os.getpid(),
+        'connections': len(depths),
+        'outbound_queued': sum(depths),
+        'outbound_queue_max': max(depths, default=0),
+        'outbound_queue_limit': settings.CHAT_OUTBOUND_QUEUE_SIZE,
+        'slow_consumer_policy': settings.CHAT_SLOW_CONSUMER_POLICY,
+        'socket_backpressure': socket_backpressure,
+        **metrics,
+    }
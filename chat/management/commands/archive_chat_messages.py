@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chat.archive import archive_messages
+
+
+class Command(BaseCommand):
+    help = (
+        'Move chat messages older than CHAT_ARCHIVE_AFTER_DAYS into '
+        'compressed archive segments, one short transaction per segment.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHAT_ARCHIVE_AFTER_DAYS,
+                            help='Archive messages older than this many days.')
+        parser.add_argument('--segment-size', type=int, default=settings.CHAT_ARCHIVE_SEGMENT_SIZE,
+                            help='Messages per segment, i.e. per transaction.')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        conversations = messages = 0
+        for conversation_id, archived in archive_messages(
+            timedelta(days=options['days']), options['segment_size']
+        ):
+            conversations += 1
+            messages += archived
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Conversation {conversation_id}: {archived} messages')
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {messages} messages of {conversations} conversations '
+            f'in {time.monotonic() - start:.1f}s.'
+        ))
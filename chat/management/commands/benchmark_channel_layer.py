@@ -0,0 +1,82 @@
+import asyncio
+import multiprocessing
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.layers import UnixSocketChannelLayer
+
+
+GROUP = 'benchmark'
+
+
+def _receiver(socket_dir, messages, ready, results):
+    """Worker process: join the group and time every delivery."""
+    async def run():
+        layer = UnixSocketChannelLayer(socket_dir=socket_dir, capacity=messages)
+        channel = await layer.new_channel()
+        await layer.group_add(GROUP, channel)
+        ready.put(channel)
+        latencies = []
+        for _ in range(messages):
+            message = await layer.receive(channel)
+            latencies.append(time.time() - message['sent'])
+        results.put((latencies, time.time()))
+
+    asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure group_send throughput and latency of the Unix socket '
+        'channel layer as the number of worker processes grows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+        parser.add_argument('--messages', type=int, default=2000,
+                            help='group_send calls per run (default 2000).')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"workers":>7}  {"deliveries/s":>12}  {"p50 ms":>8}  {"p99 ms":>8}'
+        )
+        for workers in options['workers']:
+            rate, p50, p99 = self.run(workers, options['messages'])
+            self.stdout.write(f'{workers:>7}  {rate:>12.0f}  {p50:>8.2f}  {p99:>8.2f}')
+
+    def run(self, workers, messages):
+        context = multiprocessing.get_context('fork')
+        ready, results = context.Queue(), context.Queue()
+        with tempfile.TemporaryDirectory() as socket_dir:
+            processes = [
+                context.Process(target=_receiver, args=(socket_dir, messages, ready, results))
+                for _ in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            for _ in processes:
+                ready.get()
+
+            async def send():
+                layer = UnixSocketChannelLayer(socket_dir=socket_dir)
+                for i in range(messages):
+                    await layer.group_send(GROUP, {'type': 'bench', 'seq': i, 'sent': time.time()})
+
+            start = time.time()
+            asyncio.run(send())
+            latencies = []
+            finished = start
+            for _ in processes:
+                worker_latencies, done = results.get()
+                latencies.extend(worker_latencies)
+                finished = max(finished, done)
+            for process in processes:
+                process.join()
+
+        latencies.sort()
+        rate = len(latencies) / (finished - start)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        return rate, statistics.median(latencies) * 1000, p99 * 1000
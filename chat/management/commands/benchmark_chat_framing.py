@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+import zlib
+from types import SimpleNamespace
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat import framing
+from chat.consumers import ChatConsumer
+from chat.ids import next_id
+from chat.models import Message
+
+
+GROUP = 'benchmark'
+
+MODES = ('json per recipient', 'json', 'json + deflate', 'msgpack', 'msgpack + deflate')
+
+
+class PerRecipientJSONConsumer(ChatConsumer):
+    """The previous chat_message: one json.dumps() per recipient."""
+
+    async def chat_message(self, event):
+        await self.send(text_data=json.dumps(event))
+
+
+def legacy_event(message, sender):
+    return {
+        'type': 'chat.message',
+        'message': message.content,
+        'sender': sender.username,
+        'sender_id': sender.id,
+        'created_at': message.created_at.isoformat(),
+        'id': message.id,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare CPU time and bytes per delivered chat message for the '
+        'JSON and binary msgpack socket protocols, with and without '
+        'permessage-deflate style compression.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=50,
+                            help='Consumers in the conversation group (default 50).')
+        parser.add_argument('--messages', type=int, default=500)
+        parser.add_argument('--batch', type=int, default=10,
+                            help='Messages per binary frame (default 10).')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"mode":<20}  {"CPU us/delivery":>15}  {"bytes/delivery":>14}  {"frames/delivery":>15}'
+        )
+        for mode in MODES:
+            cpu, size, frames = asyncio.run(
+                self.run(mode, options['recipients'], options['messages'], options['batch'])
+            )
+            self.stdout.write(f'{mode:<20}  {cpu:>15.2f}  {size:>14.1f}  {frames:>15.2f}')
+
+    async def run(self, mode, recipients, messages, batch):
+        layer = InMemoryChannelLayer(capacity=messages + 1)
+        sender = SimpleNamespace(id=1, username='benchmark-user')
+        sent_bytes = frames = 0
+
+        def sink(deflate):
+            compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+
+            async def send(message):
+                nonlocal sent_bytes, frames
+                data = message.get('bytes') or message['text'].encode()
+                if deflate:
+                    # permessage-deflate with context takeover
+                    data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)[:-4]
+                sent_bytes += len(data)
+                frames += 1
+            return send
+
+        consumer_class = PerRecipientJSONConsumer if mode == 'json per recipient' else ChatConsumer
+        consumers = []
+        for _ in range(recipients):
+            consumer = consumer_class()
+            consumer.binary = mode.startswith('msgpack')
+            consumer.base_send = sink(mode.endswith('deflate'))
+            channel = await layer.new_channel()
+            await layer.group_add(GROUP, channel)
+            consumers.append((consumer, channel))
+
+        # Without a sender task, outboxes are flushed every `batch` messages
+        start = time.process_time()
+        for i in range(messages):
+            message = Message(
+                id=next_id(),
+                content=f'Is the blue umbrella still at the library desk? ({i})',
+                created_at=timezone.now(),
+            )
+            if mode == 'json per recipient':
+                event = legacy_event(message, sender)
+            else:
+                event = framing.message_event(message, sender)
+            await layer.group_send(GROUP, event)
+            for consumer, channel in consumers:
+                # The handler dispatch() would call, without its
+                # per-event database connection check (same in all modes)
+                await consumer.chat_message(await layer.receive(channel))
+            if (i + 1) % batch == 0 or i + 1 == messages:
+                for consumer, _ in consumers:
+                    await consumer.flush_outbox()
+        elapsed = time.process_time() - start
+
+        deliveries = recipients * messages
+        return elapsed * 1e6 / deliveries, sent_bytes / deliveries, frames / deliveries
@@ -0,0 +1,304 @@
+import asyncio
+import json
+import random
+import resource
+import statistics
+import threading
+import time
+import uuid
+
+import msgpack
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from campus_connect.asgi import application
+from chat import framing, limits
+from chat.models import Conversation
+
+User = get_user_model()
+
+
+class QueryCounter:
+    """Counts queries on every database connection, in every thread."""
+
+    def __init__(self):
+        self.count = 0
+        self.enabled = False
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.enabled:
+            with self._lock:
+                self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+def percentiles(values):
+    """p50/p95/p99/max of `values` seconds, in ms."""
+    if len(values) < 2:
+        values = values * 2 or [0.0, 0.0]
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return {
+        'p50': round(cuts[49] * 1000, 3),
+        'p95': round(cuts[94] * 1000, 3),
+        'p99': round(cuts[98] * 1000, 3),
+        'max': round(max(values) * 1000, 3),
+    }
+
+
+class Client:
+    """One simulated user with an open chat socket."""
+
+    def __init__(self, user, conversation_id, cookie, binary):
+        self.user = user
+        self.conversation_id = conversation_id
+        self.binary = binary
+        self.communicator = WebsocketCommunicator(
+            application,
+            f'/ws/chat/{conversation_id}/',
+            headers=[(b'cookie', cookie.encode())],
+            subprotocols=[framing.SUBPROTOCOL] if binary else None,
+        )
+        self.sent = 0
+        # Own messages echoed back, i.e. accepted by the server
+        self.accepted = 0
+
+    async def connect(self):
+        start = time.perf_counter()
+        connected, _ = await self.communicator.connect(timeout=30)
+        if not connected:
+            raise CommandError(f'Socket of {self.user.username} was refused')
+        return time.perf_counter() - start
+
+    async def send(self, content):
+        if self.binary:
+            await self.communicator.send_to(
+                bytes_data=msgpack.packb([[framing.MESSAGE, content]], use_bin_type=True)
+            )
+        else:
+            await self.communicator.send_to(text_data=json.dumps({'message': content}))
+        self.sent += 1
+
+    def messages(self, output):
+        """(sender id, content) of the chat messages in one socket message."""
+        if self.binary:
+            for event in msgpack.unpackb(output['bytes'], raw=False):
+                if event[0] == framing.MESSAGE:
+                    yield event[2], event[4]
+        else:
+            event = json.loads(output['text'])
+            if event['type'] == 'chat.message':
+                yield event['sender_id'], event['message']
+
+    async def read(self, sent_at, latencies):
+        """Record the delivery latency of every message of another client."""
+        while True:
+            output = await self.communicator.output_queue.get()
+            if output['type'] != 'websocket.send':
+                return
+            received_at = time.perf_counter()
+            for sender_id, content in self.messages(output):
+                if content not in sent_at:
+                    continue
+                if sender_id == self.user.pk:
+                    self.accepted += 1
+                else:
+                    latencies.append(received_at - sent_at[content])
+
+    async def chat(self, rate, deadline, sent_at):
+        """Send messages at `rate` per second (Poisson) until `deadline`."""
+        while True:
+            await asyncio.sleep(min(random.expovariate(rate), max(deadline - time.perf_counter(), 0)))
+            if time.perf_counter() >= deadline:
+                return
+            content = f'load test {uuid.uuid4().hex}'
+            sent_at[content] = time.perf_counter()
+            await self.send(content)
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the chat stack (campus_connect.asgi.application, ChatConsumer, '
+        'the channel layer and the database) in-process with simulated '
+        'clients, and report connect time, delivery latency, throughput, '
+        'queries per message and peak RSS as JSON. Creates its own users '
+        'and conversations and deletes them afterwards. Inbound rate limits '
+        '(CHAT_SEND_RATE, ...) apply: throttled commands are counted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=50, help='Simulated users (default 50).')
+        parser.add_argument('--conversations', type=int, default=10,
+                            help='Clients are spread over this many conversations (default 10).')
+        parser.add_argument('--rate', type=float, default=1.0,
+                            help='Messages per second per client (default 1).')
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help='Seconds of sending (default 10).')
+        parser.add_argument('--binary', action='store_true',
+                            help='Use the msgpack subprotocol instead of JSON.')
+        parser.add_argument('--output', default='loadtest_chat.json',
+                            help='Where to write the JSON results (default loadtest_chat.json).')
+
+    def handle(self, *args, **options):
+        if options['clients'] < 1 or options['conversations'] < 1:
+            raise CommandError('--clients and --conversations must be positive.')
+        if options['rate'] <= 0 or options['duration'] <= 0:
+            raise CommandError('--rate and --duration must be positive.')
+        conversations = min(options['conversations'], options['clients'])
+        run_id = uuid.uuid4().hex[:8]
+        started_at = timezone.now()
+        users, conversation_ids, cookies = self.setup(run_id, options['clients'], conversations)
+        session_store = import_string(settings.SESSION_ENGINE + '.SessionStore')
+
+        counter = QueryCounter()
+        connection_created.connect(counter.install)
+        for conn in connections.all(initialized_only=True):
+            counter.install(connection=conn)
+        try:
+            results = asyncio.run(self.run(users, conversation_ids, cookies, counter, options))
+        finally:
+            connection_created.disconnect(counter.install)
+            for conn in connections.all(initialized_only=True):
+                if counter in conn.execute_wrappers:
+                    conn.execute_wrappers.remove(counter)
+            for cookie in cookies:
+                session_store(session_key=cookie.split('=', 1)[1]).delete()
+            Conversation.objects.filter(pk__in=conversation_ids).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        results.update({
+            'run_id': run_id,
+            'started_at': started_at.isoformat(),
+            'database': connection.vendor,
+            'channel_layer': settings.CHANNEL_LAYERS['default']['BACKEND'],
+            'config': {
+                'clients': options['clients'],
+                'conversations': conversations,
+                'rate': options['rate'],
+                'duration': options['duration'],
+                'protocol': 'msgpack' if options['binary'] else 'json',
+                'write_batch_size': settings.CHAT_WRITE_BATCH_SIZE,
+                'write_flush_interval': settings.CHAT_WRITE_FLUSH_INTERVAL,
+                'send_rate_limit': settings.CHAT_SEND_RATE,
+            },
+        })
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+
+        self.stdout.write(
+            f'connect p50/p95/p99   {results["connect_ms"]["p50"]:.1f} / '
+            f'{results["connect_ms"]["p95"]:.1f} / {results["connect_ms"]["p99"]:.1f} ms'
+        )
+        self.stdout.write(
+            f'latency p50/p95/p99   {results["latency_ms"]["p50"]:.1f} / '
+            f'{results["latency_ms"]["p95"]:.1f} / {results["latency_ms"]["p99"]:.1f} ms'
+        )
+        self.stdout.write(
+            f'messages              {results["messages_sent"]} sent, {results["messages_accepted"]} accepted, '
+            f'{results["messages_per_second"]:.1f}/s, '
+            f'{results["deliveries"]}/{results["expected_deliveries"]} delivered, '
+            f'{results["throttled"]} throttled'
+        )
+        self.stdout.write(f'db queries/message    {results["db_queries_per_message"]:.2f}')
+        self.stdout.write(f'peak RSS              {results["peak_rss_mb"]:.1f} MB')
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    def setup(self, run_id, clients, conversations):
+        """Users, conversations and session cookies for the clients."""
+        User.objects.bulk_create([
+            User(
+                username=f'loadtest-{run_id}-{i}',
+                email=f'loadtest-{run_id}-{i}@example.com',
+                password='!',  # unusable; clients log in with a session
+            )
+            for i in range(clients)
+        ])
+        users = list(User.objects.filter(username__startswith=f'loadtest-{run_id}-').order_by('pk'))
+        conversation_ids = []
+        for c in range(conversations):
+            conversation = Conversation.objects.create(last_message_at=timezone.now())
+            conversation.participants.add(*users[c::conversations])
+            conversation_ids.append(conversation.pk)
+
+        session_store = import_string(settings.SESSION_ENGINE + '.SessionStore')
+        cookies = []
+        for user in users:
+            session = session_store()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.save()
+            cookies.append(f'{settings.SESSION_COOKIE_NAME}={session.session_key}')
+        return users, conversation_ids, cookies
+
+    async def run(self, users, conversation_ids, cookies, counter, options):
+        clients = [
+            Client(user, conversation_ids[i % len(conversation_ids)], cookies[i], options['binary'])
+            for i, user in enumerate(users)
+        ]
+        connect_times = await asyncio.gather(*(client.connect() for client in clients))
+
+        sent_at = {}
+        latencies = []
+        readers = [asyncio.ensure_future(client.read(sent_at, latencies)) for client in clients]
+
+        counter.enabled = True
+        throttled = limits.metrics['inbound_throttled']
+        start = time.perf_counter()
+        deadline = start + options['duration']
+        await asyncio.gather(*(client.chat(options['rate'], deadline, sent_at) for client in clients))
+        elapsed = time.perf_counter() - start
+
+        # Let the deliveries in flight arrive
+        members = {cid: 0 for cid in conversation_ids}
+        for client in clients:
+            members[client.conversation_id] += 1
+
+        def expected():
+            return sum(client.accepted * (members[client.conversation_id] - 1) for client in clients)
+
+        def pending():
+            sent = sum(client.sent for client in clients)
+            accepted = sum(client.accepted for client in clients)
+            dropped = limits.metrics['inbound_throttled'] - throttled
+            return accepted + dropped < sent or len(latencies) < expected()
+
+        drain_until = time.perf_counter() + 10
+        while pending() and time.perf_counter() < drain_until:
+            await asyncio.sleep(0.05)
+
+        for reader in readers:
+            reader.cancel()
+        # Disconnecting flushes the message writer; those writes count too
+        await asyncio.gather(*(client.communicator.disconnect() for client in clients))
+        counter.enabled = False
+
+        sent = sum(client.sent for client in clients)
+        accepted = sum(client.accepted for client in clients)
+        # ru_maxrss is in KB on Linux
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return {
+            'connect_ms': percentiles(list(connect_times)),
+            'latency_ms': percentiles(latencies),
+            'elapsed': round(elapsed, 3),
+            'messages_sent': sent,
+            'messages_accepted': accepted,
+            'messages_per_second': round(accepted / elapsed, 1),
+            'deliveries': len(latencies),
+            'expected_deliveries': expected(),
+            'deliveries_per_second': round(len(latencies) / elapsed, 1),
+            'throttled': limits.metrics['inbound_throttled'] - throttled,
+            'db_queries': counter.count,
+            'db_queries_per_message': round(counter.count / max(accepted, 1), 3),
+            'peak_rss_mb': round(peak_rss, 1),
+        }
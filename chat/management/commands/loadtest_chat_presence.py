@@ -0,0 +1,78 @@
+import asyncio
+import random
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from chat.presence import PresenceHub
+
+
+class CountingChannelLayer(InMemoryChannelLayer):
+    """Counts group_send() calls, i.e. channel layer messages."""
+
+    group_sends = 0
+
+    async def group_send(self, group, message):
+        CountingChannelLayer.group_sends += 1
+        await super().group_send(group, message)
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate typing in many conversations and count the channel layer '
+        'messages sent by the presence hub, against one per keystroke.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversations', type=int, default=20)
+        parser.add_argument('--users', type=int, default=4,
+                            help='Typing users per conversation (default 4).')
+        parser.add_argument('--rates', type=float, nargs='+', default=[1, 5, 20, 100],
+                            help='Keystrokes per second per user.')
+        parser.add_argument('--duration', type=float, default=3.0, help='Seconds per run.')
+
+    def handle(self, *args, **options):
+        layers = {'default': {'BACKEND': f'{__name__}.CountingChannelLayer'}}
+        self.stdout.write(
+            f'{"keys/s/user":>11}  {"keystrokes":>10}  {"layer msgs":>10}  {"bound":>6}  {"msgs/s":>7}'
+        )
+        with override_settings(CHANNEL_LAYERS=layers):
+            for rate in options['rates']:
+                keystrokes = asyncio.run(self.run(
+                    rate, options['conversations'], options['users'], options['duration']
+                ))
+                sent = CountingChannelLayer.group_sends
+                # One update per conversation per tick (+ the final offline one)
+                ticks = options['duration'] / settings.CHAT_PRESENCE_TICK + 2
+                bound = int(options['conversations'] * ticks)
+                self.stdout.write(
+                    f'{rate:>11g}  {keystrokes:>10}  {sent:>10}  {bound:>6}  '
+                    f'{sent / options["duration"]:>7.1f}'
+                )
+
+    async def run(self, rate, conversations, users, duration):
+        CountingChannelLayer.group_sends = 0
+        hub = PresenceHub()
+        keystrokes = 0
+        deadline = time.monotonic() + duration
+
+        async def type_away(conversation_id, user_id):
+            nonlocal keystrokes
+            hub.connect(conversation_id, user_id)
+            while time.monotonic() < deadline:
+                await asyncio.sleep(random.expovariate(rate))
+                hub.typing(conversation_id, user_id)
+                keystrokes += 1
+            hub.disconnect(conversation_id, user_id)
+
+        await asyncio.gather(*(
+            type_away(conversation_id, user_id)
+            for conversation_id in range(1, conversations + 1)
+            for user_id in range(1, users + 1)
+        ))
+        # Let the final (offline) updates go out
+        await hub.tick()
+        return keystrokes
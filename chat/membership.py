@@ -0,0 +1,95 @@
+"""
+Cached conversation membership.
+
+Both the websocket consumer (on connect and on every message) and the
+thread view need "is this user a participant of this conversation?".
+The participant id set of each conversation is loaded once and kept in
+the CHAT_MEMBERSHIP_CACHE cache, which every chat process shares (like
+presence, see chat.presence), so the check is one cache read and no
+query.
+
+Entries are dropped through m2m_changed on Conversation.participants
+and post_delete on Conversation (chat.signals), and again once the
+transaction commits, since another thread may load the old participants
+before then. As the cache is shared, a participant removed through one
+process can't keep posting through another. invalidate() without ids
+bumps a generation number stored next to the entries, which retires all
+of them at once.
+"""
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Conversation
+
+
+Participant = Conversation.participants.through
+
+GENERATION_KEY = 'chat-members-generation'
+
+
+def members_key(conversation_id):
+    return f'chat-members:{conversation_id}'
+
+
+def membership_cache():
+    return caches[settings.CHAT_MEMBERSHIP_CACHE]
+
+
+def _keys(conversation_id):
+    return [GENERATION_KEY, members_key(conversation_id)]
+
+
+def _cached(conversation_id, found):
+    """The cached set among get_many() results (or None), and the generation."""
+    generation = found.get(GENERATION_KEY, 0)
+    entry = found.get(members_key(conversation_id))
+    if entry is None or entry[0] != generation:
+        return None, generation
+    return entry[1], generation
+
+
+def members(conversation_id):
+    """The participant ids of a conversation (empty if it doesn't exist)."""
+    conversation_id = int(conversation_id)
+    cache = membership_cache()
+    cached, generation = _cached(conversation_id, cache.get_many(_keys(conversation_id)))
+    if cached is not None:
+        return cached
+    loaded = frozenset(
+        Participant.objects.filter(conversation_id=conversation_id).values_list('user_id', flat=True)
+    )
+    cache.set(members_key(conversation_id), (generation, loaded), settings.CHAT_MEMBERSHIP_TTL)
+    return loaded
+
+
+def is_member(conversation_id, user_id):
+    return user_id in members(conversation_id)
+
+
+async def amembers(conversation_id):
+    """members() for async code; only a cache miss touches the database."""
+    conversation_id = int(conversation_id)
+    found = await membership_cache().aget_many(_keys(conversation_id))
+    cached, _ = _cached(conversation_id, found)
+    if cached is None:
+        cached = await database_sync_to_async(members)(conversation_id)
+    return cached
+
+
+async def ais_member(conversation_id, user_id):
+    """is_member() for async code; only a cache miss touches the database."""
+    return user_id in await amembers(conversation_id)
+
+
+def invalidate(conversation_ids=None):
+    """Forget some conversations' members (or all, for None)."""
+    cache = membership_cache()
+    if conversation_ids is None:
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.set(GENERATION_KEY, 1, None)
+    else:
+        cache.delete_many([members_key(conversation_id) for conversation_id in conversation_ids])
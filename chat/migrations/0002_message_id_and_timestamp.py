@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:02
+
+import chat.ids
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='id',
+            field=models.BigIntegerField(default=chat.ids.next_id, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
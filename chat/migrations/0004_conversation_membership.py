@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_memberships(apps, schema_editor):
+    """
+    One row per existing participant. Message.is_read was never set, so
+    the history so far counts as read rather than all unread.
+    """
+    Conversation = apps.get_model('chat', 'Conversation')
+    ConversationMembership = apps.get_model('chat', 'ConversationMembership')
+    Message = apps.get_model('chat', 'Message')
+    Participant = Conversation.participants.through
+
+    rows = []
+    for conversation in Conversation.objects.iterator():
+        last = Message.objects.filter(conversation_id=conversation.pk).order_by('-id').first()
+        snapshot = {'last_message_at': conversation.last_message_at or conversation.updated_at}
+        if last is not None:
+            snapshot = {
+                'last_read_message_id': last.id,
+                'last_message_id': last.id,
+                'last_message_preview': ' '.join(last.content.split())[:200],
+                'last_message_sender_id': last.sender_id,
+                'last_message_at': last.created_at,
+            }
+        user_ids = Participant.objects.filter(conversation_id=conversation.pk).values_list('user_id', flat=True)
+        rows.extend(
+            ConversationMembership(user_id=user_id, conversation_id=conversation.pk, **snapshot)
+            for user_id in user_ids
+        )
+    ConversationMembership.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_history_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_read_message_id', models.BigIntegerField(blank=True, null=True)),
+                ('last_message_id', models.BigIntegerField(blank=True, null=True)),
+                ('last_message_preview', models.CharField(blank=True, max_length=200)),
+                ('last_message_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='chat.conversation')),
+                ('last_message_sender', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_message_at'], name='membership_inbox_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'conversation'), name='unique_conversation_membership')],
+            },
+        ),
+        migrations.RunPython(create_memberships, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:15
+
+from django.db import migrations, models
+
+
+SNAPSHOT_FIELDS = ('last_message_id', 'last_message_preview', 'last_message_sender_id', 'last_message_at')
+
+
+def merge_conversations(apps, keeper_id, duplicate_ids):
+    """Move the duplicates' messages and inbox state into the keeper."""
+    Conversation = apps.get_model('chat', 'Conversation')
+    ConversationMembership = apps.get_model('chat', 'ConversationMembership')
+    Message = apps.get_model('chat', 'Message')
+
+    Message.objects.filter(conversation_id__in=duplicate_ids).update(conversation_id=keeper_id)
+    times = Conversation.objects.filter(pk__in=[keeper_id, *duplicate_ids]).values_list('last_message_at', flat=True)
+    Conversation.objects.filter(pk=keeper_id).update(
+        last_message_at=max((t for t in times if t is not None), default=None)
+    )
+
+    for membership in ConversationMembership.objects.filter(conversation_id=keeper_id):
+        for other in ConversationMembership.objects.filter(
+            conversation_id__in=duplicate_ids, user_id=membership.user_id
+        ):
+            membership.unread_count += other.unread_count
+            if (other.last_message_id or 0) > (membership.last_message_id or 0):
+                for field in SNAPSHOT_FIELDS:
+                    setattr(membership, field, getattr(other, field))
+            if (other.last_read_message_id or 0) > (membership.last_read_message_id or 0):
+                membership.last_read_message_id = other.last_read_message_id
+        membership.save()
+
+    # Participants and memberships go with them
+    Conversation.objects.filter(pk__in=duplicate_ids).delete()
+
+
+def backfill_pair_keys(apps, schema_editor):
+    """
+    Key every two-person conversation. Duplicates (same pair and item,
+    e.g. from double clicks) are merged into the oldest one.
+    """
+    Conversation = apps.get_model('chat', 'Conversation')
+    Participant = Conversation.participants.through
+
+    participants = {}
+    for conversation_id, user_id in Participant.objects.values_list('conversation_id', 'user_id'):
+        participants.setdefault(conversation_id, []).append(user_id)
+
+    by_key = {}
+    for conversation_id, item_id in Conversation.objects.order_by('pk').values_list('pk', 'item_id'):
+        user_ids = participants.get(conversation_id, [])
+        if len(user_ids) != 2:
+            continue
+        # Same format as Conversation.make_pair_key()
+        low, high = sorted(user_ids)
+        key = f'{low}:{high}' if item_id is None else f'{low}:{high}:{item_id}'
+        by_key.setdefault(key, []).append(conversation_id)
+
+    for key, (keeper_id, *duplicate_ids) in by_key.items():
+        if duplicate_ids:
+            merge_conversations(apps, keeper_id, duplicate_ids)
+        Conversation.objects.filter(pk=keeper_id).update(pair_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_conversation_membership'),
+    ]
+
+    operations = [
+        # Unique only once the duplicates are merged (0006)
+        migrations.AddField(
+            model_name='conversation',
+            name='pair_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill_pair_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_conversation_pair_key_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMessageSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_message_id', models.BigIntegerField()),
+                ('last_message_id', models.BigIntegerField()),
+                ('message_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_segments', to='chat.conversation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['conversation', 'last_message_id'], name='archive_segment_idx')],
+            },
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
+from .ids import next_id
+
 
 class Conversation(models.Model):
     """
@@ -23,6 +25,9 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_message_at = models.DateTimeField(null=True, blank=True)
+    # "<lower user id>:<higher user id>[:<item id>]" for 1:1 chats, so the
+    # chat between two users (about an item) is one unique index lookup
+    pair_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ['-last_message_at', '-updated_at']
@@ -31,12 +36,41 @@ class Conversation(models.Model):
         users = ', '.join(self.participants.values_list('username', flat=True))
         return f"Conversation({users})"
 
+    @staticmethod
+    def make_pair_key(user_id, other_id, item_id=None):
+        low, high = sorted((user_id, other_id))
+        key = f'{low}:{high}'
+        return f'{key}:{item_id}' if item_id is not None else key
+
+    @classmethod
+    def get_or_create_for_pair(cls, user, other, item=None):
+        """
+        The 1:1 conversation between two users (about an item, if given),
+        created if needed. Returns (conversation, created). Safe against
+        concurrent requests: the unique pair_key lets only one insert win,
+        and the loser reads the winner's conversation.
+        """
+        key = cls.make_pair_key(user.pk, other.pk, item.pk if item else None)
+        # Participants are added in the same transaction, so nobody sees
+        # the conversation without them
+        with transaction.atomic():
+            conversation, created = cls.objects.get_or_create(
+                pair_key=key,
+                defaults={'item': item, 'last_message_at': timezone.now()},
+            )
+            if created:
+                conversation.participants.add(user, other)
+        return conversation, created
+
     def touch(self):
         self.last_message_at = timezone.now()
         self.save(update_fields=['last_message_at', 'updated_at'])
 
 
 class Message(models.Model):
+    # Assigned in-process (see chat.ids), so a message can be broadcast
+    # before it is written
+    id = models.BigIntegerField(primary_key=True, default=next_id, editable=False)
     conversation = models.ForeignKey(
         Conversation,
         on_delete=models.CASCADE,
@@ -48,11 +82,86 @@ class Message(models.Model):
         related_name='sent_messages'
     )
     content = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     is_read = models.BooleanField(default=False)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # History windows: WHERE conversation_id = ? AND id < ? ORDER BY id DESC
+            models.Index(fields=['conversation', 'id'], name='message_conversation_id_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender} at {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class ArchivedMessageSegment(models.Model):
+    """
+    A run of old messages of one conversation, moved out of the Message
+    table by chat.archive: consecutive ids, stored as one compressed blob.
+    """
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='archived_segments'
+    )
+    first_message_id = models.BigIntegerField()
+    last_message_id = models.BigIntegerField()
+    message_count = models.PositiveIntegerField()
+    # zlib-compressed msgpack rows (see chat.archive)
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Read-through: WHERE conversation_id = ? AND first_message_id < ?
+            # ORDER BY last_message_id DESC
+            models.Index(fields=['conversation', 'last_message_id'], name='archive_segment_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.message_count} archived messages of conversation {self.conversation_id}"
+
+
+class ConversationMembership(models.Model):
+    """
+    One participant's view of a conversation: unread count, read position
+    and a snapshot of the last message, kept up to date by chat.inbox so
+    the inbox and the unread badge never have to scan messages.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='conversation_memberships'
+    )
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='memberships'
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+    last_read_message_id = models.BigIntegerField(null=True, blank=True)
+    last_message_id = models.BigIntegerField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=200, blank=True)
+    last_message_sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        null=True,
+        blank=True
+    )
+    # Last message time, or when the user joined the conversation
+    last_message_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'conversation'], name='unique_conversation_membership'),
+        ]
+        indexes = [
+            # Inbox: WHERE user_id = ? ORDER BY last_message_at DESC
+            models.Index(fields=['user', '-last_message_at'], name='membership_inbox_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} in conversation {self.conversation_id}"
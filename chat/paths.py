@@ -0,0 +1,35 @@
+"""
+Private runtime directories.
+
+The channel layer's sockets (chat.layers) and the message id worker
+locks (chat.ids) live in directories on the local filesystem. Anyone who
+can write there can inject chat messages or steal worker slots, so they
+are created with mode 0700 and refused unless they belong to this user
+and nobody else can get in (also checked by `manage.py check`).
+"""
+
+import os
+import stat
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+def private_dir_problem(path):
+    """Why the existing directory `path` isn't private, or None if it is."""
+    # lstat: a symlink planted in a shared directory is refused too
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        return f'{path} is not a directory.'
+    if info.st_uid != os.getuid():
+        return f'{path} belongs to uid {info.st_uid}, not to this user ({os.getuid()}).'
+    if info.st_mode & 0o077:
+        return f'{path} can be used by other users (mode {stat.filemode(info.st_mode)}); chmod 700 it.'
+    return None
+
+
+def ensure_private_dir(path):
+    """Create `path` (mode 0700) if needed; raise ImproperlyConfigured unless it is private."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    problem = private_dir_problem(path)
+    if problem:
+        raise ImproperlyConfigured(problem)
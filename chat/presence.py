@@ -0,0 +1,168 @@
+"""
+Presence and typing indicators.
+
+Relaying every keystroke ("typing") or connect/disconnect through
+group_send would multiply channel layer traffic with activity. Instead,
+each process keeps one PresenceHub that collects state changes from its
+connections and sends at most one chat.presence event per conversation
+every CHAT_PRESENCE_TICK seconds, carrying only the users whose state
+changed. Keystrokes from a user who is already typing change nothing;
+typing ends CHAT_TYPING_TIMEOUT seconds after the last one, or when the
+user sends a message.
+
+Who is online is kept in the CHAT_PRESENCE_CACHE cache (no database
+writes): one key per (conversation, user) with a CHAT_PRESENCE_TTL
+timeout, refreshed every CHAT_PRESENCE_HEARTBEAT seconds by the process
+holding the connection. Keys of crashed processes simply expire. New
+connections read the participants' keys to show who is online right
+away.
+
+Every process serving chat sockets must therefore see the same cache.
+Settings use the default cache when it is shared and a file-based cache
+in a private directory of this host otherwise; the chat.E005/E006
+checks refuse a per-process or non-private presence cache outside DEBUG
+unless chat runs in one process (InMemoryChannelLayer).
+"""
+
+import asyncio
+import logging
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import caches
+
+from . import framing
+
+
+logger = logging.getLogger(__name__)
+
+
+def presence_key(conversation_id, user_id):
+    return f'chat-presence:{conversation_id}:{user_id}'
+
+
+def presence_cache():
+    return caches[settings.CHAT_PRESENCE_CACHE]
+
+
+async def online_users(conversation_id, user_ids):
+    """The ids among user_ids with a live presence key."""
+    keys = {presence_key(conversation_id, user_id): user_id for user_id in user_ids}
+    found = await presence_cache().aget_many(list(keys))
+    return {keys[key] for key in found}
+
+
+class PresenceHub:
+    """Coalesces one process's presence and typing changes per conversation."""
+
+    def __init__(self):
+        self._connections = {}  # (conversation_id, user_id) -> open sockets
+        self._typing = {}       # (conversation_id, user_id) -> typing deadline
+        self._dirty = {}        # conversation_id -> user ids to broadcast
+        self._heartbeat_at = 0.0
+        self._task = None
+        self._loop = None
+
+    def connect(self, conversation_id, user_id):
+        key = (conversation_id, user_id)
+        self._connections[key] = self._connections.get(key, 0) + 1
+        if self._connections[key] == 1:
+            self._mark(conversation_id, user_id)
+
+    def disconnect(self, conversation_id, user_id):
+        key = (conversation_id, user_id)
+        remaining = self._connections.get(key, 0) - 1
+        if remaining > 0:
+            self._connections[key] = remaining
+            return
+        self._connections.pop(key, None)
+        self._typing.pop(key, None)
+        self._mark(conversation_id, user_id)
+
+    def typing(self, conversation_id, user_id):
+        key = (conversation_id, user_id)
+        started = key not in self._typing
+        self._typing[key] = time.monotonic() + settings.CHAT_TYPING_TIMEOUT
+        if started:
+            self._mark(conversation_id, user_id)
+
+    def stopped_typing(self, conversation_id, user_id):
+        if self._typing.pop((conversation_id, user_id), None) is not None:
+            self._mark(conversation_id, user_id)
+
+    def is_typing(self, conversation_id, user_id):
+        return (conversation_id, user_id) in self._typing
+
+    def _state(self, conversation_id, user_id):
+        key = (conversation_id, user_id)
+        return (user_id, key in self._connections, key in self._typing)
+
+    def _mark(self, conversation_id, user_id):
+        self._dirty.setdefault(conversation_id, set()).add(user_id)
+        self._ensure_task()
+
+    def _ensure_task(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while self._connections or self._typing or self._dirty:
+            await asyncio.sleep(settings.CHAT_PRESENCE_TICK)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception('Presence tick failed')
+        self._task = None
+
+    async def tick(self):
+        """Expire typing, refresh presence keys and broadcast the changes."""
+        now = time.monotonic()
+        for (conversation_id, user_id), deadline in list(self._typing.items()):
+            if deadline <= now:
+                del self._typing[conversation_id, user_id]
+                self._mark(conversation_id, user_id)
+        if now >= self._heartbeat_at:
+            await self._heartbeat()
+            self._heartbeat_at = now + settings.CHAT_PRESENCE_HEARTBEAT
+
+        dirty, self._dirty = self._dirty, {}
+        online, offline = {}, []
+        for conversation_id, user_ids in dirty.items():
+            for user_id in user_ids:
+                if (conversation_id, user_id) in self._connections:
+                    online[presence_key(conversation_id, user_id)] = True
+                else:
+                    offline.append(presence_key(conversation_id, user_id))
+        if online:
+            await presence_cache().aset_many(online, settings.CHAT_PRESENCE_TTL)
+        if offline:
+            await presence_cache().adelete_many(offline)
+
+        channel_layer = get_channel_layer()
+        for conversation_id, user_ids in dirty.items():
+            # The group ChatConsumer joins for the conversation
+            await channel_layer.group_send(
+                f'chat_{conversation_id}',
+                framing.presence_event([self._state(conversation_id, u) for u in sorted(user_ids)]),
+            )
+
+    async def _heartbeat(self):
+        """
+        Refresh this process's presence keys. A key that is gone was
+        deleted when the user left through another process while still
+        connected here: announce them as online again.
+        """
+        keys = {presence_key(*key): key for key in self._connections}
+        if not keys:
+            return
+        found = await presence_cache().aget_many(list(keys))
+        for key in keys.keys() - found.keys():
+            self._mark(*keys[key])
+        await presence_cache().aset_many(dict.fromkeys(keys, True), settings.CHAT_PRESENCE_TTL)
+
+
+presence_hub = PresenceHub()
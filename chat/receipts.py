@@ -0,0 +1,125 @@
+"""
+Coalesced read receipts.
+
+Clients acknowledge "read up to message id N" over the chat socket
+({"type": "read", "message_id": N}) whenever new messages come into
+view. Acting on every acknowledgement would mean a write per message per
+reader, so ReceiptBuffer keeps only the highest id per (user,
+conversation) and applies them every CHAT_READ_RECEIPT_INTERVAL seconds:
+
+- one range UPDATE marks the other participants' messages up to N as
+  read (Message.is_read), over the (conversation, id) index;
+- inbox.mark_read() moves the user's read position and unread count;
+- one chat.read event per receipt tells the other participants.
+
+Acknowledgements that change nothing (already read) are not broadcast.
+With CHAT_READ_RECEIPT_INTERVAL = 0 receipts are applied at once (used
+by tests).
+"""
+
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from . import framing, inbox
+from .models import Message
+from .writer import message_writer
+
+
+logger = logging.getLogger(__name__)
+
+
+def apply_receipts(receipts):
+    """
+    Apply {(user_id, conversation_id): message_id} read receipts. Returns
+    the ones that marked any message read.
+    """
+    applied = {}
+    with transaction.atomic():
+        for (user_id, conversation_id), message_id in receipts.items():
+            inbox.mark_read(user_id, conversation_id, message_id)
+            marked = (
+                Message.objects.filter(conversation_id=conversation_id, id__lte=message_id, is_read=False)
+                .exclude(sender_id=user_id)
+                .update(is_read=True)
+            )
+            if marked:
+                applied[user_id, conversation_id] = message_id
+    return applied
+
+
+class ReceiptBuffer:
+    """Keeps the newest read receipt per (user, conversation) until flushed."""
+
+    def __init__(self):
+        self._pending = {}
+        self._task = None
+        self._loop = None
+
+    async def acknowledge(self, user_id, conversation_id, message_id):
+        key = (user_id, conversation_id)
+        if message_id <= self._pending.get(key, 0):
+            return
+        self._pending[key] = message_id
+        if settings.CHAT_READ_RECEIPT_INTERVAL <= 0:
+            await self.flush()
+        else:
+            self._ensure_task()
+
+    def pending(self):
+        return len(self._pending)
+
+    async def flush(self):
+        """Apply and broadcast everything acknowledged so far."""
+        if not self._pending:
+            return
+        receipts, self._pending = self._pending, {}
+        try:
+            # Acknowledged messages may still be waiting to be written
+            await message_writer.flush()
+            applied = await database_sync_to_async(apply_receipts)(receipts)
+        except DatabaseError:
+            # Keep them for the next attempt, unless newer ones came in
+            for key, message_id in receipts.items():
+                if message_id > self._pending.get(key, 0):
+                    self._pending[key] = message_id
+            if settings.CHAT_READ_RECEIPT_INTERVAL > 0:
+                self._ensure_task()
+            raise
+
+        channel_layer = get_channel_layer()
+        for (user_id, conversation_id), message_id in applied.items():
+            # The group ChatConsumer joins for the conversation
+            await channel_layer.group_send(
+                f'chat_{conversation_id}', framing.read_event(user_id, message_id)
+            )
+
+    def _ensure_task(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.CHAT_READ_RECEIPT_INTERVAL)
+            try:
+                await self.flush()
+            except DatabaseError:
+                logger.exception('Applying read receipts failed; retrying')
+                continue
+            except Exception:
+                logger.exception('Applying read receipts failed; dropped them')
+                continue
+            if not self._pending:
+                # Idle: the next acknowledge() starts a new task
+                self._task = None
+                return
+
+
+receipt_buffer = ReceiptBuffer()
@@ -0,0 +1,148 @@
+"""
+Daphne with permessage-deflate and socket-level backpressure.
+
+Daphne's websocket factory (autobahn) can compress frames, but daphne
+offers no option to accept the permessage-deflate extension. This entry
+point runs daphne with a server that accepts it (when
+CHAT_SOCKET_DEFLATE is on) and takes the same arguments as the daphne
+command:
+
+    python -m chat.server -b 0.0.0.0 -p 8001 campus_connect.asgi:application
+
+Browsers offer the extension by themselves; batched msgpack frames
+(chat.framing) compress best.
+
+Daphne also writes everything the application sends straight into the
+connection's Twisted transport, which buffers without limit for a client
+that stops reading. The sockets of this server register with their
+transport as a push producer, so they learn when its write buffer fills
+(pauseProducing) and drains again (resumeProducing). While it is full,
+at most CHAT_SOCKET_SEND_BUFFER more bytes are written; after that
+CHAT_SLOW_CONSUMER_POLICY applies (see chat.limits): "drop" discards
+frames and sends a chat.overflow notice once the client catches up,
+"disconnect" aborts the connection.
+"""
+
+import logging
+
+from autobahn.websocket.compress import PerMessageDeflateOffer, PerMessageDeflateOfferAccept
+from daphne.cli import CommandLineInterface
+from daphne.server import Server
+from daphne.ws_protocol import WebSocketProtocol
+from django.conf import settings
+from twisted.internet.interfaces import IPushProducer
+from zope.interface import implementer
+
+from . import framing, limits
+
+
+logger = logging.getLogger(__name__)
+
+
+def accept_deflate(offers):
+    """Accept the client's first permessage-deflate offer, if any."""
+    for offer in offers:
+        if isinstance(offer, PerMessageDeflateOffer):
+            return PerMessageDeflateOfferAccept(offer)
+    return None
+
+
+@implementer(IPushProducer)
+class TransportFlow:
+    """Follows whether a transport's write buffer is full."""
+
+    def __init__(self, protocol):
+        self.protocol = protocol
+        self.paused = False
+
+    def pauseProducing(self):
+        # Called on every write while the buffer is over its limit
+        if not self.paused:
+            self.paused = True
+            self.protocol.buffer_full()
+
+    def resumeProducing(self):
+        if self.paused:
+            self.paused = False
+            self.protocol.buffer_drained()
+
+    def stopProducing(self):
+        self.paused = False
+
+
+class FlowControlWebSocketProtocol(WebSocketProtocol):
+    """A daphne websocket that bounds what it buffers for slow clients."""
+
+    def connectionMade(self):
+        super().connectionMade()
+        self.flow = TransportFlow(self)
+        # Bytes written since the transport's buffer filled up
+        self.backlog = 0
+        self.dropped = 0
+        self.aborted = False
+        # Daphne hands over the transport of the upgraded HTTP channel,
+        # which is still registered as its producer
+        self.transport.unregisterProducer()
+        self.registerProducer(self.flow, True)
+
+    def buffer_full(self):
+        self.backlog = 0
+
+    def buffer_drained(self):
+        if self.dropped and self.state == self.STATE_OPEN:
+            # Tell the client what it missed, e.g. to reload the history
+            notice = framing.overflow_event(self.dropped)
+            self.dropped = 0
+            if self.websocket_protocol_in_use == framing.SUBPROTOCOL:
+                super().serverSend(framing.frame([notice['packed']]), True)
+            else:
+                super().serverSend(notice['json'], False)
+
+    def serverSend(self, content, binary=False):
+        if self.aborted:
+            return
+        if self.flow.paused:
+            size = len(content)
+            if self.backlog + size > settings.CHAT_SOCKET_SEND_BUFFER:
+                self.slow_client(framing.event_count(content) if binary else 1)
+                return
+            self.backlog += size
+        super().serverSend(content, binary)
+
+    def slow_client(self, events):
+        """The client doesn't keep up; apply CHAT_SLOW_CONSUMER_POLICY."""
+        if settings.CHAT_SLOW_CONSUMER_POLICY != limits.DISCONNECT:
+            limits.metrics['outbound_dropped'] += events
+            self.dropped += events
+            return
+        limits.metrics['slow_consumer_disconnects'] += 1
+        logger.warning('Dropping slow chat socket of %s (%d bytes buffered)', self.client_addr, self.backlog)
+        # A close frame would only queue behind the backlog
+        self.aborted = True
+        self.dropConnection(abort=True)
+
+
+class ChatServer(Server):
+    """A daphne Server with permessage-deflate and flow-controlled websockets."""
+
+    @property
+    def ws_factory(self):
+        return self._ws_factory
+
+    @ws_factory.setter
+    def ws_factory(self, factory):
+        # Server.run() creates the factory; the application (and so the
+        # settings) is loaded by then
+        factory.protocol = FlowControlWebSocketProtocol
+        limits.socket_backpressure = True
+        if settings.CHAT_SOCKET_DEFLATE:
+            factory.setProtocolOptions(perMessageCompressionAccept=accept_deflate)
+        self._ws_factory = factory
+
+
+class ChatCommandLineInterface(CommandLineInterface):
+    server_class = ChatServer
+
+
+if __name__ == '__main__':
+    ChatCommandLineInterface.entrypoint()
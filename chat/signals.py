@@ -0,0 +1,60 @@
+"""
+Signal handlers for the chat app.
+Connected in ChatConfig.ready().
+"""
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from . import inbox, membership
+from .models import Conversation, ConversationMembership
+
+
+def _expire_members(conversation_ids=None):
+    if conversation_ids is not None:
+        conversation_ids = list(conversation_ids)
+    membership.invalidate(conversation_ids)
+    # Again once committed, in case a request cached the old participants meanwhile
+    transaction.on_commit(lambda: membership.invalidate(conversation_ids))
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def expire_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop cached participant sets when participants change"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _expire_members([instance.pk])
+    elif pk_set:
+        # user.conversations.add(...): pk_set holds conversation ids
+        _expire_members(pk_set)
+    else:
+        # user.conversations.clear(): we don't know which ones
+        _expire_members()
+
+
+@receiver(post_delete, sender=Conversation)
+def forget_membership(sender, instance, **kwargs):
+    """Drop a deleted conversation's participant set"""
+    _expire_members([instance.pk])
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def sync_inbox_memberships(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep ConversationMembership rows in step with participants"""
+    if action == 'post_add' and pk_set:
+        if reverse:
+            inbox.join(pk_set, [instance.pk])
+        else:
+            inbox.join([instance.pk], pk_set)
+    elif action == 'post_remove' and pk_set:
+        if reverse:
+            ConversationMembership.objects.filter(user=instance, conversation_id__in=pk_set).delete()
+        else:
+            ConversationMembership.objects.filter(conversation=instance, user_id__in=pk_set).delete()
+    elif action == 'post_clear':
+        if reverse:
+            ConversationMembership.objects.filter(user=instance).delete()
+        else:
+            ConversationMembership.objects.filter(conversation=instance).delete()
@@ -0,0 +1,1163 @@
+import asyncio
+import json
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+import msgpack
+from autobahn.websocket.compress import PerMessageDeflateOffer, PerMessageDeflateOfferAccept
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from items.models import Item
+
+from . import archive, framing, inbox, limits, membership
+from .checks import check_id_lock_dir, check_presence_cache, check_socket_dir
+from .consumers import ChatConsumer
+from .history import serialize_message
+from .ids import IdGenerator, first_id_at, next_id
+from .layers import UnixSocketChannelLayer
+from .models import ArchivedMessageSegment, Conversation, ConversationMembership, Message
+from .presence import PresenceHub, online_users
+from .receipts import ReceiptBuffer, apply_receipts
+from .server import accept_deflate
+from .writer import MessageWriter, persist_messages
+
+User = get_user_model()
+
+
+async def next_event(communicator, timeout=2):
+    """The next JSON event that isn't a presence update"""
+    while True:
+        event = await communicator.receive_json_from(timeout=timeout)
+        if event['type'] != 'chat.presence':
+            return event
+
+
+async def no_event(communicator, timeout=0.2):
+    """True if nothing but presence updates arrives"""
+    # receive_json_from() would cancel the consumer on timeout
+    while not await communicator.receive_nothing(timeout=timeout):
+        if (await communicator.receive_json_from())['type'] != 'chat.presence':
+            return False
+    return True
+
+
+class UnixSocketChannelLayerTests(SimpleTestCase):
+    """
+    Test cases for the multi-process Unix socket channel layer.
+    Each layer instance stands in for one worker process.
+    """
+    
+    def setUp(self):
+        """Give every test its own socket directory"""
+        self.socket_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.socket_dir)
+    
+    def layer(self, **kwargs):
+        return UnixSocketChannelLayer(socket_dir=self.socket_dir, **kwargs)
+    
+    async def receive(self, layer, channel):
+        return await asyncio.wait_for(layer.receive(channel), timeout=2)
+    
+    async def test_group_send_reaches_other_processes(self):
+        """Test that group members in every process get the message"""
+        first, second, sender = self.layer(), self.layer(), self.layer()
+        first_channel = await first.new_channel()
+        second_channel = await second.new_channel()
+        await first.group_add('chat_1', first_channel)
+        await second.group_add('chat_1', second_channel)
+        
+        await sender.group_send('chat_1', {'type': 'chat.message', 'message': 'hi'})
+        self.assertEqual((await self.receive(first, first_channel))['message'], 'hi')
+        self.assertEqual((await self.receive(second, second_channel))['message'], 'hi')
+    
+    async def test_send_to_remote_channel(self):
+        """Test that a specific channel is reached from another process"""
+        receiver, sender = self.layer(), self.layer()
+        channel = await receiver.new_channel()
+        await sender.send(channel, {'type': 'direct'})
+        self.assertEqual(await self.receive(receiver, channel), {'type': 'direct'})
+    
+    async def test_remote_group_discard(self):
+        """Test that group_discard is forwarded to the channel's process"""
+        receiver, other = self.layer(), self.layer()
+        channel = await receiver.new_channel()
+        await other.group_add('chat_2', channel)
+        await other.group_send('chat_2', {'type': 'first'})
+        self.assertEqual((await self.receive(receiver, channel))['type'], 'first')
+        
+        await other.group_discard('chat_2', channel)
+        await asyncio.sleep(0.05)
+        await other.group_send('chat_2', {'type': 'second'})
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(receiver.receive(channel), timeout=0.2)
+    
+    async def test_group_expiry(self):
+        """Test that memberships older than group_expiry are dropped"""
+        receiver = self.layer(group_expiry=1)
+        channel = await receiver.new_channel()
+        await receiver.group_add('chat_3', channel)
+        receiver.groups['chat_3'][channel] -= 5
+        await self.layer().group_send('chat_3', {'type': 'late'})
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(receiver.receive(channel), timeout=0.2)
+    
+    async def test_dead_peer_is_skipped(self):
+        """Test that a stale socket file doesn't break group_send"""
+        open(f'{self.socket_dir}/uds1deadxx.sock', 'w').close()
+        receiver, sender = self.layer(), self.layer()
+        channel = await receiver.new_channel()
+        await receiver.group_add('chat_4', channel)
+        await sender.group_send('chat_4', {'type': 'alive'})
+        self.assertEqual((await self.receive(receiver, channel))['type'], 'alive')
+    
+    async def test_socket_dir_is_created_private(self):
+        """Test that a missing socket directory is created with mode 0700"""
+        socket_dir = os.path.join(self.socket_dir, 'channels')
+        layer = UnixSocketChannelLayer(socket_dir=socket_dir)
+        await layer.new_channel()
+        self.assertEqual(os.stat(socket_dir).st_mode & 0o777, 0o700)
+    
+    def test_shared_socket_dir_is_refused(self):
+        """Test that a socket directory others can use stops the layer"""
+        os.chmod(self.socket_dir, 0o777)
+        with self.assertRaises(ImproperlyConfigured):
+            self.layer().token
+        with override_settings(CHANNEL_LAYERS={'default': {
+            'BACKEND': 'chat.layers.UnixSocketChannelLayer',
+            'CONFIG': {'socket_dir': self.socket_dir},
+        }}):
+            self.assertEqual([error.id for error in check_socket_dir(None)], ['chat.E002'])
+    
+    def test_socket_dir_is_required(self):
+        """Test that the layer has no implicit shared default directory"""
+        with self.assertRaises(ImproperlyConfigured):
+            UnixSocketChannelLayer()
+
+
+class MessageIdTests(SimpleTestCase):
+    """
+    Test cases for in-process message ids.
+    """
+    
+    def test_ids_increase_and_fit_javascript_numbers(self):
+        """Test that ids are strictly increasing 53-bit integers"""
+        ids = [next_id() for _ in range(5000)]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertLess(ids[-1], 2 ** 53)
+    
+    def test_shared_lock_dir_is_refused(self):
+        """Test that worker slots aren't claimed in a directory others can use"""
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir)
+        os.chmod(lock_dir, 0o733)
+        with override_settings(CHAT_ID_LOCK_DIR=lock_dir):
+            with self.assertRaises(ImproperlyConfigured):
+                IdGenerator().next_id()
+            self.assertEqual([error.id for error in check_id_lock_dir(None)], ['chat.E004'])
+        
+        os.chmod(lock_dir, 0o700)
+        with override_settings(CHAT_ID_LOCK_DIR=lock_dir):
+            self.assertGreater(IdGenerator().next_id(), 0)
+            self.assertEqual(check_id_lock_dir(None), [])
+
+
+@override_settings(CHAT_WRITE_BATCH_SIZE=3, CHAT_WRITE_FLUSH_INTERVAL=30)
+class MessageWriterTests(TransactionTestCase):
+    """
+    Test cases for batched write-behind message persistence.
+    """
+    
+    def setUp(self):
+        """Create two users and a conversation between them"""
+        self.alice = User.objects.create_user(username='alice', email='alice@pucit.edu.pk', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@pucit.edu.pk', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+        self.writer = MessageWriter()
+    
+    async def test_messages_are_buffered_until_flush(self):
+        """Test that write() returns at once and flush() persists the batch"""
+        first = await self.writer.write(self.conversation.pk, self.alice.pk, 'Hello')
+        second = await self.writer.write(self.conversation.pk, self.bob.pk, 'Hi there')
+        self.assertLess(first.id, second.id)
+        self.assertEqual(await Message.objects.acount(), 0)
+        
+        await self.writer.flush()
+        self.assertEqual(
+            [m async for m in Message.objects.values_list('id', 'content')],
+            [(first.id, 'Hello'), (second.id, 'Hi there')],
+        )
+        conversation = await Conversation.objects.aget(pk=self.conversation.pk)
+        self.assertEqual(conversation.last_message_at, second.created_at)
+    
+    async def test_full_batch_is_written_without_waiting(self):
+        """Test that reaching the batch size wakes the flush task"""
+        for text in ('one', 'two', 'three'):
+            await self.writer.write(self.conversation.pk, self.alice.pk, text)
+        for _ in range(100):
+            if await Message.objects.acount() == 3:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(await Message.objects.acount(), 3)
+    
+    def test_one_update_per_conversation(self):
+        """Test that a batch is one INSERT plus one UPDATE per conversation"""
+        other = Conversation.objects.create()
+        batch = [
+            Message(id=next_id(), conversation=conversation, sender=self.alice, content='ping')
+            for conversation in (self.conversation, other, self.conversation)
+        ]
+        # BEGIN, INSERT, 2 x (conversation + memberships UPDATE), COMMIT
+        with self.assertNumQueries(7):
+            persist_messages(batch)
+        self.assertEqual(Message.objects.count(), 3)
+    
+    @override_settings(CHAT_WRITE_FLUSH_INTERVAL=0)
+    async def test_immediate_mode(self):
+        """Test that a zero interval writes each message at once"""
+        await self.writer.write(self.conversation.pk, self.alice.pk, 'now')
+        self.assertEqual(await Message.objects.acount(), 1)
+    
+    @override_settings(CHAT_WRITE_FLUSH_INTERVAL=0.01)
+    async def test_flush_task_survives_unexpected_errors(self):
+        """Test that messages queued after a failed batch are still written"""
+        calls = []
+        
+        def flaky(batch):
+            calls.append(batch)
+            if len(calls) == 1:
+                raise ValueError('boom')
+            persist_messages(batch)
+        
+        with patch('chat.writer.persist_messages', flaky), self.assertLogs('chat.writer', 'ERROR'):
+            await self.writer.write(self.conversation.pk, self.alice.pk, 'lost')
+            for _ in range(100):
+                if calls:
+                    break
+                await asyncio.sleep(0.01)
+            await self.writer.write(self.conversation.pk, self.alice.pk, 'kept')
+            for _ in range(100):
+                if await Message.objects.acount():
+                    break
+                await asyncio.sleep(0.01)
+        self.assertEqual([m async for m in Message.objects.values_list('content', flat=True)], ['kept'])
+    
+    async def test_deleted_conversation_doesnt_block_the_batch(self):
+        """Test that one bad message is dropped and the rest are kept"""
+        gone = await Conversation.objects.acreate()
+        gone_pk = gone.pk
+        await gone.adelete()
+        await self.writer.write(gone_pk, self.alice.pk, 'lost')
+        await self.writer.write(self.conversation.pk, self.alice.pk, 'kept')
+        with self.assertLogs('chat.writer', 'WARNING'):
+            await self.writer.flush()
+        self.assertEqual([m async for m in Message.objects.values_list('content', flat=True)], ['kept'])
+
+
+class MembershipCacheTests(TestCase):
+    """
+    Test cases for the cached conversation participant sets.
+    """
+    
+    def setUp(self):
+        """Create a conversation with two participants and an outsider"""
+        membership.invalidate()
+        self.alice = User.objects.create_user(username='alice', email='alice@pucit.edu.pk', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@pucit.edu.pk', password='x')
+        self.eve = User.objects.create_user(username='eve', email='eve@pucit.edu.pk', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+    
+    def test_members_are_loaded_once(self):
+        """Test that repeated checks don't query the database"""
+        self.assertTrue(membership.is_member(self.conversation.pk, self.alice.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(membership.is_member(self.conversation.pk, self.bob.pk))
+            self.assertFalse(membership.is_member(self.conversation.pk, self.eve.pk))
+    
+    def test_participant_changes_invalidate(self):
+        """Test that adding or removing participants refreshes the set"""
+        self.assertFalse(membership.is_member(self.conversation.pk, self.eve.pk))
+        self.conversation.participants.add(self.eve)
+        self.assertTrue(membership.is_member(self.conversation.pk, self.eve.pk))
+        self.eve.conversations.remove(self.conversation)
+        self.assertFalse(membership.is_member(self.conversation.pk, self.eve.pk))
+    
+    def test_sets_cached_before_commit_are_dropped(self):
+        """Test that a set loaded while participants change is dropped on commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.conversation.participants.add(self.eve)
+            # Another thread reads the committed (old) participants meanwhile
+            cache = membership.membership_cache()
+            cache.set(
+                membership.members_key(self.conversation.pk),
+                (cache.get(membership.GENERATION_KEY, 0), frozenset([self.alice.pk, self.bob.pk])),
+            )
+        self.assertTrue(membership.is_member(self.conversation.pk, self.eve.pk))
+    
+    def test_invalidating_everything_retires_all_sets(self):
+        """Test that invalidate() without ids drops every cached set"""
+        other = Conversation.objects.create()
+        other.participants.add(self.alice)
+        self.assertTrue(membership.is_member(self.conversation.pk, self.alice.pk))
+        self.assertTrue(membership.is_member(other.pk, self.alice.pk))
+        membership.invalidate()
+        with self.assertNumQueries(2):
+            membership.is_member(self.conversation.pk, self.alice.pk)
+            membership.is_member(other.pk, self.alice.pk)
+    
+    def test_thread_view_is_limited_to_participants(self):
+        """Test that outsiders get a 404 from the thread view"""
+        url = reverse('chat:thread', kwargs={'conversation_id': self.conversation.pk})
+        self.client.force_login(self.eve)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CHAT_WRITE_FLUSH_INTERVAL=0,
+)
+class ChatConsumerTests(TransactionTestCase):
+    """
+    Test cases for the chat websocket consumer.
+    """
+    
+    def setUp(self):
+        """Create a conversation with two participants and an outsider"""
+        membership.invalidate()
+        self.alice = User.objects.create_user(username='alice', email='alice@pucit.edu.pk', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@pucit.edu.pk', password='x')
+        self.eve = User.objects.create_user(username='eve', email='eve@pucit.edu.pk', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+    
+    def communicator(self, user):
+        communicator = WebsocketCommunicator(
+            ChatConsumer.as_asgi(), f'/ws/chat/{self.conversation.pk}/'
+        )
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'conversation_id': str(self.conversation.pk)}}
+        return communicator
+    
+    async def test_outsiders_are_rejected(self):
+        """Test that a logged-in non-participant can't join the group"""
+        connected, _ = await self.communicator(self.eve).connect()
+        self.assertFalse(connected)
+    
+    async def test_participants_exchange_messages(self):
+        """Test that a message is broadcast to the other participant and saved"""
+        alice, bob = self.communicator(self.alice), self.communicator(self.bob)
+        self.assertTrue((await alice.connect())[0])
+        self.assertTrue((await bob.connect())[0])
+        await alice.send_json_to({'message': 'Found your wallet'})
+        event = await next_event(bob)
+        self.assertEqual(event['message'], 'Found your wallet')
+        self.assertEqual(event['sender'], 'alice')
+        self.assertTrue(await Message.objects.filter(pk=event['id']).aexists())
+        await alice.disconnect()
+        await bob.disconnect()
+
+
+@override_settings(CHAT_HISTORY_PAGE_SIZE=5)
+class MessageHistoryTests(TestCase):
+    """
+    Test cases for windowed thread history.
+    """
+    
+    def setUp(self):
+        """Create a conversation with twelve messages"""
+        membership.invalidate()
+        self.alice = User.objects.create_user(username='alice', email='alice@pucit.edu.pk', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@pucit.edu.pk', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender=self.alice, content=f'message {i}')
+            for i in range(12)
+        ]
+        self.client.force_login(self.alice)
+    
+    def history(self, before):
+        url = reverse('chat:history', kwargs={'conversation_id': self.conversation.pk})
+        return self.client.get(url, {'before': before})
+    
+    def test_thread_renders_only_the_newest_window(self):
+        """Test that the thread page shows the last page of messages"""
+        response = self.client.get(
+            reverse('chat:thread', kwargs={'conversation_id': self.conversation.pk})
+        )
+        self.assertEqual(list(response.context['messages']), self.messages[-5:])
+        self.assertTrue(response.context['has_older'])
+        self.assertContains(response, 'Load earlier messages')
+    
+    def test_paging_back_walks_the_whole_history(self):
+        """Test that following before= cursors returns every message once"""
+        seen = []
+        before = self.messages[-5].id
+        while True:
+            page = self.history(before).json()
+            seen[:0] = [m['message'] for m in page['messages']]
+            if not page['has_more']:
+                break
+            before = page['messages'][0]['id']
+        self.assertEqual(seen, [f'message {i}' for i in range(7)])
+    
+    def test_history_uses_the_index(self):
+        """Test that a window is an index range scan, not a sort of the thread"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN check is SQLite-specific')
+        query = str(
+            Message.objects.filter(conversation=self.conversation, id__lt=10**9)
+            .order_by('-id')[:6].query
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {query}')
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('message_conversation_id_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+    
+    def test_history_requires_membership_and_cursor(self):
+        """Test that outsiders get a 404 and a missing cursor a 400"""
+        self.assertEqual(self.history('abc').status_code, 400)
+        outsider = User.objects.create_user(username='eve', email='eve@pucit.edu.pk', password='x')
+        self.client.force_login(outsider)
+        self.assertEqual(self.history(self.messages[-1].id).status_code, 404)
+
+
+
+@override_settings(CHAT_HISTORY_PAGE_SIZE=5)
+class MessageArchiveTests(TestCase):
+    """
+    Test cases for moving old messages to cold storage.
+    """
+    
+    def setUp(self):
+        """Create a conversation with twelve year-old and three new messages"""
+        membership.invalidate()
+        self.alice = User.objects.create_user(username='alice', email='alice@pucit.edu.pk', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@pucit.edu.pk', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+        old = timezone.now() - timedelta(days=400)
+        self.messages = [
+            Message.objects.create(
+                id=first_id_at(old + timedelta(minutes=i)),
+                conversation=self.conversation,
+                sender=(self.alice, self.bob)[i % 2],
+                content=f'message {i}',
+                created_at=old + timedelta(minutes=i),
+            )
+            for i in range(12)
+        ]
+        self.messages += [
+            Message.objects.create(conversation=self.conversation, sender=self.alice, content=f'message {i}')
+            for i in range(12, 15)
+        ]
+        self.client.force_login(self.alice)
+    
+    def archive(self):
+        return list(archive.archive_messages(timedelta(days=365), segment_size=5))
+    
+    def test_old_messages_move_to_segments(self):
+        """Test that only old messages are archived, in segments, once"""
+        self.assertEqual(self.archive(), [(self.conversation.pk, 12)])
+        self.assertEqual(
+            list(Message.objects.values_list('content', flat=True).order_by('id')),
+            ['message 12', 'message 13', 'message 14'],
+        )
+        segments = ArchivedMessageSegment.objects.order_by('first_message_id')
+        self.assertEqual([s.message_count for s in segments], [5, 5, 2])
+        self.assertEqual(segments[0].first_message_id, self.messages[0].id)
+        self.assertEqual(segments[2].last_message_id, self.messages[11].id)
+        self.assertEqual(self.archive(), [])
+    
+    def test_messages_from_before_snowflake_ids(self):
+        """Test that a cutoff before the id epoch still archives old-style ids"""
+        early = timezone.make_aware(datetime(2023, 1, 1))
+        legacy = [
+            Message.objects.create(
+                id=i + 1,
+                conversation=self.conversation,
+                sender=self.alice,
+                content=f'legacy {i}',
+                created_at=early + timedelta(days=i),
+            )
+            for i in range(3)
+        ]
+        
+        cutoff = early + timedelta(days=1, hours=12)
+        self.assertEqual(first_id_at(cutoff), 0)
+        self.assertEqual(archive.archive_conversation(self.conversation.pk, cutoff), 2)
+        segment = ArchivedMessageSegment.objects.get()
+        self.assertEqual((segment.first_message_id, segment.last_message_id), (legacy[0].id, legacy[1].id))
+        self.assertTrue(Message.objects.filter(pk=legacy[2].id).exists())
+        self.assertEqual(Message.objects.filter(conversation=self.conversation).count(), 16)
+    
+    def test_history_reads_through_to_the_archive(self):
+        """Test that paging back returns hot and archived messages alike"""
+        self.archive()
+        response = self.client.get(
+            reverse('chat:thread', kwargs={'conversation_id': self.conversation.pk})
+        )
+        self.assertEqual([m.id for m in response.context['messages']], [m.id for m in self.messages[-5:]])
+        self.assertTrue(response.context['has_older'])
+
+        seen = []
+        before = self.messages[-5].id
+        while True:
+            url = reverse('chat:history', kwargs={'conversation_id': self.conversation.pk})
+            page = self.client.get(url, {'before': before}).json()
+            seen[:0] = page['messages']
+            if not page['has_more']:
+                break
+            before = page['messages'][0]['id']
+        self.assertEqual(seen, [serialize_message(m) for m in self.messages[:10]])
+    
+    def test_archived_window_reads_only_the_segments_needed(self):
+        """Test that a page decompresses the newest segments it needs"""
+        self.archive()
+        with self.assertNumQueries(2):
+            # Segments, then the senders (the second segment has no new ones)
+            rows, has_more = archive.archived_window(self.conversation.pk, before=self.messages[9].id)
+        self.assertEqual([m.content for m in rows], [f'message {i}' for i in range(8, 3, -1)])
+        self.assertTrue(has_more)
+    
+    def test_archived_messages_of_deleted_users_are_skipped(self):
+        """Test that deleting a user also hides their archived messages"""
+        self.archive()
+        self.bob.delete()
+        rows, has_more = archive.archived_window(self.conversation.pk, limit=20)
+        self.assertEqual([m.content for m in rows], [f'message {i}' for i in range(10, -1, -2)])
+        self.assertFalse(has_more)
+
+
+class InboxStateTests(TestCase):
+    """
+    Test cases for per-user unread counts and last-message snapshots.
+    """
+    
+    def setUp(self):
+        """Create a conversation between two users"""
+        membership.invalidate()
+        self.alice = User.objects.create_user(username='alice', email='alice@pucit.edu.pk', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@pucit.edu.pk', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+    
+    def send(self, sender, *texts):
+        batch = [
+            Message(id=next_id(), conversation=self.conversation, sender=sender, content=text)
+            for text in texts
+        ]
+        persist_messages(batch)
+        return batch
+    
+    def state(self, user):
+        return ConversationMembership.objects.get(user=user, conversation=self.conversation)
+    
+    def test_participants_get_memberships(self):
+        """Test that adding and removing participants keeps rows in step"""
+        self.assertEqual(self.conversation.memberships.count(), 2)
+        self.bob.conversations.remove(self.conversation)
+        self.assertEqual(list(self.conversation.memberships.values_list('user', flat=True)), [self.alice.pk])
+    
+    def test_messages_update_unread_counts_and_snapshot(self):
+        """Test that a batch counts for the recipient only and moves the snapshot"""
+        self.send(self.alice, 'Is this your wallet?', 'It was in the library')
+        self.send(self.bob, 'Yes!')
+        self.send(self.alice, 'Great')
+        
+        bob, alice = self.state(self.bob), self.state(self.alice)
+        self.assertEqual((bob.unread_count, alice.unread_count), (3, 1))
+        self.assertEqual(bob.last_message_preview, 'Great')
+        self.assertEqual(bob.last_message_sender, self.alice)
+    
+    def test_older_batch_doesnt_rewind_the_snapshot(self):
+        """Test that a late batch still counts but keeps the newer snapshot"""
+        late = Message(id=next_id(), conversation=self.conversation, sender=self.alice, content='first')
+        self.send(self.alice, 'second')
+        persist_messages([late])
+        bob = self.state(self.bob)
+        self.assertEqual((bob.unread_count, bob.last_message_preview), (2, 'second'))
+    
+    def test_mark_read_recounts_newer_messages(self):
+        """Test that reading up to a message leaves only later ones unread"""
+        first, _, _ = self.send(self.alice, 'one', 'two', 'three')
+        self.assertTrue(inbox.mark_read(self.bob.pk, self.conversation.pk, first.id))
+        self.assertEqual(self.state(self.bob).unread_count, 2)
+        self.assertFalse(inbox.mark_read(self.bob.pk, self.conversation.pk, first.id))
+    
+    def test_thread_view_marks_read_and_badge_counts(self):
+        """Test the unread endpoint before and after opening the thread"""
+        self.send(self.alice, 'hello', 'are you there?')
+        self.client.force_login(self.bob)
+        self.assertEqual(self.client.get(reverse('chat:unread_count')).json(), {'unread': 2})
+        self.client.get(reverse('chat:thread', kwargs={'conversation_id': self.conversation.pk}))
+        self.assertEqual(self.client.get(reverse('chat:unread_count')).json(), {'unread': 0})
+    
+    def test_inbox_query_count_is_constant(self):
+        """Test that the inbox doesn't query per conversation"""
+        for i in range(3):
+            other = User.objects.create_user(username=f'user{i}', email=f'user{i}@pucit.edu.pk', password='x')
+            Conversation.objects.create().participants.add(self.bob, other)
+        self.send(self.alice, 'hi')
+        self.client.force_login(self.bob)
+        # session, user, memberships, participants
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('chat:inbox'))
+        memberships = list(response.context['memberships'])
+        self.assertEqual(len(memberships), 4)
+        self.assertEqual(memberships[0].conversation, self.conversation)
+        self.assertContains(response, 'hi')
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CHAT_WRITE_FLUSH_INTERVAL=0,
+    CHAT_READ_RECEIPT_INTERVAL=0,
+)
+class ReadReceiptTests(TransactionTestCase):
+    """
+    Test cases for coalesced read receipts.
+    """
+    
+    def setUp(self):
+        """Create a conversation with a few messages from alice"""
+        membership.invalidate()
+        self.alice = User.objects.create_user(username='alice', email='alice@pucit.edu.pk', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@pucit.edu.pk', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+        self.messages = [
+            Message(id=next_id(), conversation=self.conversation, sender=self.alice, content=f'message {i}')
+            for i in range(5)
+        ]
+        persist_messages(self.messages)
+    
+    def communicator(self, user):
+        communicator = WebsocketCommunicator(
+            ChatConsumer.as_asgi(), f'/ws/chat/{self.conversation.pk}/'
+        )
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'conversation_id': str(self.conversation.pk)}}
+        return communicator
+    
+    def test_receipt_is_one_range_update(self):
+        """Test that a receipt marks every earlier message with a fixed number of queries"""
+        key = (self.bob.pk, self.conversation.pk)
+        # BEGIN, membership UPDATE, messages UPDATE, COMMIT
+        with self.assertNumQueries(4):
+            applied = apply_receipts({key: self.messages[2].id})
+        self.assertEqual(applied, {key: self.messages[2].id})
+        self.assertEqual(
+            list(Message.objects.order_by('id').values_list('is_read', flat=True)),
+            [True, True, True, False, False],
+        )
+        self.assertEqual(ConversationMembership.objects.get(user=self.bob).unread_count, 2)
+        # Nothing new to mark: nothing to broadcast
+        self.assertEqual(apply_receipts({key: self.messages[1].id}), {})
+    
+    @override_settings(CHAT_READ_RECEIPT_INTERVAL=30)
+    async def test_acknowledgements_are_coalesced(self):
+        """Test that only the newest acknowledgement per user and conversation is kept"""
+        buffer = ReceiptBuffer()
+        for message in self.messages:
+            await buffer.acknowledge(self.bob.pk, self.conversation.pk, message.id)
+        await buffer.acknowledge(self.bob.pk, self.conversation.pk, self.messages[0].id)
+        self.assertEqual(buffer.pending(), 1)
+        self.assertFalse(await Message.objects.filter(is_read=True).aexists())
+        
+        await buffer.flush()
+        self.assertEqual(await Message.objects.filter(is_read=True).acount(), 5)
+    
+    async def test_sender_is_told_once(self):
+        """Test that a receipt reaches the sender as one chat.read event"""
+        alice, bob = self.communicator(self.alice), self.communicator(self.bob)
+        self.assertTrue((await alice.connect())[0])
+        self.assertTrue((await bob.connect())[0])
+        
+        await bob.send_json_to({'type': 'read', 'message_id': self.messages[-1].id})
+        event = await next_event(alice)
+        self.assertEqual(event, {
+            'type': 'chat.read', 'reader_id': self.bob.pk, 'message_id': self.messages[-1].id,
+        })
+        await bob.send_json_to({'type': 'read', 'message_id': self.messages[-1].id})
+        await bob.send_json_to({'type': 'read', 'message_id': 'everything'})
+        self.assertTrue(await no_event(alice))
+        await alice.disconnect()
+        await bob.disconnect()
+
+
+class ConversationPairKeyTests(TestCase):
+    """
+    Test cases for looking up 1:1 conversations by their pair key.
+    """
+    
+    def setUp(self):
+        """Create two users and an item owned by bob"""
+        membership.invalidate()
+        self.alice = User.objects.create_user(username='alice', email='alice@pucit.edu.pk', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@pucit.edu.pk', password='x', is_verified=True)
+        self.item = Item.objects.create(
+            title='Blue umbrella',
+            description='Blue umbrella left in room 12',
+            item_type='found',
+            category='other',
+            location='Room 12',
+            date_lost_found=date.today(),
+            user=self.bob,
+            is_approved=True,
+        )
+        self.client.force_login(self.alice)
+    
+    def test_same_pair_gets_the_same_conversation(self):
+        """Test that either user starting the chat lands in one conversation"""
+        first = self.client.get(reverse('chat:start_with_user', kwargs={'user_id': self.bob.pk}))
+        self.client.force_login(self.bob)
+        second = self.client.get(reverse('chat:start_with_user', kwargs={'user_id': self.alice.pk}))
+        self.assertEqual(first.url, second.url)
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.pair_key, f'{self.alice.pk}:{self.bob.pk}')
+        self.assertCountEqual(conversation.participants.all(), [self.alice, self.bob])
+    
+    def test_item_conversation_is_separate(self):
+        """Test that a chat about an item has its own key"""
+        self.client.get(reverse('chat:start_with_user', kwargs={'user_id': self.bob.pk}))
+        self.client.get(reverse('chat:start_from_item', kwargs={'item_id': self.item.pk}))
+        self.client.get(reverse('chat:start_from_item', kwargs={'item_id': self.item.pk}))
+        self.assertEqual(Conversation.objects.count(), 2)
+        self.assertEqual(
+            Conversation.objects.get(item=self.item).pair_key,
+            f'{self.alice.pk}:{self.bob.pk}:{self.item.pk}',
+        )
+    
+    def test_existing_conversation_is_one_lookup(self):
+        """Test that finding an existing conversation is a single SELECT"""
+        created, was_created = Conversation.get_or_create_for_pair(self.alice, self.bob)
+        self.assertTrue(was_created)
+        # SAVEPOINT, SELECT by pair_key, RELEASE
+        with self.assertNumQueries(3):
+            found, was_created = Conversation.get_or_create_for_pair(self.bob, self.alice)
+        self.assertEqual((found, was_created), (created, False))
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CHAT_WRITE_FLUSH_INTERVAL=0,
+    CHAT_FRAME_BATCH_WINDOW=0.05,
+)
+class BinaryFramingTests(TransactionTestCase):
+    """
+    Test cases for the msgpack chat subprotocol.
+    """
+    
+    def setUp(self):
+        """Create a conversation between two users"""
+        membership.invalidate()
+        self.alice = User.objects.create_user(username='alice', email='alice@pucit.edu.pk', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@pucit.edu.pk', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+    
+    def communicator(self, user, subprotocols=None):
+        communicator = WebsocketCommunicator(
+            ChatConsumer.as_asgi(), f'/ws/chat/{self.conversation.pk}/', subprotocols=subprotocols
+        )
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'conversation_id': str(self.conversation.pk)}}
+        return communicator
+    
+    def test_frame_is_a_msgpack_array(self):
+        """Test that joined pre-encoded events decode as one array"""
+        for count in (1, 15, 16, 70000):
+            events = [msgpack.packb([framing.READ, 1, n]) for n in range(count)]
+            self.assertEqual(len(msgpack.unpackb(framing.frame(events))), count)
+    
+    def test_malformed_commands_are_ignored(self):
+        """Test that client frames are decoded defensively"""
+        frame = msgpack.packb([[framing.MESSAGE, 'hi'], [framing.READ, 5], ['x'], 7])
+        self.assertEqual(framing.decode_frame(frame), [(framing.MESSAGE, 'hi'), (framing.READ, 5)])
+        self.assertEqual(framing.decode_frame(b'\xc1'), [])
+        self.assertEqual(framing.decode_json('not json'), [])
+    
+    async def test_binary_and_json_clients_share_a_conversation(self):
+        """Test that one broadcast reaches both protocols, batched for binary"""
+        alice = self.communicator(self.alice, subprotocols=[framing.SUBPROTOCOL])
+        bob = self.communicator(self.bob)
+        self.assertEqual(await alice.connect(), (True, framing.SUBPROTOCOL))
+        self.assertEqual(await bob.connect(), (True, None))
+        
+        await alice.send_to(bytes_data=msgpack.packb([[framing.MESSAGE, 'one'], [framing.MESSAGE, 'two']]))
+        self.assertEqual((await next_event(bob))['message'], 'one')
+        self.assertEqual((await next_event(bob))['message'], 'two')
+        
+        events = [
+            event for event in msgpack.unpackb(await alice.receive_from(timeout=2))
+            if event[0] != framing.PRESENCE
+        ]
+        self.assertEqual([(e[0], e[2], e[3], e[4]) for e in events], [
+            (framing.MESSAGE, self.alice.pk, 'alice', 'one'),
+            (framing.MESSAGE, self.alice.pk, 'alice', 'two'),
+        ])
+        self.assertEqual(await Message.objects.acount(), 2)
+        await alice.disconnect()
+        await bob.disconnect()
+    
+    def test_deflate_offers_are_accepted(self):
+        """Test that chat.server accepts permessage-deflate"""
+        self.assertIsInstance(accept_deflate([PerMessageDeflateOffer()]), PerMessageDeflateOfferAccept)
+        self.assertIsNone(accept_deflate([]))
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CHAT_PRESENCE_TICK=0.05,
+    CHAT_TYPING_TIMEOUT=0.2,
+)
+class PresenceTests(SimpleTestCase):
+    """
+    Test cases for coalesced presence and typing updates.
+    """
+    
+    async def listen(self, conversation_id):
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add(f'chat_{conversation_id}', channel)
+        return layer, channel
+    
+    async def updates(self, layer, channel, timeout=0.5):
+        """Presence events received until nothing arrives for `timeout`"""
+        events = []
+        while True:
+            try:
+                events.append(await asyncio.wait_for(layer.receive(channel), timeout))
+            except asyncio.TimeoutError:
+                return [json.loads(event['json'])['users'] for event in events]
+    
+    async def test_keystrokes_are_coalesced(self):
+        """Test that a burst of typing is one update per tick, then one when it stops"""
+        hub = PresenceHub()
+        layer, channel = await self.listen(101)
+        for user_id in (1, 2, 3):
+            hub.connect(101, user_id)
+        for _ in range(200):
+            for user_id in (1, 2, 3):
+                hub.typing(101, user_id)
+        
+        updates = await self.updates(layer, channel)
+        self.assertEqual(updates[0], [
+            {'id': user_id, 'online': True, 'typing': True} for user_id in (1, 2, 3)
+        ])
+        # Typing expires (one update), nothing else is sent
+        self.assertEqual(len(updates), 2)
+        self.assertFalse(any(user['typing'] for user in updates[1]))
+        for user_id in (1, 2, 3):
+            hub.disconnect(101, user_id)
+        await hub.tick()
+    
+    async def test_presence_lives_in_the_cache(self):
+        """Test that connections set presence keys and disconnects clear them"""
+        hub = PresenceHub()
+        layer, channel = await self.listen(102)
+        hub.connect(102, 7)
+        hub.connect(102, 7)
+        await self.updates(layer, channel)
+        self.assertEqual(await online_users(102, [7, 8]), {7})
+        
+        # The second socket keeps the user online
+        hub.disconnect(102, 7)
+        self.assertEqual(hub._connections, {(102, 7): 1})
+        hub.disconnect(102, 7)
+        self.assertEqual(await self.updates(layer, channel), [[{'id': 7, 'online': False, 'typing': False}]])
+        self.assertEqual(await online_users(102, [7]), set())
+    
+    def test_check_requires_a_shared_presence_cache(self):
+        """Test that a per-process presence cache is refused for multi-process chat"""
+        unix_layer = {'default': {
+            'BACKEND': 'chat.layers.UnixSocketChannelLayer',
+            'CONFIG': {'socket_dir': '/run/campus-connect/channels'},
+        }}
+        with override_settings(DEBUG=False, CHANNEL_LAYERS=unix_layer,
+                               CHAT_PRESENCE_CACHE='default', CHAT_MEMBERSHIP_CACHE='default'):
+            self.assertEqual([error.id for error in check_presence_cache(None)], ['chat.E005'])
+        # Participant sets must be shared as well
+        with override_settings(DEBUG=False, CHANNEL_LAYERS=unix_layer, CHAT_MEMBERSHIP_CACHE='default'):
+            self.assertIn('chat.E005', [error.id for error in check_presence_cache(None)])
+        # One process (in-memory layer) is fine
+        with override_settings(DEBUG=False, CHAT_PRESENCE_CACHE='default', CHAT_MEMBERSHIP_CACHE='default'):
+            self.assertEqual(check_presence_cache(None), [])
+    
+    def test_check_requires_a_private_presence_dir(self):
+        """Test that a file-based presence cache must live in a private directory"""
+        presence_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, presence_dir)
+        caches = {
+            **settings.CACHES,
+            'files': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': presence_dir},
+        }
+        with override_settings(CACHES=caches, CHAT_PRESENCE_CACHE='files', CHAT_MEMBERSHIP_CACHE='files'):
+            self.assertEqual(check_presence_cache(None), [])
+            os.chmod(presence_dir, 0o755)
+            self.assertEqual([error.id for error in check_presence_cache(None)], ['chat.E006'])
+
+
+class TokenBucketTests(SimpleTestCase):
+    """
+    Test cases for the inbound rate limiter.
+    """
+    
+    def test_burst_then_refill(self):
+        """Test that a bucket allows its burst, then refills at its rate"""
+        bucket = limits.TokenBucket(rate=2, burst=3)
+        self.assertEqual([bucket.take() for _ in range(4)], [True, True, True, False])
+        self.assertAlmostEqual(bucket.retry_after(), 0.5, places=2)
+        bucket.updated_at -= 1
+        self.assertEqual([bucket.take() for _ in range(3)], [True, True, False])
+    
+    def test_user_bucket_is_shared(self):
+        """Test that a user's connections share one bucket while they exist"""
+        first = limits.user_bucket(1)
+        self.assertIs(limits.user_bucket(1), first)
+        self.assertIsNot(limits.user_bucket(2), first)
+    
+    @patch.object(limits, '_warned_no_backpressure', False)
+    def test_warns_once_without_chat_server(self):
+        """Test that serving sockets without chat.server is logged once"""
+        with patch.object(limits, 'socket_backpressure', True), self.assertNoLogs('chat.limits'):
+            limits.warn_without_backpressure()
+        with self.assertLogs('chat.limits', 'WARNING'):
+            limits.warn_without_backpressure()
+        with self.assertNoLogs('chat.limits'):
+            limits.warn_without_backpressure()
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CHAT_WRITE_FLUSH_INTERVAL=0,
+    CHAT_SEND_RATE=0.01,
+    CHAT_SEND_BURST=2,
+)
+class FlowControlTests(TransactionTestCase):
+    """
+    Test cases for inbound throttling and bounded outbound queues.
+    """
+    
+    def setUp(self):
+        """Create a conversation between two users"""
+        membership.invalidate()
+        limits.metrics.clear()
+        self.alice = User.objects.create_user(username='alice', email='alice@pucit.edu.pk', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@pucit.edu.pk', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+    
+    def communicator(self, user):
+        communicator = WebsocketCommunicator(
+            ChatConsumer.as_asgi(), f'/ws/chat/{self.conversation.pk}/'
+        )
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'conversation_id': str(self.conversation.pk)}}
+        return communicator
+    
+    def detached_consumer(self):
+        """A consumer that records what it sends instead of using a socket"""
+        consumer = ChatConsumer()
+        consumer.scope = {'user': self.alice}
+        consumer.sent = []
+        
+        async def base_send(message):
+            consumer.sent.append(message)
+        consumer.base_send = base_send
+        return consumer
+    
+    async def test_spam_is_throttled(self):
+        """Test that commands over the limit are dropped with one notice"""
+        alice, bob = self.communicator(self.alice), self.communicator(self.bob)
+        self.assertTrue((await alice.connect())[0])
+        self.assertTrue((await bob.connect())[0])
+        for i in range(6):
+            await alice.send_json_to({'message': f'spam {i}'})
+        
+        self.assertEqual((await next_event(bob))['message'], 'spam 0')
+        self.assertEqual((await next_event(bob))['message'], 'spam 1')
+        self.assertTrue(await no_event(bob))
+        events = [await next_event(alice) for _ in range(3)]
+        self.assertEqual([e['type'] for e in events], ['chat.message', 'chat.message', 'chat.throttled'])
+        self.assertTrue(await no_event(alice))
+        self.assertEqual(await Message.objects.acount(), 2)
+        self.assertEqual(limits.metrics['inbound_throttled'], 4)
+        await alice.disconnect()
+        await bob.disconnect()
+    
+    @override_settings(CHAT_OUTBOUND_QUEUE_SIZE=3, CHAT_SLOW_CONSUMER_POLICY='drop')
+    async def test_slow_reader_drops_and_is_told(self):
+        """Test that a full outbound queue drops events and reports how many"""
+        consumer = self.detached_consumer()
+        for message_id in range(1, 6):
+            await consumer.forward(framing.read_event(self.bob.pk, message_id))
+        self.assertEqual(len(consumer.outbox), 3)
+        self.assertEqual(limits.metrics['outbound_dropped'], 2)
+        
+        await consumer.flush_outbox()
+        events = [json.loads(message['text']) for message in consumer.sent]
+        self.assertEqual([e.get('message_id') for e in events[:3]], [1, 2, 3])
+        self.assertEqual(events[3], {'type': 'chat.overflow', 'dropped': 2})
+    
+    @override_settings(CHAT_OUTBOUND_QUEUE_SIZE=3, CHAT_SLOW_CONSUMER_POLICY='disconnect')
+    async def test_slow_reader_is_disconnected(self):
+        """Test that the disconnect policy closes the socket once"""
+        consumer = self.detached_consumer()
+        for message_id in range(1, 7):
+            await consumer.forward(framing.read_event(self.bob.pk, message_id))
+        self.assertEqual(consumer.sent, [{'type': 'websocket.close', 'code': limits.CLOSE_SLOW_CONSUMER}])
+        self.assertEqual(limits.metrics['slow_consumer_disconnects'], 1)
+    
+    def test_metrics_are_staff_only(self):
+        """Test that the metrics endpoint is limited to staff"""
+        url = reverse('chat:metrics')
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.alice.is_staff = True
+        self.alice.save()
+        data = self.client.get(url).json()
+        self.assertEqual(data['outbound_queue_limit'], settings.CHAT_OUTBOUND_QUEUE_SIZE)
+
+
+# A chat.server on a Unix socket whose application floods every client
+# with `count` JSON messages of 8 KB once the client sends a frame
+FLOOD_SERVER = """
+import sys
+import django
+django.setup()
+from chat.server import ChatServer
+
+async def flood(scope, receive, send):
+    await receive()
+    await send({'type': 'websocket.accept'})
+    await receive()
+    for i in range(int(sys.argv[2])):
+        await send({'type': 'websocket.send', 'text': '%06d' % i + 'x' * 8000})
+    while (await receive())['type'] != 'websocket.disconnect':
+        pass
+
+ChatServer(application=flood, endpoints=['unix:' + sys.argv[1]], signal_handlers=False, verbosity=0).run()
+"""
+
+
+class SocketBackpressureTests(SimpleTestCase):
+    """
+    Test cases for chat.server's flow control, with a real server process
+    and a client that stops reading.
+    """
+    
+    MESSAGES = 400
+    
+    def start_server(self, policy):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'chat.sock')
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='campus_connect.settings',
+            PYTHONPATH=str(settings.BASE_DIR),
+            CHAT_SOCKET_SEND_BUFFER='32768',
+            CHAT_SLOW_CONSUMER_POLICY=policy,
+        )
+        server = subprocess.Popen(
+            [sys.executable, '-c', FLOOD_SERVER, path, str(self.MESSAGES)], env=env, cwd=settings.BASE_DIR
+        )
+        self.addCleanup(server.wait)
+        self.addCleanup(server.terminate)
+        deadline = time.monotonic() + 20
+        while not os.path.exists(path):
+            self.assertLess(time.monotonic(), deadline, 'chat.server did not start')
+            time.sleep(0.05)
+        return path
+    
+    def stalled_client(self, path):
+        """Connect, ask for the flood, then don't read for a second."""
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(client.close)
+        client.settimeout(5)
+        client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        client.connect(path)
+        client.sendall(
+            b'GET /ws/chat/1/ HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\n'
+            b'Connection: Upgrade\r\nSec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n'
+            b'Sec-WebSocket-Version: 13\r\n\r\n'
+        )
+        response = b''
+        while not response.endswith(b'\r\n\r\n'):
+            response += client.recv(1)
+        self.assertTrue(response.startswith(b'HTTP/1.1 101'))
+        # A masked (all-zero key) text frame
+        client.sendall(bytes([0x81, 0x82, 0, 0, 0, 0]) + b'go')
+        time.sleep(1)
+        return client
+    
+    def read_all(self, client):
+        """The text messages received until the stream ends or goes quiet."""
+        client.settimeout(1)
+        data = b''
+        try:
+            while chunk := client.recv(65536):
+                data += chunk
+        except (TimeoutError, ConnectionResetError):
+            pass
+        messages = []
+        offset = 0
+        while offset + 2 <= len(data):
+            length = data[offset + 1] & 0x7f
+            offset += 2
+            if length == 126:
+                length, = struct.unpack('>H', data[offset:offset + 2])
+                offset += 2
+            elif length == 127:
+                length, = struct.unpack('>Q', data[offset:offset + 8])
+                offset += 8
+            if offset + length > len(data):
+                break
+            messages.append(data[offset:offset + length].decode())
+            offset += length
+        return messages
+    
+    def test_stalled_reader_drops_and_is_told(self):
+        """Test that the drop policy bounds the buffer and reports what was dropped"""
+        client = self.stalled_client(self.start_server('drop'))
+        messages = self.read_all(client)
+        
+        notices = [json.loads(m) for m in messages if m.startswith('{')]
+        self.assertEqual(len(notices), 1)
+        self.assertEqual(notices[0]['type'], 'chat.overflow')
+        self.assertGreater(notices[0]['dropped'], 0)
+        self.assertEqual(len(messages) - 1 + notices[0]['dropped'], self.MESSAGES)
+    
+    def test_stalled_reader_is_disconnected(self):
+        """Test that the disconnect policy drops the connection of a stalled reader"""
+        client = self.stalled_client(self.start_server('disconnect'))
+        messages = self.read_all(client)
+        
+        self.assertLess(len(messages), self.MESSAGES)
+        # The stream ended: nothing more arrives
+        client.settimeout(1)
+        try:
+            self.assertEqual(client.recv(1), b'')
+        except ConnectionResetError:
+            pass
@@ -8,4 +8,7 @@ urlpatterns = [
     path('start/<int:user_id>/', views.start_chat_with_user, name='start_with_user'),
     path('start/item/<int:item_id>/', views.start_chat_from_item, name='start_from_item'),
     path('thread/<int:conversation_id>/', views.thread, name='thread'),
+    path('thread/<int:conversation_id>/history/', views.history, name='history'),
+    path('unread/', views.unread_count, name='unread_count'),
+    path('metrics/', views.socket_metrics, name='metrics'),
 ]
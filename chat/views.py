@@ -1,20 +1,25 @@
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.db.models import Q
-from django.http import Http404
+from django.db.models import Max, Q
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_GET
 from items.models import Item
 from users.models import User
+from . import inbox as inbox_state, limits, membership
+from .history import message_window, serialize_message
 from .models import Conversation, Message
 
 
 @login_required
 def inbox(request):
     """List conversations for the current user"""
-    conversations = Conversation.objects.filter(participants=request.user).prefetch_related('participants').order_by('-last_message_at', '-updated_at')
+    # Per-user rows with unread counts and last-message snapshots
+    memberships = inbox_state.inbox_for(request.user)
     return render(request, 'chat/inbox.html', {
         'title': 'Messages',
-        'conversations': conversations,
+        'memberships': memberships,
     })
 
 
@@ -26,12 +31,8 @@ def start_chat_with_user(request, user_id: int):
         messages.info(request, 'This is your own account.')
         return redirect('chat:inbox')
 
-    # Find existing conversation between the two users
-    conv = Conversation.objects.filter(participants=request.user).filter(participants=other).first()
-    if not conv:
-        conv = Conversation.objects.create()
-        conv.participants.add(request.user, other)
-        conv.touch()
+    # One indexed lookup on the pair key; created on first contact
+    conv, _ = Conversation.get_or_create_for_pair(request.user, other)
 
     return redirect('chat:thread', conversation_id=conv.id)
 
@@ -45,12 +46,8 @@ def start_chat_from_item(request, item_id: int):
         messages.info(request, 'This is your own item.')
         return redirect('items:detail', pk=item.pk)
 
-    # Try to find an existing conversation linked to this item between both users
-    conv = Conversation.objects.filter(item=item).filter(participants=request.user).filter(participants=owner).first()
-    if not conv:
-        conv = Conversation.objects.create(item=item)
-        conv.participants.add(request.user, owner)
-        conv.touch()
+    # The conversation about this item between both users
+    conv, _ = Conversation.get_or_create_for_pair(request.user, owner, item=item)
 
     return redirect('chat:thread', conversation_id=conv.id)
 
@@ -58,14 +55,56 @@ def start_chat_from_item(request, item_id: int):
 @login_required
 def thread(request, conversation_id: int):
     """Show a single conversation thread"""
-    conv = get_object_or_404(Conversation, pk=conversation_id)
-    if not conv.participants.filter(pk=request.user.pk).exists():
+    if not membership.is_member(conversation_id, request.user.pk):
         raise Http404("You are not a participant of this conversation")
+    conv = get_object_or_404(Conversation, pk=conversation_id)
 
-    messages_qs = conv.messages.select_related('sender')
+    # Only the newest window; older messages come from chat:history
+    messages_qs, has_older = message_window(conv.pk)
+    if messages_qs:
+        inbox_state.mark_read(request.user.pk, conv.pk, messages_qs[-1].id)
+
+    # How far the other participants have read, for the "Seen" marker
+    read_up_to = conv.memberships.exclude(user=request.user).aggregate(
+        read_up_to=Max('last_read_message_id')
+    )['read_up_to']
 
     return render(request, 'chat/thread.html', {
         'title': 'Conversation',
         'conversation': conv,
         'messages': messages_qs,
+        'has_older': has_older,
+        'read_up_to': read_up_to,
+    })
+
+
+@login_required
+@require_GET
+def history(request, conversation_id: int):
+    """JSON page of messages older than ?before=<message id>"""
+    if not membership.is_member(conversation_id, request.user.pk):
+        raise Http404("You are not a participant of this conversation")
+    try:
+        before = int(request.GET['before'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'A numeric "before" message id is required.'}, status=400)
+
+    messages_qs, has_more = message_window(conversation_id, before=before)
+    return JsonResponse({
+        'messages': [serialize_message(m) for m in messages_qs],
+        'has_more': has_more,
     })
+
+
+@login_required
+@require_GET
+def unread_count(request):
+    """JSON total of unread messages, for the navbar badge"""
+    return JsonResponse({'unread': inbox_state.unread_total(request.user.pk)})
+
+
+@staff_member_required
+@require_GET
+def socket_metrics(request):
+    """Chat socket flow control counters of the process serving this request"""
+    return JsonResponse(limits.snapshot())
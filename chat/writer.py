@@ -0,0 +1,159 @@
+"""
+Write-behind persistence for chat messages.
+
+ChatConsumer used to run three queries per message (fetch the
+conversation, insert the message, touch the conversation), each through
+the database_sync_to_async thread pool. Instead, MessageWriter.write()
+builds the Message in memory with its final id (chat.ids) and created_at
+and returns it at once, so the consumer can broadcast immediately. The
+writer's flush task then persists queued messages in batches:
+
+- one bulk_create() per batch of up to CHAT_WRITE_BATCH_SIZE messages,
+  flushed at least every CHAT_WRITE_FLUSH_INTERVAL seconds;
+- one UPDATE of last_message_at per conversation per batch, and one of
+  its participants' unread counts and last-message snapshot (chat.inbox).
+
+Queued messages are flushed when a consumer disconnects (which daphne
+does for every socket on shutdown). A flush task that died is restarted
+by the next write(). With CHAT_WRITE_FLUSH_INTERVAL = 0
+every message is written immediately (used by tests).
+"""
+
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import inbox
+from .ids import next_id
+from .models import Conversation, Message
+
+
+logger = logging.getLogger(__name__)
+
+
+def persist_messages(batch):
+    """Insert a batch of messages and bump their conversations."""
+    try:
+        with transaction.atomic():
+            Message.objects.bulk_create(batch)
+            _touch_conversations(batch)
+            inbox.record_messages(batch)
+    except IntegrityError:
+        # e.g. a conversation was deleted meanwhile; keep the rest
+        saved = []
+        for message in batch:
+            try:
+                with transaction.atomic():
+                    message.save(force_insert=True)
+                saved.append(message)
+            except IntegrityError:
+                logger.warning('Dropped chat message %s', message.id)
+        with transaction.atomic():
+            _touch_conversations(saved)
+            inbox.record_messages(saved)
+
+
+def _touch_conversations(messages):
+    """One last_message_at UPDATE per conversation."""
+    latest = {}
+    for message in messages:
+        previous = latest.get(message.conversation_id)
+        if previous is None or message.created_at > previous:
+            latest[message.conversation_id] = message.created_at
+
+    now = timezone.now()
+    for conversation_id, created_at in latest.items():
+        Conversation.objects.filter(
+            Q(last_message_at__lt=created_at) | Q(last_message_at__isnull=True),
+            pk=conversation_id,
+        ).update(last_message_at=created_at, updated_at=now)
+
+
+class MessageWriter:
+    """Queues chat messages and writes them in batches."""
+
+    def __init__(self):
+        self._pending = []
+        self._wakeup = None
+        self._task = None
+        self._loop = None
+
+    async def write(self, conversation_id, sender_id, content):
+        """
+        Queue a message for writing and return it (unsaved, but with its
+        final id and created_at).
+        """
+        message = Message(
+            id=next_id(),
+            conversation_id=conversation_id,
+            sender_id=sender_id,
+            content=content,
+            created_at=timezone.now(),
+        )
+        if settings.CHAT_WRITE_FLUSH_INTERVAL <= 0:
+            await database_sync_to_async(persist_messages)([message])
+            return message
+
+        self._pending.append(message)
+        self._ensure_task()
+        if len(self._pending) >= settings.CHAT_WRITE_BATCH_SIZE:
+            self._wakeup.set()
+        return message
+
+    def pending(self):
+        return len(self._pending)
+
+    async def flush(self):
+        """Write everything queued so far."""
+        while self._pending:
+            batch = self._pending[:settings.CHAT_WRITE_BATCH_SIZE]
+            del self._pending[:len(batch)]
+            try:
+                await database_sync_to_async(persist_messages)(batch)
+            except DatabaseError:
+                # Keep the messages (in order) for the next attempt
+                self._pending[:0] = batch
+                if settings.CHAT_WRITE_FLUSH_INTERVAL > 0:
+                    self._ensure_task()
+                raise
+
+    def _ensure_task(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=settings.CHAT_WRITE_FLUSH_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except DatabaseError:
+                logger.exception('Writing chat messages failed; retrying')
+                await asyncio.sleep(settings.CHAT_WRITE_FLUSH_INTERVAL)
+                continue
+            except Exception:
+                # Only database errors keep the batch; don't let anything
+                # else stop the flusher for the messages queued after it
+                logger.exception('Writing chat messages failed; dropped a batch')
+                continue
+            if not self._pending:
+                # Idle: the next write() starts a new task
+                self._task = None
+                return
+
+
+message_writer = MessageWriter()
@@ -1,6 +1,10 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
 from .models import Item, ItemImage
+from .counts import invalidate_item_counts
+from .images import thumbnail_url
+from . import matching, related
 
 
 class ItemImageInline(admin.TabularInline):
@@ -138,16 +142,35 @@ class ItemAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 5px;" />',
-                obj.image.url
+                thumbnail_url(obj.image)
             )
         return format_html('<span style="color: gray;">No image</span>')
     
     image_preview.short_description = 'Image'
     
+    def update_items(self, queryset, **changes):
+        """
+        Apply `changes` to the selected items; returns how many changed.
+        
+        queryset.update() skips model signals, so this redoes what the
+        items.signals handlers would have done for the changed items.
+        The queryset still carries the changelist filters (e.g. "not
+        approved"), which the update may no longer match, so the items
+        are reloaded by primary key. (The update also bumps updated_at,
+        which moves cached item cards to fresh keys.)
+        """
+        pks = list(queryset.values_list('pk', flat=True))
+        updated = Item.objects.filter(pk__in=pks).update(updated_at=timezone.now(), **changes)
+        invalidate_item_counts()
+        for item in Item.objects.filter(pk__in=pks):
+            related.item_changed(item)
+            matching.item_changed(item)
+        return updated
+    
     @admin.action(description='✅ Approve selected items')
     def approve_items(self, request, queryset):
         """Bulk action to approve multiple items"""
-        updated = queryset.update(is_approved=True)
+        updated = self.update_items(queryset, is_approved=True)
         self.message_user(
             request,
             f'{updated} item(s) have been approved and are now publicly visible.'
@@ -156,7 +179,7 @@ class ItemAdmin(admin.ModelAdmin):
     @admin.action(description='❌ Unapprove selected items')
     def unapprove_items(self, request, queryset):
         """Bulk action to unapprove items"""
-        updated = queryset.update(is_approved=False)
+        updated = self.update_items(queryset, is_approved=False)
         self.message_user(
             request,
             f'{updated} item(s) have been unapproved and hidden from public view.'
@@ -165,7 +188,7 @@ class ItemAdmin(admin.ModelAdmin):
     @admin.action(description='📌 Mark as Claimed')
     def mark_as_claimed(self, request, queryset):
         """Bulk action to mark items as claimed"""
-        updated = queryset.update(status='claimed')
+        updated = self.update_items(queryset, status='claimed')
         self.message_user(
             request,
             f'{updated} item(s) have been marked as claimed.'
@@ -174,7 +197,7 @@ class ItemAdmin(admin.ModelAdmin):
     @admin.action(description='✔️ Mark as Returned')
     def mark_as_returned(self, request, queryset):
         """Bulk action to mark items as returned"""
-        updated = queryset.update(status='returned')
+        updated = self.update_items(queryset, status='returned')
         self.message_user(
             request,
             f'{updated} item(s) have been marked as returned.'
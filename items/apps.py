@@ -9,3 +9,7 @@ class ItemsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'items'
     verbose_name = 'Lost & Found Items'
+
+    def ready(self):
+        # Register signal handlers (search index sync, etc.)
+        from . import signals  # noqa: F401
@@ -0,0 +1,74 @@
+"""
+Cached item card fragments.
+
+The same item cards are rendered on the listings, the detail page
+(related items, possible matches) and the dashboard. Each rendered card
+is cached under (variant, item.pk, item.updated_at), so any save of the
+item moves it to a fresh key and stale cards simply expire. All cards of
+a page are fetched with one cache.get_many() round-trip, and only the
+misses are rendered (and stored with one set_many()).
+
+Cards must only depend on the item itself, never on the request or the
+viewing user, since everyone shares the cached copy.
+
+Usage in templates (items.templatetags.item_cards):
+
+    {% load item_cards %}
+    {% item_cards page_obj "grid" as cards %}
+    {% for card in cards %}{{ card }}{% endfor %}
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Item
+
+
+CARD_TEMPLATES = {
+    'grid': 'items/_item_card.html',
+    'compact': 'items/_item_card_compact.html',
+    'row': 'items/_item_card_row.html',
+}
+
+
+def card_key(item, variant):
+    return f'item-card:{variant}:{item.pk}:{item.updated_at.timestamp()}'
+
+
+def render_card(item, variant):
+    """Render one card without the cache."""
+    return mark_safe(render_to_string(CARD_TEMPLATES[variant], {'item': item}))
+
+
+def render_cards(items, variant):
+    """Rendered cards for a sequence of items, in order."""
+    items = list(items)
+    timeout = settings.ITEM_CARD_CACHE_TIMEOUT
+    if timeout <= 0:
+        return [render_card(item, variant) for item in items]
+
+    keys = [card_key(item, variant) for item in items]
+    cached = cache.get_many(keys)
+    missing = {}
+    cards = []
+    for item, key in zip(items, keys):
+        card = cached.get(key)
+        if card is None:
+            card = missing[key] = render_card(item, variant)
+        cards.append(mark_safe(card))
+    if missing:
+        cache.set_many({key: str(card) for key, card in missing.items()}, timeout)
+    return cards
+
+
+def invalidate_image_cards(image_name):
+    """Drop the cards of the item using an image (e.g. new variants exist)."""
+    keys = [
+        card_key(item, variant)
+        for item in Item.objects.filter(image=image_name).only('pk', 'updated_at')
+        for variant in CARD_TEMPLATES
+    ]
+    if keys:
+        cache.delete_many(keys)
@@ -0,0 +1,196 @@
+"""
+Result counts for item listings.
+
+Listing pages show how many items match the current filters. Counting
+the same filtered queryset on every request is wasteful, so:
+
+- Exact counts are cached per normalized filter signature. Every cached
+  count shares a generation number that is bumped whenever an Item is
+  saved or deleted (see items.signals), which invalidates them all at once.
+- Once the items table is larger than ITEM_COUNT_ESTIMATE_THRESHOLD rows,
+  the database planner's estimate is used instead of COUNT(*):
+  EXPLAIN row estimates on PostgreSQL, sqlite_stat1 on SQLite.
+
+The resulting ItemCount is handed to the paginator so nothing is
+counted twice.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, DatabaseError
+
+from .search import tokenize
+
+
+GENERATION_KEY = 'item-count:generation'
+
+# Filters that are plain equality tests on an Item column
+EQUALITY_FILTERS = ('is_approved', 'status', 'item_type', 'category')
+
+# Filters that are one-sided ranges on date_lost_found
+RANGE_FILTERS = ('date_from', 'date_to')
+
+# SQLite's own planner assumes one range bound keeps a quarter of the rows
+SQLITE_RANGE_SELECTIVITY = 0.25
+
+
+@dataclass(frozen=True)
+class ItemCount:
+    """A result count and whether it is exact or a planner estimate."""
+    value: int
+    exact: bool = True
+
+    def __int__(self):
+        return self.value
+
+
+def filter_signature(filters):
+    """
+    Normalize listing filters into a stable, hashable signature.
+    Empty values are dropped, so equivalent requests share a cache entry.
+    """
+    signature = {}
+    for key, value in filters.items():
+        if value in (None, '', [], ()):
+            continue
+        if key == 'search':
+            value = ' '.join(tokenize(value))
+            if not value:
+                continue
+        elif isinstance(value, date):
+            value = value.isoformat()
+        signature[key] = value
+    return signature
+
+
+def _generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def _cache_key(signature):
+    digest = hashlib.sha1(
+        json.dumps(signature, sort_keys=True).encode()
+    ).hexdigest()
+    return f'item-count:{_generation()}:{digest}'
+
+
+def invalidate_item_counts():
+    """Drop every cached count (called when items change)."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, timeout=None)
+
+
+def table_row_estimate():
+    """
+    The planner's idea of how many rows items_item holds.
+    Returns None when no statistics have been gathered yet.
+    """
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = 'items_item'::regclass"
+                )
+                row = cursor.fetchone()
+                return row[0] if row and row[0] >= 0 else None
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    "SELECT stat FROM sqlite_stat1 WHERE tbl = 'items_item' LIMIT 1"
+                )
+                row = cursor.fetchone()
+                return int(row[0].split()[0]) if row else None
+    except DatabaseError:
+        # sqlite_stat1 only exists after ANALYZE has run
+        pass
+    return None
+
+
+def _postgres_estimate(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _sqlite_estimate(signature, table_rows):
+    """
+    Estimate matching rows from sqlite_stat1.
+
+    Each stat row reads "N a b c ...": N rows in the table, about `a` rows
+    per distinct value of the first index column, `b` per distinct pair of
+    the first two columns, and so on. The index whose leading columns are
+    all equality-filtered gives the estimate.
+    """
+    equal = {key for key in EQUALITY_FILTERS if key in signature}
+    estimate = table_rows
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT idx, stat FROM sqlite_stat1 WHERE tbl = 'items_item'")
+        stats = cursor.fetchall()
+        for index_name, stat in stats:
+            if not index_name:
+                continue
+            cursor.execute(
+                "SELECT name FROM pragma_index_info(%s) ORDER BY seqno", [index_name]
+            )
+            columns = [row[0] for row in cursor.fetchall()]
+            numbers = [int(part) for part in stat.split() if part.isdigit()]
+            prefix = 0
+            while prefix < len(columns) and columns[prefix] in equal:
+                prefix += 1
+            if prefix and prefix < len(numbers):
+                estimate = min(estimate, numbers[prefix])
+
+    for key in RANGE_FILTERS:
+        if key in signature:
+            estimate *= SQLITE_RANGE_SELECTIVITY
+    return int(estimate)
+
+
+def count_items(queryset, filters):
+    """
+    Count the rows of a filtered Item queryset.
+
+    `filters` describes how the queryset was built (the same keys as
+    ItemSearchForm plus fixed view filters such as item_type/status) and
+    is used as the cache key. Returns an ItemCount.
+    """
+    signature = filter_signature(filters)
+    key = _cache_key(signature)
+
+    cached = cache.get(key)
+    if cached is not None:
+        return ItemCount(*cached)
+
+    result = None
+    table_rows = table_row_estimate()
+    threshold = settings.ITEM_COUNT_ESTIMATE_THRESHOLD
+    # Full-text matches have no useful planner statistics; count those
+    if table_rows is not None and table_rows > threshold and 'search' not in signature:
+        try:
+            if connection.vendor == 'postgresql':
+                result = ItemCount(_postgres_estimate(queryset), exact=False)
+            elif connection.vendor == 'sqlite':
+                result = ItemCount(_sqlite_estimate(signature, table_rows), exact=False)
+        except DatabaseError:
+            result = None
+
+    if result is None:
+        result = ItemCount(queryset.count())
+
+    cache.set(key, (result.value, result.exact), settings.ITEM_COUNT_CACHE_TIMEOUT)
+    return result
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Item, ItemImage
+from .uploads import HeaderCheckedImageField
 
 
 class ItemForm(forms.ModelForm):
@@ -30,6 +31,11 @@ class ItemForm(forms.ModelForm):
             'reward_amount',
         ]
         
+        # Header-only image check (no full decode on the request)
+        field_classes = {
+            'image': HeaderCheckedImageField,
+        }
+        
         widgets = {
             'title': forms.TextInput(attrs={
                 'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500 focus:border-transparent',
@@ -0,0 +1,225 @@
+"""
+Resized image variants for item photos.
+
+Uploads are kept as-is (up to 5MB), but pages never serve them directly.
+For every Item.image / ItemImage.image a set of renditions is written
+to MEDIA_ROOT under VARIANT_DIR:
+
+    variants/items/2025/01/31/wallet.320w.webp
+    variants/items/2025/01/31/wallet.320w.jpg
+
+at each of VARIANT_WIDTHS (never wider than the original). Templates use
+{% responsive_image %} (items.templatetags.item_images), which emits a
+<picture> with WebP and JPEG srcsets and lazy loading.
+
+Variants are generated off the request path: saving an item schedules
+the work on a small thread pool once the transaction commits, right after
+the upload is sanitized (items.uploads.sanitize_stored). Until the
+variants exist, templates fall back to the original file and queue the
+missing variants on that pool; pages never generate them themselves.
+manage.py generate_image_variants backfills existing uploads.
+
+Which renditions exist is cached per original (available_variants), so
+rendering doesn't stat the storage for every width and format: for
+ITEM_VARIANT_CACHE_TIMEOUT once they are all there, for
+VARIANT_PENDING_TIMEOUT while some are missing. Writing variants
+refreshes the entry, and deleting a photo's row deletes its renditions
+(items.signals).
+"""
+
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .cards import invalidate_image_cards
+from .uploads import sanitize_stored
+
+
+VARIANT_DIR = 'variants'
+
+# Rendition widths in pixels: 48px thumbnails (2x), cards, detail page
+VARIANT_WIDTHS = (96, 320, 640, 1280)
+
+# Output format -> (file extension, Pillow save options)
+VARIANT_FORMATS = {
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Seconds an incomplete set of renditions is cached for
+VARIANT_PENDING_TIMEOUT = 60
+
+
+def variant_name(name, width, fmt):
+    """Storage name of one rendition of an original image."""
+    root = posixpath.splitext(name)[0]
+    return f'{VARIANT_DIR}/{root}.{width}w.{VARIANT_FORMATS[fmt][0]}'
+
+
+def variant_widths(original_width):
+    """The rendition widths used for an original of the given width."""
+    widths = [width for width in VARIANT_WIDTHS if width < original_width]
+    # Narrow originals still get one (re-encoded) rendition
+    return widths or [VARIANT_WIDTHS[0]]
+
+
+def variants_cache_key(name):
+    return f'image-variants:{name}'
+
+
+def _find_variants(name):
+    found = {}
+    for fmt in VARIANT_FORMATS:
+        for width in VARIANT_WIDTHS:
+            candidate = variant_name(name, width, fmt)
+            if default_storage.exists(candidate):
+                found.setdefault(fmt, []).append((width, candidate))
+    return found
+
+
+def _remember_variants(name, found):
+    complete = len(found) == len(VARIANT_FORMATS)
+    timeout = settings.ITEM_VARIANT_CACHE_TIMEOUT if complete else VARIANT_PENDING_TIMEOUT
+    cache.set(variants_cache_key(name), found, timeout)
+
+
+def available_variants(name):
+    """
+    The renditions that exist for an original, as {fmt: [(width, name)]},
+    smallest first. Empty if none have been generated yet.
+    """
+    found = cache.get(variants_cache_key(name))
+    if found is None:
+        found = _find_variants(name)
+        _remember_variants(name, found)
+    return found
+
+
+def delete_variants(name):
+    """Delete every rendition of an original."""
+    for fmt in VARIANT_FORMATS:
+        for width in VARIANT_WIDTHS:
+            default_storage.delete(variant_name(name, width, fmt))
+    cache.delete(variants_cache_key(name))
+
+
+def thumbnail_url(image):
+    """URL of the smallest JPEG rendition of an image (or the original)."""
+    if not image:
+        return ''
+    variants = available_variants(image.name)
+    if 'jpeg' not in variants:
+        variant_queue.queue_missing(image.name)
+        return image.url
+    return default_storage.url(variants['jpeg'][0][1])
+
+
+def generate_variants(name):
+    """
+    Write any missing renditions of an original image.
+    Returns the number of files written.
+    """
+    found = _find_variants(name)
+    if len(found) == len(VARIANT_FORMATS):
+        _remember_variants(name, found)
+        return 0
+    try:
+        with default_storage.open(name, 'rb') as original:
+            image = Image.open(original)
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+            image.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        return 0
+
+    written = 0
+    for width in variant_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = None
+        for fmt, (_, options) in VARIANT_FORMATS.items():
+            target = variant_name(name, width, fmt)
+            if default_storage.exists(target):
+                continue
+            if resized is None:
+                resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            output = resized
+            if fmt == 'jpeg' and output.mode == 'RGBA':
+                output = Image.new('RGB', output.size, 'white')
+                output.paste(resized, mask=resized.getchannel('A'))
+            buffer = BytesIO()
+            output.save(buffer, fmt.upper(), **options)
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+            written += 1
+    _remember_variants(name, _find_variants(name))
+    return written
+
+
+def process_upload(name):
+    """Sanitize a stored upload, then write its renditions."""
+    sanitize_stored(name)
+    written = generate_variants(name)
+    if written:
+        # Cached cards still point at the original file
+        invalidate_image_cards(name)
+    return written
+
+
+class VariantQueue:
+    """Processes uploads on a small background thread pool."""
+
+    def __init__(self):
+        self._executor = None
+        self._queued = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, name):
+        """
+        Queue an original for processing, once the current transaction
+        commits. With ITEM_IMAGE_WORKERS = 0 it runs inline.
+        """
+        if not name:
+            return
+        if settings.ITEM_IMAGE_WORKERS <= 0:
+            transaction.on_commit(lambda: process_upload(name))
+        else:
+            transaction.on_commit(lambda: self._submit(name))
+
+    def queue_missing(self, name):
+        """
+        Queue an original whose renditions a page found missing. Never
+        runs inline: with ITEM_IMAGE_WORKERS = 0 it is left to the upload
+        handling and manage.py generate_image_variants.
+        """
+        if name and settings.ITEM_IMAGE_WORKERS > 0:
+            self._submit(name)
+
+    def _submit(self, name):
+        with self._lock:
+            if name in self._queued:
+                return
+            self._queued.add(name)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.ITEM_IMAGE_WORKERS,
+                    thread_name_prefix='item-image',
+                )
+        self._executor.submit(self._run, name)
+
+    def _run(self, name):
+        try:
+            process_upload(name)
+        finally:
+            with self._lock:
+                self._queued.discard(name)
+
+
+variant_queue = VariantQueue()
@@ -0,0 +1,76 @@
+import time
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from items.models import Item
+from items.views import item_list
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Time item_list page renders with and without the item card '
+        'fragment cache. Sample items are created in a rolled-back transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=12,
+                            help='Minimum number of listed items (default 12).')
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.ensure_items(options['items'])
+                uncached = self.time_renders(options['iterations'], cache_timeout=0)
+                cache.clear()
+                cached = self.time_renders(options['iterations'], cache_timeout=3600)
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f'Without card cache: {uncached:.2f} ms per render')
+        self.stdout.write(f'With card cache:    {cached:.2f} ms per render')
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {uncached / cached:.2f}x'))
+
+    def ensure_items(self, count):
+        missing = count - Item.objects.filter(is_approved=True).count()
+        if missing <= 0:
+            return
+        user = get_user_model().objects.create_user(
+            username='benchmark-user', email='benchmark@pucit.edu.pk', password=None
+        )
+        for i in range(missing):
+            Item.objects.create(
+                title=f'Benchmark item {i}',
+                description='A sample item used to time the listing page. ' * 4,
+                item_type='lost' if i % 2 else 'found',
+                category='other',
+                location='Main library',
+                date_lost_found=date.today(),
+                user=user,
+                is_approved=True,
+            )
+
+    def time_renders(self, iterations, cache_timeout):
+        factory = RequestFactory()
+        with override_settings(ITEM_CARD_CACHE_TIMEOUT=cache_timeout):
+            def render():
+                request = factory.get('/items/')
+                request.user = AnonymousUser()
+                item_list(request).content
+
+            render()  # warm up (and fill the card cache)
+            start = time.perf_counter()
+            for _ in range(iterations):
+                render()
+            return (time.perf_counter() - start) * 1000 / iterations
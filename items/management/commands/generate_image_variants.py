@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from items.images import generate_variants
+from items.models import Item, ItemImage
+
+
+class Command(BaseCommand):
+    help = 'Generate missing resized renditions of every item photo.'
+
+    def handle(self, *args, **options):
+        names = set(
+            Item.objects.exclude(image='').exclude(image=None).values_list('image', flat=True)
+        )
+        names.update(ItemImage.objects.values_list('image', flat=True))
+        written = sum(generate_variants(name) for name in sorted(names))
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} variant files for {len(names)} images.'
+        ))
@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from items.matching import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute lost-to-found matches for every listed item.'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = rebuild_all()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} matches in {elapsed:.2f}s.'))
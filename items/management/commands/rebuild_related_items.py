@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from items.related import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed related items for every listed item.'
+
+    def handle(self, *args, **options):
+        rows = rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} related item rows.'))
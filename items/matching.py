@@ -0,0 +1,450 @@
+"""
+Lost-to-found matching engine.
+
+Every approved, active item is turned into a hashed bag-of-n-grams
+vector: words and word pairs from the title, description and location,
+hashed into DIMENSIONS buckets, log-scaled and L2-normalized. The
+vectors of one (category, item_type) pool live in a NumPy matrix, so
+scoring an item against every opposite-type item in its category is a
+single matrix-vector product, and a full rebuild is a handful of
+chunked matrix-matrix products.
+
+Pairs are only considered when the found date falls inside a window
+around the lost date (MATCH_WINDOW_DAYS). The best TOP_MATCHES pairs
+for every item on either side are stored in ItemMatch.
+
+- item_changed() updates one item's matches incrementally. It is called
+  from the post_save signal (item_create, edits, admin saves) and the
+  admin bulk actions. The counterparts it affects get their own lists
+  recomputed: trimmed when the item enters them, refilled when it leaves
+  (items_removed() does the same after a delete). Their lists are
+  scored together, one matrix product per pool.
+- rebuild_all() (manage.py rebuild_item_matches) recomputes the table.
+
+Pools are cached per process and kept current in place: each use
+re-reads only the rows of the pool's category and type whose updated_at
+changed (looking back SYNC_LAG, for transactions that committed late),
+replaces or inserts their vectors and drops rows that are no longer
+listed. Deleted rows show up as a count mismatch. Saving an item so
+costs a few small queries and one vectorized row instead of
+re-vectorizing the whole category; pools are rebuilt from scratch after
+POOL_MAX_AGE.
+"""
+
+import re
+import zlib
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Item, ItemMatch
+
+
+DIMENSIONS = 1 << 10
+
+TOP_MATCHES = 5
+
+# Pairs scoring below this are never stored
+MIN_SCORE = 0.2
+
+# A found item can match a lost item reported up to SLACK days after it
+# was found, or found up to WINDOW days after it was lost
+MATCH_SLACK_DAYS = 7
+MATCH_WINDOW_DAYS = 90
+
+# Best-scoring counterparts that an updated item is offered to
+OFFER_LIMIT = 50
+
+# Lost items scored per matrix product during a rebuild
+CHUNK_SIZE = 1024
+
+FIELD_WEIGHTS = (('title', 2.0), ('description', 1.0), ('location', 1.5))
+
+OPPOSITE_TYPE = {'lost': 'found', 'found': 'lost'}
+
+ROW_FIELDS = ('pk', 'date_lost_found', 'title', 'description', 'location')
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# How far back a cached pool re-reads changed rows, and when it is
+# rebuilt from scratch anyway
+SYNC_LAG = timedelta(minutes=5)
+POOL_MAX_AGE = timedelta(hours=1)
+
+
+def _bucket(token):
+    return zlib.crc32(token.encode()) & (DIMENSIONS - 1)
+
+
+def features(title, description, location):
+    """Hashed (bucket, weight) features for one item's text."""
+    result = []
+    for text, (_, weight) in zip((title, description, location), FIELD_WEIGHTS):
+        words = WORD_RE.findall((text or '').lower())
+        result.extend((_bucket(word), weight) for word in words)
+        result.extend((_bucket(f'{a} {b}'), weight) for a, b in zip(words, words[1:]))
+    return result
+
+
+def vectorize(rows):
+    """
+    Build the normalized feature matrix for (title, description, location)
+    tuples. Returns a float32 array of shape (len(rows), DIMENSIONS).
+    """
+    row_index = []
+    buckets = []
+    weights = []
+    for i, (title, description, location) in enumerate(rows):
+        for bucket, weight in features(title, description, location):
+            row_index.append(i)
+            buckets.append(bucket)
+            weights.append(weight)
+
+    matrix = np.zeros((len(rows), DIMENSIONS), dtype=np.float32)
+    if buckets:
+        np.add.at(matrix, (np.array(row_index), np.array(buckets)), np.array(weights, dtype=np.float32))
+    np.log1p(matrix, out=matrix)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+class Pool:
+    """The vectors of all listed items of one category and type, by date."""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: row[1])
+        self.pks = np.array([row[0] for row in rows], dtype=np.int64)
+        self.days = np.array([row[1].toordinal() for row in rows], dtype=np.int64)
+        self.matrix = vectorize([row[2:] for row in rows])
+
+    def __len__(self):
+        return len(self.pks)
+
+    def update(self, rows, removed=()):
+        """
+        Replace or add `rows` (ROW_FIELDS tuples) and drop the items in
+        `removed`, keeping the pool in date order.
+        """
+        if not rows and not removed:
+            return
+        index = {int(pk): i for i, pk in enumerate(self.pks)}
+        added = []
+        for row in rows:
+            i = index.get(row[0])
+            if i is not None and self.days[i] == row[1].toordinal():
+                # Same date, same place: overwrite the vector
+                self.matrix[i] = vectorize([row[2:]])[0]
+            else:
+                added.append(row)
+        drop = [index[pk] for pk in {*removed, *(row[0] for row in added)} if pk in index]
+        if drop:
+            self.pks = np.delete(self.pks, drop)
+            self.days = np.delete(self.days, drop)
+            self.matrix = np.delete(self.matrix, drop, axis=0)
+        if added:
+            new = Pool(added)
+            at = np.searchsorted(self.days, new.days, side='right')
+            self.pks = np.insert(self.pks, at, new.pks)
+            self.days = np.insert(self.days, at, new.days)
+            self.matrix = np.insert(self.matrix, at, new.matrix, axis=0)
+
+    def window(self, start_day, end_day):
+        """Index range of the items dated within [start_day, end_day]."""
+        return (
+            int(np.searchsorted(self.days, start_day, side='left')),
+            int(np.searchsorted(self.days, end_day, side='right')),
+        )
+
+
+def _listed(category, item_type):
+    return Item.objects.filter(
+        is_approved=True, status='active', category=category, item_type=item_type
+    )
+
+
+class CachedPool:
+    """A Pool with what is needed to bring it up to date."""
+
+    def __init__(self, rows, now):
+        self.pool = Pool([row[:-1] for row in rows])
+        # pk -> updated_at of the version in the pool
+        self.stamps = {row[0]: row[-1] for row in rows}
+        self.built_at = self.synced_at = now
+
+    def sync(self, category, item_type, now):
+        """Apply the changes to listed items since the last sync."""
+        changed = Item.objects.filter(
+            category=category, item_type=item_type, updated_at__gt=self.synced_at - SYNC_LAG
+        ).values_list('is_approved', 'status', *ROW_FIELDS, 'updated_at')
+        rows = []
+        removed = []
+        for is_approved, status, *row in changed:
+            pk, updated_at = row[0], row[-1]
+            if is_approved and status == 'active':
+                if self.stamps.get(pk) != updated_at:
+                    rows.append(row[:-1])
+                    self.stamps[pk] = updated_at
+            elif self.stamps.pop(pk, None) is not None:
+                removed.append(pk)
+        self.pool.update(rows, removed)
+        self.synced_at = now
+
+        items = _listed(category, item_type)
+        if items.count() != len(self.pool):
+            # Deleted, moved to another category or committed too late
+            live = set(items.values_list('pk', flat=True))
+            present = set(self.stamps)
+            missing = items.filter(pk__in=live - present).values_list(*ROW_FIELDS, 'updated_at')
+            self.stamps.update({row[0]: row[-1] for row in missing})
+            for pk in present - live:
+                del self.stamps[pk]
+            self.pool.update([row[:-1] for row in missing], present - live)
+
+
+# (category, item_type) -> CachedPool
+_pool_cache = {}
+
+
+def get_pool(category, item_type):
+    """The (cached) Pool of listed items for a category and type."""
+    now = timezone.now()
+    cached = _pool_cache.get((category, item_type))
+    if cached is None or now - cached.built_at > POOL_MAX_AGE:
+        rows = list(_listed(category, item_type).values_list(*ROW_FIELDS, 'updated_at'))
+        cached = _pool_cache[(category, item_type)] = CachedPool(rows, now)
+    else:
+        cached.sync(category, item_type, now)
+    return cached.pool
+
+
+def _date_bounds(item_type, day):
+    """The allowed date range for items matching one of this type and date."""
+    if item_type == 'lost':
+        start = day - timedelta(days=MATCH_SLACK_DAYS)
+        end = day + timedelta(days=MATCH_WINDOW_DAYS)
+    else:
+        start = day - timedelta(days=MATCH_WINDOW_DAYS)
+        end = day + timedelta(days=MATCH_SLACK_DAYS)
+    return start.toordinal(), end.toordinal()
+
+
+def _pair(item_type, pk, other_pk):
+    """(lost pk, found pk) of an item of item_type and a counterpart."""
+    return (pk, other_pk) if item_type == 'lost' else (other_pk, pk)
+
+
+def _candidates(item_type, category, day, text, limit, pools):
+    """
+    The best opposite-type items for one item as [(score, pk)], best
+    first, at most `limit`. `pools` caches the pools used during one
+    update.
+    """
+    return _candidate_lists(item_type, category, [(day, text)], limit, pools)[0]
+
+
+def _candidate_lists(item_type, category, rows, limit, pools):
+    """
+    _candidates() for several items of one type and category, given as
+    (date, text) rows, scored with one matrix product.
+    """
+    key = (category, OPPOSITE_TYPE[item_type])
+    if key not in pools:
+        pools[key] = get_pool(*key)
+    pool = pools[key]
+    bounds = np.array([_date_bounds(item_type, day) for day, _ in rows], dtype=np.int64)
+    start, end = pool.window(bounds[:, 0].min(), bounds[:, 1].max())
+    if start == end:
+        return [[] for _ in rows]
+    scores = vectorize([text for _, text in rows]) @ pool.matrix[start:end].T
+    # Exact per-item date window (the slice is only the rows' hull)
+    days = pool.days[start:end][None, :]
+    scores[(days < bounds[:, :1]) | (days > bounds[:, 1:])] = -1.0
+    lists = []
+    for row_scores in scores:
+        hits = np.nonzero(row_scores >= MIN_SCORE)[0]
+        hits = hits[np.argsort(-row_scores[hits], kind='stable')][:limit]
+        lists.append([(float(row_scores[i]), int(pool.pks[start + i])) for i in hits])
+    return lists
+
+
+def _top_lists(pks, pools):
+    """
+    The best TOP_MATCHES counterparts of each listed item among `pks`,
+    as {pk: {(lost pk, found pk): score}}.
+    """
+    tops = {}
+    if not pks:
+        return tops
+    rows = Item.objects.filter(pk__in=pks, is_approved=True, status='active').values_list(
+        'pk', 'item_type', 'category', 'date_lost_found', 'title', 'description', 'location'
+    )
+    groups = {}
+    for pk, item_type, category, day, *text in rows:
+        groups.setdefault((item_type, category), []).append((pk, day, text))
+    for (item_type, category), members in groups.items():
+        lists = _candidate_lists(
+            item_type, category, [(day, text) for _, day, text in members], TOP_MATCHES, pools
+        )
+        for (pk, _, _), candidates in zip(members, lists):
+            tops[pk] = {
+                _pair(item_type, pk, other_pk): value for value, other_pk in candidates
+            }
+    return tops
+
+
+@transaction.atomic
+def item_changed(item):
+    """
+    Recompute the matches of one item after it was created, approved,
+    edited or closed, and keep its counterparts' lists in step: the ones
+    it enters are trimmed back to their best TOP_MATCHES, the ones it
+    leaves get their next-best match. Returns the number of matches
+    stored for the item.
+    """
+    # Previous counterparts (on either side: the type may have been edited)
+    previous = ItemMatch.objects.filter(Q(lost_item=item) | Q(found_item=item))
+    affected = {
+        found_pk if lost_pk == item.pk else lost_pk
+        for lost_pk, found_pk in previous.values_list('lost_item', 'found_item')
+    }
+    previous.delete()
+
+    pools = {}
+    wanted = {}
+    own = 0
+    if item.is_approved and item.status == 'active':
+        text = (item.title, item.description, item.location)
+        candidates = _candidates(item.item_type, item.category, item.date_lost_found, text, OFFER_LIMIT, pools)
+        for value, pk in candidates[:TOP_MATCHES]:
+            wanted[_pair(item.item_type, item.pk, pk)] = value
+        own = len(wanted)
+        # The best-scoring candidates are the lists this item may enter
+        affected.update(pk for _, pk in candidates)
+    _refresh_lists(affected, wanted, pools)
+    return own
+
+
+def _refresh_lists(pks, wanted, pools):
+    """
+    Recompute the lists of the items `pks` and store them along with the
+    `wanted` pairs. Their other rows stay only while they are among the
+    best TOP_MATCHES of the item at the other end.
+    """
+    for pairs in _top_lists(pks, pools).values():
+        wanted.update(pairs)
+
+    rows = ItemMatch.objects.filter(
+        Q(lost_item__in=pks) | Q(found_item__in=pks)
+    ).values_list('pk', 'lost_item', 'found_item')
+    existing = {}
+    for row_pk, lost_pk, found_pk in rows:
+        existing[(lost_pk, found_pk)] = row_pk
+    undecided = [pair for pair in existing if pair not in wanted]
+    others = {pk for pair in undecided for pk in pair if pk not in pks}
+    other_tops = _top_lists(others, pools)
+    stale = [
+        existing[pair] for pair in undecided
+        if not any(pair in other_tops.get(pk, {}) for pk in pair)
+    ]
+    if stale:
+        ItemMatch.objects.filter(pk__in=stale).delete()
+    ItemMatch.objects.bulk_create(
+        [
+            ItemMatch(lost_item_id=lost_pk, found_item_id=found_pk, score=value)
+            for (lost_pk, found_pk), value in wanted.items()
+            if (lost_pk, found_pk) not in existing
+        ],
+        ignore_conflicts=True,
+    )
+
+
+@transaction.atomic
+def items_removed(counterpart_pks):
+    """Refill the lists that contained items which were just deleted."""
+    _refresh_lists(set(counterpart_pks), {}, {})
+
+
+def matches_for(item, limit=TOP_MATCHES):
+    """The best opposite-type matches for an item, best first."""
+    if item.item_type == 'lost':
+        entries = ItemMatch.objects.filter(lost_item=item).select_related('found_item')
+        return [entry.found_item for entry in entries[:limit]]
+    entries = ItemMatch.objects.filter(found_item=item).select_related('lost_item')
+    return [entry.lost_item for entry in entries[:limit]]
+
+
+def _top_k(scores, k, axis):
+    """Indices of the k largest scores along an axis (unordered)."""
+    k = min(k, scores.shape[axis])
+    return np.argpartition(-scores, k - 1, axis=axis).take(range(k), axis=axis)
+
+
+def _match_category(lost, found):
+    """Best pairs between a lost and a found Pool as {(lost, found): score}."""
+    pairs = {}
+    if not len(lost) or not len(found):
+        return pairs
+
+    # Running best lost items for every found item
+    best_scores = np.full((len(found), TOP_MATCHES), -np.inf, dtype=np.float32)
+    best_lost = np.full((len(found), TOP_MATCHES), -1, dtype=np.int64)
+
+    for chunk_start in range(0, len(lost), CHUNK_SIZE):
+        chunk = slice(chunk_start, chunk_start + CHUNK_SIZE)
+        days = lost.days[chunk]
+        start, end = found.window(
+            days[0] - MATCH_SLACK_DAYS, days[-1] + MATCH_WINDOW_DAYS
+        )
+        if start == end:
+            continue
+
+        scores = lost.matrix[chunk] @ found.matrix[start:end].T
+        # Exact per-pair date window (the slice is only the chunk's hull)
+        offset = found.days[start:end][None, :] - days[:, None]
+        scores[(offset < -MATCH_SLACK_DAYS) | (offset > MATCH_WINDOW_DAYS)] = -1.0
+
+        # Best found items for each lost item in the chunk
+        top = _top_k(scores, TOP_MATCHES, axis=1)
+        rows = np.arange(scores.shape[0])[:, None]
+        for i, j in zip(*np.nonzero(scores[rows, top] >= MIN_SCORE)):
+            column = top[i, j]
+            pairs[(int(lost.pks[chunk_start + i]), int(found.pks[start + column]))] = float(scores[i, column])
+
+        # Merge this chunk into each found item's running best
+        merged_scores = np.concatenate([best_scores[start:end], scores.T], axis=1)
+        merged_lost = np.concatenate([
+            best_lost[start:end],
+            np.broadcast_to(lost.pks[chunk], (end - start, scores.shape[0])),
+        ], axis=1)
+        keep = _top_k(merged_scores, TOP_MATCHES, axis=1)
+        best_scores[start:end] = np.take_along_axis(merged_scores, keep, axis=1)
+        best_lost[start:end] = np.take_along_axis(merged_lost, keep, axis=1)
+
+    for i, j in zip(*np.nonzero(best_scores >= MIN_SCORE)):
+        pairs[(int(best_lost[i, j]), int(found.pks[i]))] = float(best_scores[i, j])
+    return pairs
+
+
+def rebuild_all():
+    """Recompute every match. Returns the number of rows written."""
+    pairs = {}
+    for category, _ in Item.CATEGORY_CHOICES:
+        lost = Pool(list(_listed(category, 'lost').values_list(*ROW_FIELDS)))
+        found = Pool(list(_listed(category, 'found').values_list(*ROW_FIELDS)))
+        pairs.update(_match_category(lost, found))
+
+    with transaction.atomic():
+        ItemMatch.objects.all().delete()
+        ItemMatch.objects.bulk_create(
+            [
+                ItemMatch(lost_item_id=lost_pk, found_item_id=found_pk, score=value)
+                for (lost_pk, found_pk), value in pairs.items()
+            ],
+            batch_size=2000,
+        )
+    return len(pairs)
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS items_item_fts USING fts5("
+    "title, description, location, tokenize='porter unicode61')",
+    "INSERT INTO items_item_fts (rowid, title, description, location) "
+    "SELECT id, title, description, location FROM items_item",
+]
+
+SQLITE_REVERSE = [
+    "DROP TABLE IF EXISTS items_item_fts",
+]
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE items_item ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(location, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+    ") STORED",
+    "CREATE INDEX items_item_search_vector_gin ON items_item USING GIN (search_vector)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS items_item_search_vector_gin",
+    "ALTER TABLE items_item DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        statements = statements_by_vendor.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0002_alter_item_is_approved'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
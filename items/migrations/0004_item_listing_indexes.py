@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0003_item_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='item',
+            name='items_item_item_ty_e66521_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='items_item_categor_db7f55_idx',
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['-created_at'], name='item_approved_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['item_type', 'category', '-created_at'], name='item_approved_type_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['category', '-created_at'], name='item_approved_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['date_lost_found'], name='item_approved_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_approved', True), ('status', 'active')), fields=['item_type', 'category', '-created_at'], name='item_active_type_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_approved', True), ('status', 'active')), fields=['item_type', 'date_lost_found'], name='item_active_type_date_idx'),
+        ),
+    ]
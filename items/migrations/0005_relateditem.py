@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0004_item_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='items.item')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='items.item')),
+            ],
+            options={
+                'verbose_name': 'Related Item',
+                'verbose_name_plural': 'Related Items',
+                'ordering': ['-score', '-related_id'],
+                'indexes': [models.Index(fields=['item', '-score'], name='items_relat_item_id_2b2d83_idx')],
+                'constraints': [models.UniqueConstraint(fields=('item', 'related'), name='unique_related_item')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0005_relateditem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(help_text='Text similarity between the two items (0 to 1)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('found_item', models.ForeignKey(limit_choices_to={'item_type': 'found'}, on_delete=django.db.models.deletion.CASCADE, related_name='lost_matches', to='items.item')),
+                ('lost_item', models.ForeignKey(limit_choices_to={'item_type': 'lost'}, on_delete=django.db.models.deletion.CASCADE, related_name='found_matches', to='items.item')),
+            ],
+            options={
+                'verbose_name': 'Item Match',
+                'verbose_name_plural': 'Item Matches',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['lost_item', '-score'], name='items_itemm_lost_it_f7e052_idx'), models.Index(fields=['found_item', '-score'], name='items_itemm_found_i_b64c83_idx')],
+                'constraints': [models.UniqueConstraint(fields=('lost_item', 'found_item'), name='unique_item_match')],
+            },
+        ),
+    ]
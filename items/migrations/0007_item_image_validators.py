@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:55
+
+import items.uploads
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0006_itemmatch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='item',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Upload an image of the item (optional but recommended)', null=True, upload_to='items/%Y/%m/%d/', validators=[items.uploads.validate_image_upload]),
+        ),
+        migrations.AlterField(
+            model_name='itemimage',
+            name='image',
+            field=models.ImageField(help_text='Additional image for the item', upload_to='items/additional/%Y/%m/%d/', validators=[items.uploads.validate_image_upload]),
+        ),
+    ]
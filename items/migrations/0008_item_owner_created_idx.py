@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0007_item_image_validators'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['user', '-created_at'], name='item_owner_created_idx'),
+        ),
+    ]
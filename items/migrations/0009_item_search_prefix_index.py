@@ -0,0 +1,55 @@
+from django.db import migrations
+
+
+# Unstemmed tokens, so that prefix queries match partial words: with the
+# porter tokenizer "runn"* missed "running", which is stored as "run"
+SQLITE_FORWARD = [
+    "DROP TABLE IF EXISTS items_item_fts",
+    "CREATE VIRTUAL TABLE items_item_fts USING fts5("
+    "title, description, location, tokenize='unicode61', prefix='2 3 4')",
+    "INSERT INTO items_item_fts (rowid, title, description, location) "
+    "SELECT id, title, description, location FROM items_item",
+]
+
+SQLITE_REVERSE = [
+    "DROP TABLE IF EXISTS items_item_fts",
+    "CREATE VIRTUAL TABLE items_item_fts USING fts5("
+    "title, description, location, tokenize='porter unicode61')",
+    "INSERT INTO items_item_fts (rowid, title, description, location) "
+    "SELECT id, title, description, location FROM items_item",
+]
+
+
+def _postgres_vector(config):
+    return [
+        "DROP INDEX IF EXISTS items_item_search_vector_gin",
+        "ALTER TABLE items_item DROP COLUMN IF EXISTS search_vector",
+        "ALTER TABLE items_item ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        f"setweight(to_tsvector('{config}', coalesce(title, '')), 'A') || "
+        f"setweight(to_tsvector('{config}', coalesce(location, '')), 'B') || "
+        f"setweight(to_tsvector('{config}', coalesce(description, '')), 'C')"
+        ") STORED",
+        "CREATE INDEX items_item_search_vector_gin ON items_item USING GIN (search_vector)",
+    ]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        statements = statements_by_vendor.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0008_item_owner_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': _postgres_vector('simple')}),
+            _run({'sqlite': SQLITE_REVERSE, 'postgresql': _postgres_vector('english')}),
+        ),
+    ]
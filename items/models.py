@@ -3,6 +3,8 @@ from django.conf import settings
 from django.utils import timezone
 from django.urls import reverse
 
+from .uploads import validate_image_upload
+
 
 class Item(models.Model):
     """
@@ -78,6 +80,7 @@ class Item(models.Model):
         upload_to='items/%Y/%m/%d/',
         blank=True,
         null=True,
+        validators=[validate_image_upload],
         help_text="Upload an image of the item (optional but recommended)"
     )
     
@@ -164,8 +167,40 @@ class Item(models.Model):
         ordering = ['-created_at']  # Newest first
         indexes = [
             models.Index(fields=['-created_at']),
-            models.Index(fields=['item_type', 'is_approved']),
-            models.Index(fields=['category']),
+            # Public listing (all approved items), see items.query.ItemQuery
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(is_approved=True),
+                name='item_approved_created_idx',
+            ),
+            models.Index(
+                fields=['item_type', 'category', '-created_at'],
+                condition=models.Q(is_approved=True),
+                name='item_approved_type_cat_idx',
+            ),
+            models.Index(
+                fields=['category', '-created_at'],
+                condition=models.Q(is_approved=True),
+                name='item_approved_cat_idx',
+            ),
+            models.Index(
+                fields=['date_lost_found'],
+                condition=models.Q(is_approved=True),
+                name='item_approved_date_idx',
+            ),
+            # Lost / found pages (approved and still active)
+            models.Index(
+                fields=['item_type', 'category', '-created_at'],
+                condition=models.Q(is_approved=True, status='active'),
+                name='item_active_type_cat_idx',
+            ),
+            models.Index(
+                fields=['item_type', 'date_lost_found'],
+                condition=models.Q(is_approved=True, status='active'),
+                name='item_active_type_date_idx',
+            ),
+            # Dashboard / My Items, see items.summary
+            models.Index(fields=['user', '-created_at'], name='item_owner_created_idx'),
         ]
     
     def __str__(self):
@@ -196,10 +231,13 @@ class Item(models.Model):
         """Calculate days since item was posted"""
         return (timezone.now() - self.created_at).days
     
-    def increment_views(self):
-        """Increment the view count"""
-        self.views_count += 1
-        self.save(update_fields=['views_count'])
+    def increment_views(self, count=1):
+        """
+        Increment the view count atomically in the database.
+        Page views go through items.view_counter instead, which batches them.
+        """
+        Item.objects.filter(pk=self.pk).update(views_count=models.F('views_count') + count)
+        self.views_count += count
     
     def mark_as_claimed(self):
         """Mark item as claimed"""
@@ -230,6 +268,7 @@ class ItemImage(models.Model):
     
     image = models.ImageField(
         upload_to='items/additional/%Y/%m/%d/',
+        validators=[validate_image_upload],
         help_text="Additional image for the item"
     )
     
@@ -248,3 +287,83 @@ class ItemImage(models.Model):
     
     def __str__(self):
         return f"Image for {self.item.title}"
+
+
+class RelatedItem(models.Model):
+    """
+    Precomputed "related items" for the item detail page.
+    
+    Holds the top few related items for each approved, active item,
+    scored on category, lost/found opposition, location and text
+    similarity. Maintained incrementally by items.related.
+    """
+    item = models.ForeignKey(
+        Item,
+        on_delete=models.CASCADE,
+        related_name='related_entries'
+    )
+    
+    related = models.ForeignKey(
+        Item,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    
+    score = models.FloatField()
+    
+    class Meta:
+        verbose_name = 'Related Item'
+        verbose_name_plural = 'Related Items'
+        ordering = ['-score', '-related_id']
+        indexes = [
+            models.Index(fields=['item', '-score']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'related'], name='unique_related_item'),
+        ]
+    
+    def __str__(self):
+        return f"{self.item_id} -> {self.related_id} ({self.score:.2f})"
+
+
+class ItemMatch(models.Model):
+    """
+    A candidate pairing of a lost item with a found item.
+    
+    Written by the matching engine (items.matching), which keeps the best
+    few matches for every approved, active lost and found item.
+    """
+    lost_item = models.ForeignKey(
+        Item,
+        on_delete=models.CASCADE,
+        related_name='found_matches',
+        limit_choices_to={'item_type': 'lost'}
+    )
+    
+    found_item = models.ForeignKey(
+        Item,
+        on_delete=models.CASCADE,
+        related_name='lost_matches',
+        limit_choices_to={'item_type': 'found'}
+    )
+    
+    score = models.FloatField(
+        help_text="Text similarity between the two items (0 to 1)"
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Item Match'
+        verbose_name_plural = 'Item Matches'
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['lost_item', '-score']),
+            models.Index(fields=['found_item', '-score']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['lost_item', 'found_item'], name='unique_item_match'),
+        ]
+    
+    def __str__(self):
+        return f"{self.lost_item_id} <-> {self.found_item_id} ({self.score:.2f})"
@@ -0,0 +1,174 @@
+"""
+Keyset (cursor) pagination for item listings.
+
+Pages are keyed on (created_at, id), newest first, which lines up with
+the -created_at index on Item. Instead of OFFSET, each page continues
+from the last row of the previous one, so page N costs the same as
+page 1, no COUNT(*) is needed, and items posted while someone is
+browsing never shift rows between pages.
+
+Cursors are opaque URL-safe tokens; a malformed or tampered token just
+falls back to the first page, and so does a cursor with no rows left on
+its side (e.g. they were closed or deleted since the link was rendered).
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+
+ITEMS_PER_PAGE = 12
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+# Primary keys are 64-bit signed integers
+MAX_PK = 2 ** 63 - 1
+
+
+def encode_cursor(created_at, pk, direction):
+    """Pack a row position into an opaque cursor token."""
+    payload = json.dumps([created_at.isoformat(), pk, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Unpack a cursor token into (created_at, pk, direction).
+    Returns None if the token is missing or invalid.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created_at, pk, direction = json.loads(base64.urlsafe_b64decode(padded))
+        pk = int(pk)
+        if direction not in (NEXT, PREVIOUS) or not -MAX_PK <= pk <= MAX_PK:
+            return None
+        return datetime.fromisoformat(created_at), pk, direction
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+class CursorPage:
+    """
+    One page of keyset-paginated results.
+    Mirrors the parts of django.core.paginator.Page the templates use.
+    """
+
+    is_cursor_page = True
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        last = self.object_list[-1]
+        return encode_cursor(last.created_at, last.pk, NEXT)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        first = self.object_list[0]
+        return encode_cursor(first.created_at, first.pk, PREVIOUS)
+
+
+class CursorPaginator:
+    """
+    Paginate an Item queryset by (created_at, id), newest first.
+    Any ordering already on the queryset is replaced.
+    """
+
+    def __init__(self, queryset, per_page=ITEMS_PER_PAGE):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def first_page(self):
+        rows = list(self.queryset.order_by('-created_at', '-id')[:self.per_page + 1])
+        return CursorPage(rows[:self.per_page], len(rows) > self.per_page, False)
+
+    def get_page(self, cursor):
+        """Return the CursorPage for a cursor token (first page if None)."""
+        position = decode_cursor(cursor)
+        if position is None:
+            return self.first_page()
+
+        created_at, pk, direction = position
+
+        if direction == NEXT:
+            # Rows strictly after the cursor in newest-first order
+            rows = list(
+                self.queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                ).order_by('-created_at', '-id')[:self.per_page + 1]
+            )
+            if not rows:
+                return self.first_page()
+            return CursorPage(rows[:self.per_page], len(rows) > self.per_page, True)
+
+        # Walk backwards from the cursor, then restore newest-first order
+        rows = list(
+            self.queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            ).order_by('created_at', 'id')[:self.per_page + 1]
+        )
+        if not rows:
+            return self.first_page()
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return CursorPage(rows, True, has_previous)
+
+
+class CountedPaginator(Paginator):
+    """
+    A Paginator that is told the total up front (e.g. from
+    items.counts.count_items) instead of running its own COUNT(*).
+    """
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        # Shadows the Paginator.count cached_property
+        self.count = count
+
+
+def paginate_items(request, items, ranked=False, count=None, per_page=ITEMS_PER_PAGE):
+    """
+    Paginate a listing for a request.
+
+    Chronological listings use cursor pagination (?cursor=...).
+    Ranked search results keep numbered pages (?page=...), since their
+    order comes from the search score rather than an index; pass `count`
+    so the paginator doesn't count the results again.
+    """
+    if ranked:
+        if count is None:
+            paginator = Paginator(items, per_page)
+        else:
+            paginator = CountedPaginator(items, per_page, count)
+        return paginator.get_page(request.GET.get('page'))
+    return CursorPaginator(items, per_page).get_page(request.GET.get('cursor'))
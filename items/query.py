@@ -0,0 +1,80 @@
+"""
+Query layer for the public item listings.
+
+item_list, lost_items and found_items all combine the same filters:
+is_approved, status, item_type, category, a date_lost_found range and an
+optional keyword search. ItemQuery builds the queryset for any of them
+from an ItemSearchForm, so the filter logic (and the filter signature
+used for cached counts) lives in one place.
+
+The partial/composite indexes in Item.Meta.indexes are designed around
+exactly the combinations built here; items.tests.ItemQueryIndexTests
+checks via EXPLAIN that every one of them is served by an index.
+"""
+
+from .counts import count_items
+from .models import Item
+from .pagination import paginate_items
+from .search import search_items
+
+
+class ItemQuery:
+    """
+    Filters for one listing request.
+
+    Fixed filters (e.g. item_type='lost', status='active' for the lost
+    items page) take precedence over whatever the search form submitted.
+    """
+
+    # Form fields that fixed view filters may override
+    FORM_FIELDS = ('search', 'item_type', 'category', 'date_from', 'date_to')
+
+    def __init__(self, search_form, **fixed_filters):
+        self.form = search_form
+        self.filters = {'is_approved': True}
+        if search_form.is_valid():
+            for field in self.FORM_FIELDS:
+                value = search_form.cleaned_data.get(field)
+                if value:
+                    self.filters[field] = value
+        self.filters.update(fixed_filters)
+        self._total = None
+
+    @property
+    def search(self):
+        return self.filters.get('search', '')
+
+    @property
+    def is_ranked(self):
+        """Whether results are ordered by search relevance."""
+        return bool(self.search)
+
+    def queryset(self):
+        """Build the filtered Item queryset."""
+        filters = self.filters
+        lookups = {'is_approved': filters['is_approved']}
+        for field in ('status', 'item_type', 'category'):
+            if filters.get(field):
+                lookups[field] = filters[field]
+        if filters.get('date_from'):
+            lookups['date_lost_found__gte'] = filters['date_from']
+        if filters.get('date_to'):
+            lookups['date_lost_found__lte'] = filters['date_to']
+
+        items = Item.objects.filter(**lookups).select_related('user')
+        if self.search:
+            items = search_items(items, self.search)
+        return items
+
+    @property
+    def total(self):
+        """Cached (or estimated) number of matching items."""
+        if self._total is None:
+            self._total = count_items(self.queryset(), self.filters)
+        return self._total
+
+    def paginate(self, request):
+        """Return the page of results for this request."""
+        return paginate_items(
+            request, self.queryset(), ranked=self.is_ranked, count=self.total.value
+        )
@@ -0,0 +1,210 @@
+"""
+Precomputed related items for the item detail page.
+
+For every approved, active item the RelatedItem table holds its TOP_K
+most related items, so item_detail reads one small indexed row set
+instead of querying the whole category on each view.
+
+Relatedness is scored on:
+- category (candidates come from the same category),
+- type opposition (a found item is more interesting next to a lost one),
+- location overlap and title/description overlap (Jaccard on word sets).
+
+The table is maintained incrementally from signals (items.signals) and
+the admin bulk actions: when an item is approved, edited or closed only
+its own row set and the lists it enters or leaves are touched.
+rebuild_all() (manage.py rebuild_related_items) recomputes everything.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Item, RelatedItem
+from .search import TOKEN_RE
+
+
+TOP_K = 4
+
+# Most recent same-category items considered per update
+CANDIDATE_LIMIT = 200
+
+CATEGORY_WEIGHT = 1.0
+OPPOSITE_TYPE_WEIGHT = 0.5
+LOCATION_WEIGHT = 0.75
+TEXT_WEIGHT = 1.5
+
+PROFILE_FIELDS = ('pk', 'category', 'item_type', 'title', 'description', 'location')
+
+
+class Profile:
+    """The parts of an item that relatedness is scored on."""
+
+    __slots__ = ('pk', 'category', 'item_type', 'location_words', 'text_words')
+
+    def __init__(self, pk, category, item_type, title, description, location):
+        self.pk = pk
+        self.category = category
+        self.item_type = item_type
+        self.location_words = _words(location)
+        self.text_words = _words(f'{title} {description}')
+
+    @classmethod
+    def of(cls, item):
+        return cls(*(getattr(item, field) for field in PROFILE_FIELDS))
+
+
+def _words(text):
+    return {word for word in TOKEN_RE.findall((text or '').lower()) if len(word) > 2}
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def score(a, b):
+    """How related two item profiles are (higher is more related)."""
+    total = 0.0
+    if a.category == b.category:
+        total += CATEGORY_WEIGHT
+    if a.item_type != b.item_type:
+        total += OPPOSITE_TYPE_WEIGHT
+    total += LOCATION_WEIGHT * _jaccard(a.location_words, b.location_words)
+    total += TEXT_WEIGHT * _jaccard(a.text_words, b.text_words)
+    return total
+
+
+def is_listed(item):
+    """Only approved, active items have (and appear in) related lists."""
+    return item.is_approved and item.status == 'active'
+
+
+def _candidates(profile):
+    rows = Item.objects.filter(
+        is_approved=True,
+        status='active',
+        category=profile.category,
+    ).exclude(pk=profile.pk).order_by('-created_at').values_list(
+        *PROFILE_FIELDS
+    )[:CANDIDATE_LIMIT]
+    return [Profile(*row) for row in rows]
+
+
+def _top(profile, candidates):
+    scored = sorted(
+        ((score(profile, other), other.pk) for other in candidates),
+        reverse=True,
+    )
+    return scored[:TOP_K]
+
+
+def _replace_rows(item_pk, scored):
+    RelatedItem.objects.filter(item_id=item_pk).delete()
+    RelatedItem.objects.bulk_create([
+        RelatedItem(item_id=item_pk, related_id=related_pk, score=value)
+        for value, related_pk in scored
+    ])
+
+
+def refresh_item(item_pk):
+    """Recompute one item's own related list from scratch."""
+    item = Item.objects.filter(pk=item_pk).only(
+        'is_approved', 'status', *PROFILE_FIELDS[1:]
+    ).first()
+    if item is None or not is_listed(item):
+        RelatedItem.objects.filter(item_id=item_pk).delete()
+        return
+    profile = Profile.of(item)
+    _replace_rows(item_pk, _top(profile, _candidates(profile)))
+
+
+@transaction.atomic
+def item_changed(item):
+    """
+    Update the table after an item was created, approved, edited or closed.
+    """
+    # Lists this item currently appears in; its entries are re-scored below
+    referrers = set(
+        RelatedItem.objects.filter(related_id=item.pk).values_list('item_id', flat=True)
+    )
+    RelatedItem.objects.filter(related_id=item.pk).delete()
+
+    if not is_listed(item):
+        RelatedItem.objects.filter(item_id=item.pk).delete()
+        # Those lists are now one short; refill them
+        for pk in referrers:
+            refresh_item(pk)
+        return
+
+    profile = Profile.of(item)
+    candidates = _candidates(profile)
+    scored = [(score(profile, other), other) for other in candidates]
+    _replace_rows(item.pk, sorted(
+        ((value, other.pk) for value, other in scored), reverse=True
+    )[:TOP_K])
+
+    # Offer this item to each candidate's list (scores are symmetric)
+    # Entries compare as (score, related pk), the same tie-break as _top()
+    current = defaultdict(list)
+    for owner_pk, value, related_pk in RelatedItem.objects.filter(
+        item_id__in=[other.pk for other in candidates]
+    ).values_list('item_id', 'score', 'related_id'):
+        current[owner_pk].append((value, related_pk))
+
+    entries = []
+    overfull = []
+    for value, other in scored:
+        existing = current[other.pk]
+        if len(existing) < TOP_K or (value, item.pk) > min(existing):
+            entries.append(RelatedItem(item_id=other.pk, related_id=item.pk, score=value))
+            if len(existing) >= TOP_K:
+                overfull.append(other.pk)
+            referrers.discard(other.pk)
+    RelatedItem.objects.bulk_create(entries)
+
+    for pk in overfull:
+        extra = RelatedItem.objects.filter(item_id=pk).values_list(
+            'pk', flat=True
+        )[TOP_K:]
+        RelatedItem.objects.filter(pk__in=list(extra)).delete()
+
+    # Lists that dropped this item (e.g. it changed category) need a refill
+    for pk in referrers:
+        refresh_item(pk)
+
+
+def items_removed(referrer_pks):
+    """Refill the lists that contained items which were just deleted."""
+    for pk in referrer_pks:
+        refresh_item(pk)
+
+
+def related_items(item):
+    """The precomputed related items for the detail page, best first."""
+    entries = RelatedItem.objects.filter(item=item).select_related('related')[:TOP_K]
+    return [entry.related for entry in entries]
+
+
+def rebuild_all():
+    """Recompute the whole table. Returns the number of rows written."""
+    listed = Item.objects.filter(is_approved=True, status='active')
+    by_category = defaultdict(list)
+    for row in listed.order_by('-created_at').values_list(*PROFILE_FIELDS):
+        profile = Profile(*row)
+        by_category[profile.category].append(profile)
+
+    entries = []
+    for profiles in by_category.values():
+        for profile in profiles:
+            pool = [other for other in profiles if other.pk != profile.pk][:CANDIDATE_LIMIT]
+            entries.extend(
+                RelatedItem(item_id=profile.pk, related_id=related_pk, score=value)
+                for value, related_pk in _top(profile, pool)
+            )
+
+    with transaction.atomic():
+        RelatedItem.objects.all().delete()
+        RelatedItem.objects.bulk_create(entries, batch_size=1000)
+    return len(entries)
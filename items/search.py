@@ -0,0 +1,140 @@
+"""
+Full-text search for Lost & Found items.
+
+Backends:
+- SQLite: an FTS5 virtual table (items_item_fts) holding title, description
+  and location, kept in sync by the post_save/post_delete signals.
+- PostgreSQL: a generated, weighted tsvector column (items_item.search_vector)
+  with a GIN index. The database keeps it current on every write.
+- Anything else falls back to the old icontains match.
+
+Every term matches as a prefix, so people searching as they type find
+"running" from "runn". Both indexes therefore store unstemmed words
+(unicode61 / 'simple'): a stemmed index holds "run", which the prefix
+"runn" doesn't match.
+
+Views only ever call search_items(), which filters a queryset down to the
+matching rows and orders them by relevance (search_rank annotation).
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Item
+
+
+FTS_TABLE = 'items_item_fts'
+
+# Only word characters reach the backend, so user input can never inject
+# FTS5/tsquery operators or break the query syntax.
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Longest search we bother to tokenize (keeps the match expression small)
+MAX_TERMS = 8
+
+
+def tokenize(query):
+    """Split a raw search string into lowercase search terms."""
+    return [term.lower() for term in TOKEN_RE.findall(query or '')][:MAX_TERMS]
+
+
+def _fts5_expression(terms):
+    """Build an FTS5 MATCH expression: every term must match as a prefix."""
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _tsquery_expression(terms):
+    """Build a to_tsquery() expression: every term must match as a prefix."""
+    return ' & '.join(f"'{term}':*" for term in terms)
+
+
+def search_items(queryset, query):
+    """
+    Filter an Item queryset by a free-text query, best matches first.
+
+    Returns the queryset unchanged when the query has no searchable terms.
+    Matching rows are annotated with search_rank (higher is better).
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset
+
+    vendor = connection.vendor
+    qn = connection.ops.quote_name
+    table = qn(Item._meta.db_table)
+
+    if vendor == 'sqlite':
+        expression = _fts5_expression(terms)
+        # bm25() is lower-is-better; columns weighted title > location > description
+        rank_sql = (
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0, 4.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.{qn(Item._meta.pk.column)}'
+        )
+        match_sql = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        return queryset.filter(
+            pk__in=RawSQL(match_sql, (expression,))
+        ).annotate(
+            search_rank=RawSQL(rank_sql, (expression,), output_field=FloatField())
+        ).order_by('-search_rank', '-created_at')
+
+    if vendor == 'postgresql':
+        expression = _tsquery_expression(terms)
+        return queryset.annotate(
+            search_match=RawSQL(
+                f"{table}.search_vector @@ to_tsquery('simple', %s)",
+                (expression,),
+                output_field=BooleanField(),
+            ),
+            search_rank=RawSQL(
+                f"ts_rank({table}.search_vector, to_tsquery('simple', %s))",
+                (expression,),
+                output_field=FloatField(),
+            ),
+        ).filter(search_match=True).order_by('-search_rank', '-created_at')
+
+    # No full-text support: substring match on every term
+    for term in terms:
+        queryset = queryset.filter(
+            Q(title__icontains=term) |
+            Q(description__icontains=term) |
+            Q(location__icontains=term)
+        )
+    return queryset
+
+
+def index_item(item):
+    """Add or refresh one item in the SQLite FTS table."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [item.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, location) '
+            f'VALUES (%s, %s, %s, %s)',
+            [item.pk, item.title, item.description, item.location],
+        )
+
+
+def unindex_item(pk):
+    """Remove one item from the SQLite FTS table."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+
+
+def rebuild_index(using=None):
+    """Repopulate the SQLite FTS table from items_item."""
+    from django.db import connections
+    conn = connections[using or 'default']
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, location) '
+            f'SELECT id, title, description, location FROM items_item'
+        )
@@ -0,0 +1,115 @@
+"""
+Signal handlers for the items app.
+Connected in ItemsConfig.ready().
+"""
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .models import Item, ItemImage, ItemMatch, RelatedItem
+from . import matching, related, search
+from .images import delete_variants, variant_queue
+from .counts import invalidate_item_counts
+
+
+# Fields that feed the full-text index
+SEARCH_FIELDS = {'title', 'description', 'location'}
+
+# Fields that related-item scores and eligibility depend on
+RELATED_FIELDS = SEARCH_FIELDS | {'is_approved', 'status', 'item_type', 'category'}
+
+# Fields that listing filters (and therefore cached counts) depend on
+FILTER_FIELDS = SEARCH_FIELDS | {
+    'is_approved', 'status', 'item_type', 'category', 'date_lost_found',
+}
+
+
+@receiver(post_save, sender=Item)
+def update_search_index(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the search index in step with the item's text fields"""
+    if update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    search.index_item(instance)
+
+
+@receiver(post_delete, sender=Item)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Drop a deleted item from the search index"""
+    search.unindex_item(instance.pk)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def expire_item_counts(sender, instance, update_fields=None, **kwargs):
+    """Invalidate cached listing counts when a filtered field changes"""
+    if update_fields is not None and not FILTER_FIELDS.intersection(update_fields):
+        return
+    invalidate_item_counts()
+
+
+@receiver(post_save, sender=Item)
+def update_related_items(sender, instance, update_fields=None, **kwargs):
+    """Re-score related items when an item is approved, edited or closed"""
+    if update_fields is not None and not RELATED_FIELDS.intersection(update_fields):
+        return
+    related.item_changed(instance)
+
+
+@receiver(post_save, sender=Item)
+def update_item_matches(sender, instance, update_fields=None, **kwargs):
+    """Re-match an item against the opposite type when it changes"""
+    if update_fields is not None and not RELATED_FIELDS.intersection(update_fields):
+        return
+    matching.item_changed(instance)
+
+
+@receiver(pre_delete, sender=Item)
+def remember_related_referrers(sender, instance, **kwargs):
+    """Note which related lists contain an item before it is deleted"""
+    instance._related_referrers = list(
+        RelatedItem.objects.filter(related_id=instance.pk).values_list('item_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Item)
+def refill_related_items(sender, instance, **kwargs):
+    """Refill the related lists a deleted item dropped out of"""
+    related.items_removed(getattr(instance, '_related_referrers', []))
+
+
+@receiver(pre_delete, sender=Item)
+def remember_match_counterparts(sender, instance, **kwargs):
+    """Note which items a deleted item was matched with"""
+    pairs = ItemMatch.objects.filter(
+        Q(lost_item=instance) | Q(found_item=instance)
+    ).values_list('lost_item', 'found_item')
+    instance._match_counterparts = [
+        found_pk if lost_pk == instance.pk else lost_pk for lost_pk, found_pk in pairs
+    ]
+
+
+@receiver(post_delete, sender=Item)
+def refill_item_matches(sender, instance, **kwargs):
+    """Give the deleted item's counterparts their next-best matches"""
+    matching.items_removed(getattr(instance, '_match_counterparts', []))
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=ItemImage)
+def generate_image_variants(sender, instance, update_fields=None, **kwargs):
+    """Queue resized renditions of a newly uploaded photo"""
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if instance.image:
+        variant_queue.schedule(instance.image.name)
+
+
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=ItemImage)
+def remove_image_variants(sender, instance, **kwargs):
+    """Delete the renditions of a deleted photo"""
+    if instance.image:
+        name = instance.image.name
+        transaction.on_commit(lambda: delete_variants(name))
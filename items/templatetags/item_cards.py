@@ -0,0 +1,19 @@
+"""
+Template tags for cached item cards (see items.cards).
+
+    {% load item_cards %}
+    {% item_cards page_obj "grid" as cards %}
+"""
+
+from django import template
+
+from ..cards import render_cards
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def item_cards(items, variant='grid'):
+    """Render the cards for a page of items in one cache round-trip."""
+    return render_cards(items, variant)
@@ -0,0 +1,74 @@
+"""
+Template tags for serving resized item photos.
+
+    {% load item_images %}
+    {% responsive_image item.image item.title sizes="(min-width: 1024px) 33vw, 100vw" class="w-full h-full object-cover" %}
+
+See items.images for how the renditions are generated.
+"""
+
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from .. import images
+from ..images import available_variants, variant_queue
+
+
+register = template.Library()
+
+
+def _srcset(variants):
+    return ', '.join(
+        f'{default_storage.url(name)} {width}w' for width, name in variants
+    )
+
+
+@register.simple_tag
+def responsive_image(image, alt='', sizes='100vw', eager=False, **attrs):
+    """
+    Render an image field as a <picture> with WebP and JPEG srcsets.
+
+    `sizes` tells the browser how wide the slot is, so it can pick the
+    smallest rendition that fills it. Images are lazy-loaded unless
+    `eager` is set (use it for the above-the-fold image on a page).
+    Falls back to the original upload while renditions are pending.
+    """
+    if not image:
+        return ''
+
+    css_class = attrs.get('class', '')
+    loading = 'eager' if eager else 'lazy'
+    variants = available_variants(image.name)
+    if 'jpeg' not in variants:
+        variant_queue.queue_missing(image.name)
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+            image.url, alt, css_class, loading,
+        )
+
+    jpeg = variants['jpeg']
+    webp = variants.get('webp')
+    source = ''
+    if webp:
+        source = format_html(
+            '<source type="image/webp" srcset="{}" sizes="{}">', _srcset(webp), sizes
+        )
+    return format_html(
+        '<picture style="display: contents">{}'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}" decoding="async">'
+        '</picture>',
+        source,
+        default_storage.url(jpeg[-1][1]),
+        _srcset(jpeg),
+        sizes,
+        alt,
+        css_class,
+        loading,
+    )
+
+
+@register.simple_tag
+def thumbnail_url(image):
+    """URL of the smallest rendition of an image (or the original)."""
+    return images.thumbnail_url(image)
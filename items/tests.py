@@ -1,8 +1,39 @@
-from django.test import TestCase, Client
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from .models import Item
-from datetime import date
+from .models import Item, ItemMatch
+from .counts import ItemCount, count_items
+from .forms import ItemForm, ItemSearchForm
+from .images import available_variants, variant_name
+from .models import ItemImage
+from .uploads import inspect_image, shutdown_pool, start_pool
+from . import cards, matching
+from .matching import matches_for
+from .pagination import CursorPaginator, decode_cursor
+from .query import ItemQuery
+from .related import rebuild_all, related_items
+from .search import search_items
+from .summary import owner_summary
+from .view_counter import ViewCounter, view_counter
+from datetime import date, timedelta
+from io import BytesIO
+from unittest.mock import patch
+from PIL import Image
+import numpy as np
+import shutil
+import tempfile
+import base64
+import itertools
+import re
 
 User = get_user_model()
 
@@ -163,3 +194,1009 @@ class ItemViewTests(TestCase):
             reverse('items:edit', kwargs={'pk': self.approved_item.pk})
         )
         self.assertEqual(response.status_code, 404)  # Not found
+
+
+class ItemSearchTests(TestCase):
+    """
+    Test cases for full-text item search.
+    """
+    
+    def setUp(self):
+        """Create a few approved items to search through"""
+        self.user = User.objects.create_user(
+            username='searcher',
+            email='searcher@pucit.edu.pk',
+            password='testpass123',
+            is_verified=True
+        )
+        self.phone = Item.objects.create(
+            title='Black Samsung phone',
+            description='Cracked screen protector',
+            item_type='lost',
+            category='electronics',
+            location='Library',
+            date_lost_found=date.today(),
+            user=self.user,
+            is_approved=True
+        )
+        self.wallet = Item.objects.create(
+            title='Brown wallet',
+            description='Has a phone number card inside',
+            item_type='found',
+            category='other',
+            location='Cafeteria',
+            date_lost_found=date.today(),
+            user=self.user,
+            is_approved=True
+        )
+    
+    def test_search_matches_prefix_terms(self):
+        """Test that partial words match (search-as-you-type)"""
+        results = search_items(Item.objects.all(), 'sams')
+        self.assertEqual(list(results), [self.phone])
+    
+    def test_search_matches_partial_words(self):
+        """Test that a prefix cut mid-stem still matches the whole word"""
+        self.wallet.description = 'Found near the running track'
+        self.wallet.save()
+        self.assertEqual(list(search_items(Item.objects.all(), 'runn')), [self.wallet])
+        self.assertEqual(list(search_items(Item.objects.all(), 'protect')), [self.phone])
+    
+    def test_search_ranks_title_matches_first(self):
+        """Test that a title match outranks a description match"""
+        results = list(search_items(Item.objects.all(), 'phone'))
+        self.assertEqual(results[0], self.phone)
+        self.assertIn(self.wallet, results)
+    
+    def test_search_index_follows_edits_and_deletes(self):
+        """Test that the index is kept in sync on save and delete"""
+        self.wallet.title = 'Brown leather purse'
+        self.wallet.save()
+        self.assertIn(self.wallet, search_items(Item.objects.all(), 'purse'))
+        
+        self.wallet.delete()
+        self.assertFalse(search_items(Item.objects.all(), 'purse').exists())
+    
+    def test_search_ignores_query_syntax(self):
+        """Test that operator characters in user input are harmless"""
+        results = search_items(Item.objects.all(), '"library" * -(:')
+        self.assertEqual(list(results), [self.phone])
+    
+    def test_list_view_uses_search(self):
+        """Test that the list view filters by the search query"""
+        response = self.client.get(reverse('items:list'), {'search': 'wallet'})
+        self.assertContains(response, 'Brown wallet')
+        self.assertNotContains(response, 'Black Samsung phone')
+
+
+class ItemCursorPaginationTests(TestCase):
+    """
+    Test cases for keyset (cursor) pagination of item listings.
+    """
+    
+    def setUp(self):
+        """Create enough approved items for three pages"""
+        self.user = User.objects.create_user(
+            username='pager',
+            email='pager@pucit.edu.pk',
+            password='testpass123',
+            is_verified=True
+        )
+        for i in range(7):
+            Item.objects.create(
+                title=f'Item {i}',
+                description='Test description',
+                item_type='lost',
+                category='other',
+                location='Library',
+                date_lost_found=date.today(),
+                user=self.user,
+                is_approved=True
+            )
+        self.newest_first = list(Item.objects.order_by('-created_at', '-id'))
+    
+    def test_pages_cover_all_items_in_order(self):
+        """Test that following next cursors walks every item exactly once"""
+        paginator = CursorPaginator(Item.objects.all(), per_page=3)
+        page = paginator.get_page(None)
+        seen = list(page)
+        self.assertFalse(page.has_previous())
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, self.newest_first)
+    
+    def test_previous_cursor_returns_prior_page(self):
+        """Test that going back returns the same rows in the same order"""
+        paginator = CursorPaginator(Item.objects.all(), per_page=3)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+    
+    def test_new_items_do_not_shift_pages(self):
+        """Test that an item posted mid-browse doesn't cause duplicates"""
+        paginator = CursorPaginator(Item.objects.all(), per_page=3)
+        first = paginator.get_page(None)
+        Item.objects.create(
+            title='Brand new',
+            description='Posted while browsing',
+            item_type='found',
+            category='other',
+            location='Gate',
+            date_lost_found=date.today(),
+            user=self.user,
+            is_approved=True
+        )
+        second = paginator.get_page(first.next_cursor)
+        self.assertEqual(list(second), self.newest_first[3:6])
+    
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        """Test that a garbage cursor is treated as the first page"""
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+        page = CursorPaginator(Item.objects.all(), per_page=3).get_page('not-a-cursor')
+        self.assertEqual(list(page), self.newest_first[:3])
+    
+    def test_cursor_past_deleted_rows_falls_back_to_first_page(self):
+        """Test that a cursor with nothing left after it serves the first page"""
+        paginator = CursorPaginator(Item.objects.all(), per_page=3)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        Item.objects.filter(pk__in=[item.pk for item in self.newest_first[3:]]).delete()
+        
+        page = paginator.get_page(first.next_cursor)
+        self.assertEqual(list(page), self.newest_first[:3])
+        self.assertFalse(page.has_previous())
+        self.assertIsNone(page.next_cursor)
+        Item.objects.filter(pk__in=[item.pk for item in self.newest_first[:3]]).delete()
+        self.assertEqual(list(paginator.get_page(second.previous_cursor)), [])
+        
+        for payload in ('["2025-01-01T00:00:00",1,"n"]', '["2025-01-01",99999999999999999999999,"n"]'):
+            cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+            response = self.client.get(reverse('items:list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+    
+    def test_list_view_links_next_cursor(self):
+        """Test that the list view renders a cursor link to the next page"""
+        for i in range(6):
+            Item.objects.create(
+                title=f'Extra {i}',
+                description='Test description',
+                item_type='found',
+                category='other',
+                location='Gate',
+                date_lost_found=date.today(),
+                user=self.user,
+                is_approved=True
+            )
+        response = self.client.get(reverse('items:list'))
+        page = response.context['page_obj']
+        self.assertTrue(page.has_next())
+        self.assertContains(response, f'cursor={page.next_cursor}')
+
+
+class ItemCountTests(TestCase):
+    """
+    Test cases for cached and estimated listing counts.
+    """
+    
+    def setUp(self):
+        """Create a user, a few items and start from an empty cache"""
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='counter',
+            email='counter@pucit.edu.pk',
+            password='testpass123',
+            is_verified=True
+        )
+        for item_type in ['lost', 'lost', 'found']:
+            Item.objects.create(
+                title='Counted item',
+                description='Test description',
+                item_type=item_type,
+                category='keys',
+                location='Library',
+                date_lost_found=date.today(),
+                user=self.user,
+                is_approved=True
+            )
+    
+    def test_count_is_cached_per_filter_signature(self):
+        """Test that a repeated count is served from the cache"""
+        items = Item.objects.filter(is_approved=True, item_type='lost')
+        filters = {'is_approved': True, 'item_type': 'lost', 'search': ''}
+        self.assertEqual(count_items(items, filters), ItemCount(2))
+        with self.assertNumQueries(0):
+            # Empty values are normalized away, so this is the same signature
+            self.assertEqual(count_items(items, {'is_approved': True, 'item_type': 'lost'}).value, 2)
+    
+    def test_saving_an_item_invalidates_counts(self):
+        """Test that cached counts expire when an item changes"""
+        items = Item.objects.filter(is_approved=True)
+        self.assertEqual(count_items(items, {'is_approved': True}).value, 3)
+        Item.objects.filter(item_type='found').first().delete()
+        self.assertEqual(count_items(items, {'is_approved': True}).value, 2)
+    
+    def test_view_count_update_keeps_cached_counts(self):
+        """Test that bumping views_count doesn't throw away cached counts"""
+        items = Item.objects.filter(is_approved=True)
+        count_items(items, {'is_approved': True})
+        Item.objects.first().increment_views()
+        with self.assertNumQueries(0):
+            count_items(items, {'is_approved': True})
+    
+    @override_settings(ITEM_COUNT_ESTIMATE_THRESHOLD=2)
+    def test_large_tables_use_planner_estimate(self):
+        """Test that sqlite_stat1 estimates replace COUNT(*) on big tables"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE items_item')
+        result = count_items(
+            Item.objects.filter(is_approved=True, category='keys'),
+            {'is_approved': True, 'category': 'keys'}
+        )
+        self.assertFalse(result.exact)
+        self.assertGreater(result.value, 0)
+    
+    def test_list_view_counts_once(self):
+        """Test that the list view shows the total without recounting"""
+        response = self.client.get(reverse('items:list'))
+        self.assertEqual(response.context['total_items'].value, 3)
+        self.assertContains(response, '3 items')
+
+
+class ItemQueryIndexTests(TestCase):
+    """
+    Test that every filter combination built by ItemQuery is served by
+    an index (checked with EXPLAIN QUERY PLAN) rather than a table scan.
+    """
+    
+    FORM_COMBINATIONS = [
+        dict(zip(('item_type', 'category', 'date_from', 'date_to'), values))
+        for values in itertools.product(
+            ['', 'lost'], ['', 'keys'], ['', '2025-01-01'], ['', '2025-02-01']
+        )
+    ]
+    
+    VIEW_FILTERS = [
+        {},  # item_list
+        {'item_type': 'lost', 'status': 'active'},  # lost_items
+        {'item_type': 'found', 'status': 'active'},  # found_items
+    ]
+    
+    def explain(self, queryset, table='items_item'):
+        """Return the plan lines that touch a table"""
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            details = [row[-1] for row in cursor.fetchall()]
+        return [line for line in details if f'{table} ' in line + ' ']
+    
+    def assertUsesIndex(self, queryset, label):
+        plan = self.explain(queryset)
+        self.assertTrue(plan, f'No plan for {label}')
+        for line in plan:
+            self.assertRegex(
+                line, r'USING (COVERING )?INDEX item_\w+|USING INTEGER PRIMARY KEY',
+                f'Table scan for {label}: {line}'
+            )
+    
+    def test_every_filter_combination_uses_an_index(self):
+        """Test count, first-page and next-page queries for each combination"""
+        after = Q(created_at__lt=timezone.now()) | Q(created_at=timezone.now(), id__lt=10)
+        for fixed in self.VIEW_FILTERS:
+            for data in self.FORM_COMBINATIONS:
+                label = f'{fixed} {data}'
+                items = ItemQuery(ItemSearchForm(data), **fixed).queryset()
+                self.assertUsesIndex(items, label)
+                self.assertUsesIndex(items.order_by('-created_at', '-id')[:13], label)
+                self.assertUsesIndex(
+                    items.filter(after).order_by('-created_at', '-id')[:13], label
+                )
+    
+    def test_search_uses_the_full_text_index(self):
+        """Test that keyword searches look items up by primary key"""
+        items = ItemQuery(ItemSearchForm({'search': 'wallet'})).queryset()
+        self.assertEqual(
+            self.explain(items), ['SEARCH items_item USING INTEGER PRIMARY KEY (rowid=?)']
+        )
+        # FTS5 reports its own index as a virtual table "scan" constrained
+        # by MATCH (M); without the constraint it would read every row
+        fts = self.explain(items, 'items_item_fts')
+        self.assertTrue(fts)
+        for line in fts:
+            self.assertRegex(line, r'^SCAN items_item_fts VIRTUAL TABLE INDEX \d+:=?M')
+    
+    def test_fixed_filters_override_the_form(self):
+        """Test that lost/found pages ignore a submitted item_type"""
+        query = ItemQuery(ItemSearchForm({'item_type': 'found'}), item_type='lost')
+        self.assertEqual(query.filters['item_type'], 'lost')
+
+
+@override_settings(ITEM_VIEW_FLUSH_INTERVAL=0, ITEM_VIEW_MAX_PENDING=1000)
+class ViewCounterTests(TestCase):
+    """
+    Test cases for the buffered (write-behind) view counter.
+    """
+    
+    def setUp(self):
+        """Create an approved item and a fresh counter"""
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='viewer',
+            email='viewer@pucit.edu.pk',
+            password='testpass123',
+            is_verified=True
+        )
+        self.item = Item.objects.create(
+            title='Viewed item',
+            description='Test description',
+            item_type='found',
+            category='bags',
+            location='Library',
+            date_lost_found=date.today(),
+            user=self.user,
+            is_approved=True
+        )
+        self.counter = ViewCounter()
+    
+    def test_views_are_buffered_until_flush(self):
+        """Test that recording a view doesn't touch the database"""
+        with self.assertNumQueries(0):
+            self.counter.record(self.item.pk)
+            self.counter.record(self.item.pk)
+        self.assertEqual(self.counter.pending(self.item.pk), 2)
+        
+        self.counter.flush()
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.views_count, 2)
+        self.assertEqual(self.counter.pending(self.item.pk), 0)
+    
+    def test_flush_batches_items_by_increment(self):
+        """Test that one UPDATE covers every item with the same increment"""
+        other = Item.objects.create(
+            title='Another item',
+            description='Test description',
+            item_type='lost',
+            category='bags',
+            location='Gate',
+            date_lost_found=date.today(),
+            user=self.user,
+            is_approved=True
+        )
+        self.counter.record(self.item.pk)
+        self.counter.record(other.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.counter.flush(), 2)
+    
+    @override_settings(ITEM_VIEW_DEDUPE_SECONDS=60)
+    def test_repeat_views_are_deduplicated(self):
+        """Test that reloading the detail page counts once per window"""
+        url = reverse('items:detail', kwargs={'pk': self.item.pk})
+        before = view_counter.pending(self.item.pk)
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(view_counter.pending(self.item.pk), before + 1)
+    
+    def test_max_pending_forces_a_flush(self):
+        """Test that a full buffer is written immediately"""
+        with self.settings(ITEM_VIEW_MAX_PENDING=3):
+            for _ in range(3):
+                self.counter.record(self.item.pk)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.views_count, 3)
+
+
+class RelatedItemTests(TestCase):
+    """
+    Test cases for the precomputed related items table.
+    """
+    
+    def setUp(self):
+        """Create a lost item and a few approved items around it"""
+        self.user = User.objects.create_user(
+            username='relater',
+            email='relater@pucit.edu.pk',
+            password='testpass123',
+            is_verified=True
+        )
+        self.lost = self.make('Blue water bottle', 'lost', 'Sports complex')
+        self.match = self.make('Blue steel water bottle', 'found', 'Sports complex')
+        self.weak = self.make('Cricket bat', 'lost', 'Hostel')
+    
+    def make(self, title, item_type, location, category='sports', **kwargs):
+        return Item.objects.create(
+            title=title,
+            description=title,
+            item_type=item_type,
+            category=category,
+            location=location,
+            date_lost_found=date.today(),
+            user=self.user,
+            is_approved=kwargs.pop('is_approved', True),
+            **kwargs
+        )
+    
+    def test_related_items_are_ranked(self):
+        """Test that the most similar opposite-type item comes first"""
+        self.assertEqual(related_items(self.lost), [self.match, self.weak])
+    
+    def test_detail_page_reads_precomputed_rows(self):
+        """Test that the detail view shows the precomputed related items"""
+        response = self.client.get(reverse('items:detail', kwargs={'pk': self.lost.pk}))
+        self.assertEqual(response.context['related_items'], [self.match, self.weak])
+    
+    def test_closing_an_item_removes_it_from_lists(self):
+        """Test that closed items drop out of other items' lists"""
+        self.match.close_item()
+        self.assertEqual(related_items(self.lost), [self.weak])
+        self.assertEqual(related_items(self.match), [])
+    
+    def test_unapproved_items_are_not_related(self):
+        """Test that pending items only appear once approved"""
+        pending = self.make('Blue water bottle lid', 'found', 'Sports complex', is_approved=False)
+        self.assertNotIn(pending, related_items(self.lost))
+        pending.is_approved = True
+        pending.save()
+        self.assertIn(pending, related_items(self.lost))
+    
+    def test_approving_from_the_filtered_changelist(self):
+        """Test that the admin's approve action fills lists from the "not approved" filter"""
+        pending = self.make('Blue water bottle lid', 'found', 'Sports complex', is_approved=False)
+        admin_user = User.objects.create_superuser(
+            username='moderator', email='moderator@pucit.edu.pk', password='testpass123'
+        )
+        self.client.force_login(admin_user)
+        
+        url = reverse('admin:items_item_changelist') + '?is_approved__exact=0'
+        response = self.client.post(url, {'action': 'approve_items', '_selected_action': [pending.pk]})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(self.lost, related_items(pending))
+        self.assertIn(pending, related_items(self.lost))
+    
+    def test_lists_are_capped_and_refilled_on_delete(self):
+        """Test that lists keep the top entries and refill after deletes"""
+        extras = [self.make(f'Blue water bottle {i}', 'found', 'Gym') for i in range(4)]
+        self.assertEqual(len(related_items(self.lost)), 4)
+        for extra in extras:
+            extra.delete()
+        self.assertEqual(related_items(self.lost), [self.match, self.weak])
+    
+    def test_incremental_updates_match_full_rebuild(self):
+        """Test that signal-driven updates agree with a full rebuild"""
+        self.make('Red water bottle', 'found', 'Library')
+        self.make('Football', 'found', 'Sports complex')
+        self.weak.title = 'Blue bottle'
+        self.weak.save()
+        incremental = {
+            item.pk: related_items(item) for item in Item.objects.all()
+        }
+        rebuild_all()
+        rebuilt = {item.pk: related_items(item) for item in Item.objects.all()}
+        self.assertEqual(incremental, rebuilt)
+
+
+class ItemMatchingTests(TestCase):
+    """
+    Test cases for the lost-to-found matching engine.
+    """
+    
+    def setUp(self):
+        """Create a lost item with a likely and an unlikely found match"""
+        self.user = User.objects.create_user(
+            username='matcher',
+            email='matcher@pucit.edu.pk',
+            password='testpass123',
+            is_verified=True
+        )
+        self.lost = self.make('Black leather wallet', 'lost', 'Main library')
+        self.match = self.make('Black wallet found', 'found', 'Main library')
+        self.other = self.make('Silver ring', 'found', 'Cafeteria')
+    
+    def make(self, title, item_type, location, category='bags', days_ago=0, **kwargs):
+        return Item.objects.create(
+            title=title,
+            description=f'{title} near the {location}',
+            item_type=item_type,
+            category=category,
+            location=location,
+            date_lost_found=date.today() - timedelta(days=days_ago),
+            user=self.user,
+            is_approved=kwargs.pop('is_approved', True),
+            **kwargs
+        )
+    
+    def test_similar_items_are_matched(self):
+        """Test that a similar opposite-type item is matched both ways"""
+        self.assertEqual(matches_for(self.lost), [self.match])
+        self.assertEqual(matches_for(self.match), [self.lost])
+        self.assertEqual(matches_for(self.other), [])
+    
+    def test_other_categories_are_not_matched(self):
+        """Test that matches stay within a category"""
+        elsewhere = self.make('Black leather wallet', 'found', 'Main library', category='other')
+        self.assertEqual(matches_for(elsewhere), [])
+    
+    def test_date_window(self):
+        """Test that items found long before the loss are not matched"""
+        stale = self.make('Black leather wallet', 'found', 'Main library', days_ago=60)
+        self.assertNotIn(stale, matches_for(self.lost))
+        later = self.make('Black leather wallet', 'lost', 'Main library', days_ago=90)
+        self.assertIn(stale, matches_for(later))
+    
+    def test_closing_an_item_removes_its_matches(self):
+        """Test that closed items drop out of the match table"""
+        self.match.close_item()
+        self.assertEqual(matches_for(self.lost), [])
+    
+    def test_matches_shown_to_owner_only(self):
+        """Test that possible matches are only shown to the item's owner"""
+        url = reverse('items:detail', kwargs={'pk': self.lost.pk})
+        self.assertEqual(self.client.get(url).context['possible_matches'], [])
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).context['possible_matches'], [self.match])
+    
+    def test_approving_from_the_filtered_changelist(self):
+        """Test that the admin's approve action matches items from the "not approved" filter"""
+        pending = self.make('Black leather wallet', 'found', 'Main library', is_approved=False)
+        admin_user = User.objects.create_superuser(
+            username='moderator', email='moderator@pucit.edu.pk', password='testpass123'
+        )
+        self.client.force_login(admin_user)
+        
+        url = reverse('admin:items_item_changelist') + '?is_approved__exact=0'
+        self.client.post(url, {'action': 'approve_items', '_selected_action': [pending.pk]})
+        self.assertIn(self.lost, matches_for(pending))
+        self.assertIn(pending, matches_for(self.lost))
+    
+    def test_incremental_updates_match_full_rebuild(self):
+        """Test that signal-driven updates agree with a full rebuild"""
+        self.make('Brown leather wallet', 'found', 'Library entrance', days_ago=3)
+        self.make('Black wallet', 'lost', 'Main library', days_ago=5)
+        self.other.title = 'Black leather purse'
+        self.other.save()
+        incremental = {item.pk: matches_for(item) for item in Item.objects.all()}
+        matching.rebuild_all()
+        rebuilt = {item.pk: matches_for(item) for item in Item.objects.all()}
+        self.assertEqual(incremental, rebuilt)
+    
+    def test_closing_a_match_refills_its_partner(self):
+        """Test that a lost item gets its next-best match when one is closed"""
+        lost = self.make('Blue water bottle', 'lost', 'Sports complex', category='other')
+        best = [
+            self.make(f'Blue water bottle {words}', 'found', 'Sports complex', category='other')
+            for words in ('steel', 'steel cap', 'steel cap dented', 'with steel cap', 'with dents')
+        ]
+        # The spare is a better match for other lost items than for `lost`
+        for i in range(matching.TOP_MATCHES):
+            self.make(f'Green plastic bottle with stickers {i}', 'lost', 'Sports complex', category='other')
+        spare = self.make('Blue plastic bottle with stickers', 'found', 'Sports complex', category='other')
+        self.assertEqual(set(matches_for(lost)), set(best))
+        self.assertNotIn(lost, matches_for(spare))
+        
+        best[0].close_item()
+        self.assertEqual(set(matches_for(lost)), set(best[1:]) | {spare})
+        self.assertEqual(ItemMatch.objects.filter(lost_item=lost).count(), matching.TOP_MATCHES)
+    
+    def test_lists_stay_trimmed(self):
+        """Test that incremental updates keep exactly the pairs a rebuild would"""
+        for i in range(4):
+            self.make(f'Black wallet {i}', 'lost', 'Main library')
+        for words in ('leather', 'leather strap', 'with cards', 'with cards and cash',
+                      'brown stitching', 'zip', 'small zip'):
+            self.make(f'Black wallet {words}', 'found', 'Main library')
+        for i in range(3):
+            self.make(f'Black leather wallet {i}', 'lost', 'Library')
+        self.match.close_item()
+        Item.objects.filter(title='Black wallet zip').get().delete()
+        incremental = set(ItemMatch.objects.values_list('lost_item', 'found_item'))
+        
+        matching.rebuild_all()
+        self.assertEqual(incremental, set(ItemMatch.objects.values_list('lost_item', 'found_item')))
+    
+    def test_saves_update_cached_pools_in_place(self):
+        """Test that a save vectorizes the changed item, not its whole category"""
+        for i in range(20):
+            self.make(f'Black wallet {i}', 'found', 'Main library', days_ago=i)
+        matching.get_pool('bags', 'lost')
+        matching.get_pool('bags', 'found')
+        
+        with patch.object(matching, 'vectorize', wraps=matching.vectorize) as vectorize:
+            self.match.title = 'Black leather wallet found'
+            self.match.save()
+            self.make('Black leather wallet', 'lost', 'Library')
+            self.make('Black leather wallet', 'found', 'Library', days_ago=30)
+            self.other.close_item()
+            Item.objects.get(title='Black wallet 3').delete()
+            pool = matching.get_pool('bags', 'found')
+        # Changed items and the lists they affect, never the whole pool
+        self.assertLess(max(len(call.args[0]) for call in vectorize.call_args_list), 10)
+        
+        fresh = matching.Pool(list(matching._listed('bags', 'found').values_list(*matching.ROW_FIELDS)))
+        self.assertEqual(sorted(pool.pks), sorted(fresh.pks))
+        self.assertTrue((np.diff(pool.days) >= 0).all())
+        order = {pk: i for i, pk in enumerate(fresh.pks)}
+        for i, pk in enumerate(pool.pks):
+            np.testing.assert_allclose(pool.matrix[i], fresh.matrix[order[pk]])
+    
+    def test_rebuild_uses_chunks(self):
+        """Test that a chunked rebuild gives the same pairs as one block"""
+        for i in range(6):
+            self.make(f'Black wallet {i}', 'lost', 'Main library', days_ago=i * 20)
+            self.make(f'Black leather wallet {i}', 'found', 'Library', days_ago=i * 20)
+        matching.rebuild_all()
+        expected = set(ItemMatch.objects.values_list('lost_item', 'found_item'))
+        with patch.object(matching, 'CHUNK_SIZE', 2):
+            matching.rebuild_all()
+        self.assertEqual(set(ItemMatch.objects.values_list('lost_item', 'found_item')), expected)
+
+
+class ItemImageVariantTests(TestCase):
+    """
+    Test cases for resized item photo renditions.
+    """
+    
+    def setUp(self):
+        """Use a throwaway MEDIA_ROOT and generate variants inline"""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, ITEM_IMAGE_WORKERS=0, ITEM_UPLOAD_PROCESSES=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Cached rendition lists of other tests' (identically named) uploads
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='photographer',
+            email='photographer@pucit.edu.pk',
+            password='testpass123',
+            is_verified=True
+        )
+    
+    def upload(self, width, height, mode='RGB', fmt='JPEG', name='photo.jpg'):
+        buffer = BytesIO()
+        Image.new(mode, (width, height), 'red').save(buffer, fmt)
+        return SimpleUploadedFile(name, buffer.getvalue())
+    
+    def make(self, image, commit=True):
+        with self.captureOnCommitCallbacks(execute=commit):
+            return Item.objects.create(
+                title='Red umbrella',
+                description='Red umbrella',
+                item_type='found',
+                category='other',
+                location='Library',
+                date_lost_found=date.today(),
+                user=self.user,
+                image=image,
+            )
+    
+    def render(self, source, item):
+        return Template('{% load item_images %}' + source).render(Context({'item': item}))
+    
+    def test_upload_generates_smaller_renditions(self):
+        """Test that each width below the original is written as WebP and JPEG"""
+        item = self.make(self.upload(800, 600))
+        variants = available_variants(item.image.name)
+        self.assertEqual([width for width, _ in variants['webp']], [96, 320, 640])
+        self.assertEqual([width for width, _ in variants['jpeg']], [96, 320, 640])
+        with default_storage.open(variant_name(item.image.name, 320, 'webp')) as rendition:
+            self.assertEqual(Image.open(rendition).size, (320, 240))
+    
+    def test_narrow_and_transparent_images(self):
+        """Test that small RGBA uploads still get a JPEG-compatible rendition"""
+        item = self.make(self.upload(50, 50, mode='RGBA', fmt='PNG', name='icon.png'))
+        variants = available_variants(item.image.name)
+        self.assertEqual([width for width, _ in variants['jpeg']], [96])
+        with default_storage.open(variants['jpeg'][0][1]) as rendition:
+            self.assertEqual(Image.open(rendition).mode, 'RGB')
+    
+    def test_tag_renders_lazy_srcset(self):
+        """Test that the tag emits WebP and JPEG srcsets with lazy loading"""
+        item = self.make(self.upload(800, 600))
+        html = self.render('{% responsive_image item.image item.title sizes="33vw" %}', item)
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('.320w.webp 320w', html)
+        self.assertIn('.640w.jpg 640w', html)
+        self.assertIn('sizes="33vw"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertNotIn(item.image.url + '"', html)
+    
+    def test_tag_falls_back_to_original(self):
+        """Test that the original is served until renditions exist"""
+        # Variants are only generated once the transaction commits
+        item = self.make(self.upload(800, 600), commit=False)
+        self.assertEqual(available_variants(item.image.name), {})
+        html = self.render('{% responsive_image item.image item.title eager=True %}', item)
+        self.assertIn(f'src="{item.image.url}"', html)
+        self.assertIn('loading="eager"', html)
+    
+    def test_render_never_generates_renditions(self):
+        """Test that a page missing renditions queues them instead of writing them"""
+        item = self.make(self.upload(800, 600), commit=False)
+        
+        with patch('items.images.generate_variants') as generate, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.render('{% responsive_image item.image %}{% thumbnail_url item.image %}', item)
+        generate.assert_not_called()
+        
+        with override_settings(ITEM_IMAGE_WORKERS=1), \
+                patch('items.images.variant_queue._submit') as submit:
+            self.render('{% responsive_image item.image %}', item)
+        submit.assert_called_once_with(item.image.name)
+    
+    def test_rendering_doesnt_stat_renditions(self):
+        """Test that the list of renditions is looked up in the cache"""
+        item = self.make(self.upload(800, 600))
+        self.render('{% responsive_image item.image %}', item)
+        
+        with patch('django.core.files.storage.FileSystemStorage.exists') as exists:
+            html = self.render('{% responsive_image item.image %}', item)
+        exists.assert_not_called()
+        self.assertIn('.640w.webp 640w', html)
+    
+    def test_deleting_a_photo_deletes_its_renditions(self):
+        """Test that renditions go with the item or extra image they belong to"""
+        item = self.make(self.upload(800, 600))
+        with self.captureOnCommitCallbacks(execute=True):
+            extra = ItemImage.objects.create(item=item, image=self.upload(400, 300, name='side.jpg'))
+        names = [
+            name
+            for image in (item.image, extra.image)
+            for variants in available_variants(image.name).values()
+            for _, name in variants
+        ]
+        self.assertEqual(len(names), 10)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            extra.delete()
+        self.assertEqual(available_variants(extra.image.name), {})
+        self.assertTrue(default_storage.exists(variant_name(item.image.name, 320, 'jpeg')))
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+    
+    def test_thumbnail_url_uses_smallest_rendition(self):
+        """Test that 48px slots get the smallest JPEG"""
+        item = self.make(self.upload(800, 600))
+        self.assertTrue(
+            self.render('{% thumbnail_url item.image %}', item).endswith('.96w.jpg')
+        )
+    
+    def test_upload_is_stripped_and_rotated(self):
+        """Test that EXIF is removed and the orientation applied after upload"""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotate 90 degrees clockwise
+        exif[0x010F] = 'Camera maker'
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(buffer, 'JPEG', exif=exif)
+        item = self.make(SimpleUploadedFile('photo.jpg', buffer.getvalue()))
+        with default_storage.open(item.image.name) as stored:
+            image = Image.open(stored)
+            self.assertEqual(image.size, (200, 400))
+            self.assertEqual(dict(image.getexif()), {})
+    
+    def test_sanitizing_pool_uses_forkserver_workers(self):
+        """Test that uploads are sanitized in forkserver worker processes"""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(buffer, 'JPEG', exif=exif)
+        self.addCleanup(shutdown_pool)
+        with override_settings(ITEM_UPLOAD_PROCESSES=1):
+            pool = start_pool()
+            self.assertIs(start_pool(), pool)
+            self.assertEqual(pool._mp_context.get_start_method(), 'forkserver')
+            item = self.make(SimpleUploadedFile('photo.jpg', buffer.getvalue()))
+            # A pool that was shut down is replaced on the next upload
+            shutdown_pool()
+            self.assertIsNot(start_pool(), pool)
+        with default_storage.open(item.image.name) as stored:
+            self.assertEqual(Image.open(stored).size, (200, 400))
+
+
+@override_settings(ITEM_IMAGE_MAX_DIMENSION=1000, ITEM_IMAGE_MAX_PIXELS=500000)
+class ItemUploadValidationTests(TestCase):
+    """
+    Test cases for header-only upload validation.
+    """
+    
+    def setUp(self):
+        """Create a user for the item form"""
+        self.user = User.objects.create_user(
+            username='uploader',
+            email='uploader@pucit.edu.pk',
+            password='testpass123',
+            is_verified=True
+        )
+    
+    def image_bytes(self, width, height, fmt='PNG'):
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), 'blue').save(buffer, fmt)
+        return buffer.getvalue()
+    
+    def form(self, name, content):
+        data = {
+            'title': 'Lost keys',
+            'description': 'A bunch of keys',
+            'item_type': 'lost',
+            'category': 'keys',
+            'location': 'Parking',
+            'date_lost_found': date.today().isoformat(),
+        }
+        files = {'image': SimpleUploadedFile(name, content)}
+        return ItemForm(data, files, user=self.user)
+    
+    def test_valid_image_is_accepted(self):
+        """Test that a real image with a matching extension passes"""
+        self.assertTrue(self.form('keys.png', self.image_bytes(100, 100)).is_valid())
+    
+    def test_renamed_files_are_rejected(self):
+        """Test that non-images and mismatched extensions are rejected"""
+        self.assertIn('image', self.form('keys.jpg', b'not an image at all').errors)
+        self.assertIn('image', self.form('keys.jpg', self.image_bytes(100, 100)).errors)
+    
+    def test_dimension_limits(self):
+        """Test that oversized images are rejected by their header"""
+        self.assertIn('image', self.form('wide.png', self.image_bytes(1200, 10)).errors)
+        self.assertIn('image', self.form('big.png', self.image_bytes(800, 800)).errors)
+    
+    def test_only_the_header_is_read(self):
+        """Test that a truncated file passes the header check (no decode)"""
+        data = self.image_bytes(100, 100)
+        header = data[:data.index(b'IDAT') + 4]  # stop before any pixel data
+        self.assertEqual(
+            inspect_image(SimpleUploadedFile('keys.png', header)), ('PNG', 100, 100)
+        )
+    
+    def test_model_validator_covers_admin_uploads(self):
+        """Test that ItemImage (edited via the admin) is validated too"""
+        item = Item.objects.create(
+            title='Lost keys',
+            description='A bunch of keys',
+            item_type='lost',
+            category='keys',
+            location='Parking',
+            date_lost_found=date.today(),
+            user=self.user,
+        )
+        image = ItemImage(item=item, image=SimpleUploadedFile('keys.gif', b'GIF89a garbage'))
+        with self.assertRaises(ValidationError):
+            image.full_clean()
+
+
+class ItemCardCacheTests(TestCase):
+    """
+    Test cases for cached item card fragments.
+    """
+    
+    def setUp(self):
+        """Create a few approved items and start from an empty cache"""
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='carder',
+            email='carder@pucit.edu.pk',
+            password='testpass123',
+            is_verified=True
+        )
+        self.items = [
+            Item.objects.create(
+                title=f'Card item {i}',
+                description='Card item',
+                item_type='found',
+                category='other',
+                location='Library',
+                date_lost_found=date.today(),
+                user=self.user,
+                is_approved=True,
+            )
+            for i in range(3)
+        ]
+    
+    def test_cards_are_fetched_in_one_round_trip(self):
+        """Test that a page of warm cards is one get_many and no renders"""
+        cards.render_cards(self.items, 'grid')
+        with patch.object(cards, 'render_card') as render, \
+                patch.object(cards.cache, 'get_many', wraps=cards.cache.get_many) as get_many:
+            html = cards.render_cards(self.items, 'grid')
+        render.assert_not_called()
+        get_many.assert_called_once()
+        self.assertIn('Card item 1', html[1])
+    
+    def test_saving_an_item_renders_a_fresh_card(self):
+        """Test that the key follows updated_at, so edits show up"""
+        cards.render_cards(self.items, 'grid')
+        item = self.items[0]
+        item.title = 'Renamed card'
+        item.save()
+        self.assertIn('Renamed card', cards.render_cards([item], 'grid')[0])
+    
+    def test_variants_are_cached_separately(self):
+        """Test that the same item renders differently per variant"""
+        grid = cards.render_cards(self.items[:1], 'grid')[0]
+        compact = cards.render_cards(self.items[:1], 'compact')[0]
+        self.assertNotEqual(grid, compact)
+        self.assertIn('View Details', grid)
+    
+    def test_list_page_uses_cached_cards(self):
+        """Test that the listing shows the cached card markup"""
+        cards.render_cards(self.items, 'grid')
+        key = cards.card_key(self.items[2], 'grid')
+        cache.set(key, '<div>cached card marker</div>')
+        response = self.client.get(reverse('items:list'))
+        self.assertContains(response, 'cached card marker')
+
+
+
+class OwnerSummaryTests(TestCase):
+    """
+    Test cases for the dashboard / My Items owner summary.
+    """
+    
+    def setUp(self):
+        """Create a user with items in every status bucket"""
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='owner',
+            email='owner@pucit.edu.pk',
+            password='testpass123',
+            is_verified=True
+        )
+        self.make(3, is_approved=False)
+        self.make(2, is_approved=True)
+        self.make(1, is_approved=True, status='returned')
+        self.client.force_login(self.user)
+    
+    def make(self, count, **fields):
+        for i in range(count):
+            Item.objects.create(
+                title=f'Owner item {Item.objects.count()}',
+                description='Blue water bottle',
+                item_type='lost',
+                category='other',
+                location='Library',
+                date_lost_found=date.today(),
+                user=self.user,
+                **fields
+            )
+    
+    def queries_for(self, url):
+        self.client.get(url)  # warm the card and session caches
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return len(queries), response
+    
+    def test_summary_counts_every_bucket_in_one_query(self):
+        """Test that the status buckets come from one aggregate query"""
+        with self.assertNumQueries(2):
+            summary = owner_summary(self.user)
+        self.assertEqual(
+            (summary.total, summary.pending, summary.active, summary.closed), (6, 3, 2, 1)
+        )
+        self.assertEqual(len(summary.items), 5)
+        self.assertTrue(summary.has_more)
+        self.assertEqual(summary.items[0].title, 'Owner item 5')
+    
+    def test_dashboard_cost_does_not_grow_with_items(self):
+        """Test that the dashboard runs the same queries for 6 or 30 items"""
+        before, response = self.queries_for(reverse('users:dashboard'))
+        self.assertContains(response, 'View All')
+        # Total, pending, active, closed
+        counts = re.findall(r'<p class="text-2xl font-bold[^"]*">(\d+)</p>', response.content.decode())
+        self.assertEqual(counts, ['6', '3', '2', '1'])
+        self.make(24, is_approved=True)
+        after, response = self.queries_for(reverse('users:dashboard'))
+        self.assertEqual(before, after)
+        self.assertEqual(response.context['summary'].total, 30)
+    
+    def test_my_items_cost_does_not_grow_with_items(self):
+        """Test that My Items counts and lists the items in constant queries"""
+        before, response = self.queries_for(reverse('items:my_items'))
+        self.assertEqual(len(response.context['items']), 6)
+        self.make(10, is_approved=False)
+        after, response = self.queries_for(reverse('items:my_items'))
+        self.assertEqual(before, after)
+        self.assertEqual(response.context['summary'].pending, 13)
+        self.assertEqual(len(response.context['items']), 16)
@@ -0,0 +1,224 @@
+"""
+Upload processing for item photos.
+
+Two stages:
+
+1. On the request: inspect_image() parses only the image header (Pillow
+   opens files lazily) to check the real format against the extension
+   and the dimensions against ITEM_IMAGE_MAX_DIMENSION /
+   ITEM_IMAGE_MAX_PIXELS. Renamed files and decompression bombs are
+   rejected before anything is written to storage, without decoding a
+   single pixel. validate_image_upload() is the model field validator
+   (Item.image, ItemImage.image); ItemForm uses HeaderCheckedImageField
+   instead of forms.ImageField, which would fully verify the file.
+
+2. After the upload is stored: sanitize_stored() strips EXIF (camera
+   details, GPS position) and applies the EXIF orientation. The decode
+   and re-encode run in a bounded process pool (ITEM_UPLOAD_PROCESSES),
+   driven from the variant thread pool in items.images, so bursts of
+   uploads queue up there instead of tying up web workers. The pool is
+   created on the first upload (so migrate, shell and other commands
+   never start one), shut down at exit, and its workers are started by
+   a forkserver: forking the threaded web process itself could copy
+   locks held by other threads into the children.
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+# Pillow format -> accepted file extensions
+ALLOWED_FORMATS = {
+    'JPEG': ('.jpg', '.jpeg'),
+    'PNG': ('.png',),
+    'GIF': ('.gif',),
+    'WEBP': ('.webp',),
+}
+
+# Pillow's EXIF tag for orientation
+ORIENTATION_TAG = 0x0112
+
+
+def inspect_image(file):
+    """
+    Check an uploaded file's header. Returns (format, width, height).
+    Raises ValidationError for anything that isn't an acceptable image.
+    """
+    file.seek(0)
+    try:
+        with warnings.catch_warnings():
+            # Our own pixel limit below is stricter than Pillow's warning
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            with Image.open(file) as image:
+                fmt, (width, height) = image.format, image.size
+    except Image.DecompressionBombError:
+        raise ValidationError('Image dimensions are too large.', code='image_too_large')
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise ValidationError(
+            'Upload a valid image. The file you uploaded was either not an image or a corrupted image.',
+            code='invalid_image',
+        )
+    finally:
+        file.seek(0)
+
+    if fmt not in ALLOWED_FORMATS:
+        raise ValidationError(
+            'Invalid image format. Please upload JPG, PNG, GIF, or WebP images only.',
+            code='invalid_image_format',
+        )
+    extension = os.path.splitext(file.name or '')[1].lower()
+    if extension not in ALLOWED_FORMATS[fmt]:
+        raise ValidationError(
+            'The file extension does not match the image format.',
+            code='invalid_image_extension',
+        )
+    if (
+        max(width, height) > settings.ITEM_IMAGE_MAX_DIMENSION
+        or width * height > settings.ITEM_IMAGE_MAX_PIXELS
+    ):
+        raise ValidationError(
+            'Image dimensions are too large. Please resize your image to at most '
+            f'{settings.ITEM_IMAGE_MAX_DIMENSION}px on its longest side.',
+            code='image_too_large',
+        )
+    return fmt, width, height
+
+
+def validate_image_upload(value):
+    """Model field validator: header-check new uploads only."""
+    if not value or getattr(value, '_committed', True):
+        # Already stored (e.g. the item is edited without a new photo)
+        return
+    inspect_image(value.file)
+
+
+class HeaderCheckedImageField(forms.ImageField):
+    """
+    forms.ImageField checks images with a full Image.verify() on the
+    request; this one only parses the header (see inspect_image).
+    """
+
+    def to_python(self, data):
+        f = forms.FileField.to_python(self, data)
+        if f is None:
+            return None
+        inspect_image(f)
+        return f
+
+
+def sanitize(data, max_pixels):
+    """
+    Strip EXIF from encoded image bytes and apply their orientation.
+    Returns the new bytes, or None if the image needs no changes.
+    Runs in a worker process, so it takes its limits as arguments.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(BytesIO(data)) as image:
+        fmt = image.format
+        if fmt not in ('JPEG', 'PNG', 'WEBP') or getattr(image, 'n_frames', 1) > 1:
+            # GIFs carry no EXIF; re-encoding animations would flatten them
+            return None
+        exif = image.getexif()
+        if not exif and 'exif' not in image.info:
+            return None
+
+        options = {}
+        if image.info.get('icc_profile'):
+            options['icc_profile'] = image.info['icc_profile']
+        if exif.get(ORIENTATION_TAG, 1) != 1:
+            image = ImageOps.exif_transpose(image)
+            if fmt == 'JPEG':
+                options['quality'] = 90
+        elif fmt == 'JPEG':
+            # Unrotated JPEGs keep their original quantization tables
+            options.update(quality='keep', subsampling='keep')
+        elif fmt == 'WEBP':
+            options['lossless'] = image.info.get('lossless', False)
+            options['quality'] = 90
+
+        output = BytesIO()
+        image.save(output, fmt, **options)
+    return output.getvalue()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def start_pool():
+    """
+    Create this process's sanitizing pool (if it has none yet) and
+    return it. Called for each upload; the forkserver has Pillow and
+    this module preloaded.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        # A process forked from one that had a pool needs its own
+        if _pool is None or _pool_pid != os.getpid():
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload([__name__])
+            _pool = ProcessPoolExecutor(max_workers=settings.ITEM_UPLOAD_PROCESSES, mp_context=context)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+@atexit.register
+def shutdown_pool():
+    """Stop this process's sanitizing pool, waiting for queued uploads."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        pool, owned = _pool, _pool_pid == os.getpid()
+        _pool = _pool_pid = None
+    if pool is not None and owned:
+        pool.shutdown()
+
+
+def sanitize_stored(name):
+    """
+    Sanitize a stored upload in place. Returns True if it was rewritten.
+    Blocks the calling (background) thread until the worker is done.
+    """
+    try:
+        with default_storage.open(name, 'rb') as original:
+            data = original.read()
+    except FileNotFoundError:
+        return False
+
+    try:
+        max_pixels = settings.ITEM_IMAGE_MAX_PIXELS
+        if settings.ITEM_UPLOAD_PROCESSES <= 0:
+            cleaned = sanitize(data, max_pixels)
+        else:
+            cleaned = start_pool().submit(sanitize, data, max_pixels).result()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return False
+    if cleaned is None:
+        return False
+
+    try:
+        path = default_storage.path(name)
+    except NotImplementedError:
+        # Remote storage: no atomic rename, replace the object
+        default_storage.delete(name)
+        default_storage.save(name, ContentFile(cleaned))
+        return True
+
+    # Write next to the original and swap it in atomically
+    temporary = f'{path}.sanitizing'
+    with open(temporary, 'wb') as output:
+        output.write(cleaned)
+    os.replace(temporary, path)
+    return True
@@ -1,10 +1,13 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
-from django.core.paginator import Paginator
 from .models import Item
 from .forms import ItemForm, ItemSearchForm, ItemStatusForm
+from .matching import matches_for
+from .query import ItemQuery
+from .related import related_items as get_related_items
+from .summary import owner_summary
+from .view_counter import view_counter
 
 
 def item_list(request):
@@ -18,51 +21,12 @@ def item_list(request):
     - Pagination
     - Accessible to all users (including non-logged-in)
     """
-    # Get search form
-    search_form = ItemSearchForm(request.GET)
-    
-    # Start with approved items only
-    items = Item.objects.filter(is_approved=True).select_related('user')
-    
-    # Apply search filters
-    if search_form.is_valid():
-        search_query = search_form.cleaned_data.get('search')
-        item_type = search_form.cleaned_data.get('item_type')
-        category = search_form.cleaned_data.get('category')
-        date_from = search_form.cleaned_data.get('date_from')
-        date_to = search_form.cleaned_data.get('date_to')
-        
-        # Search by keyword
-        if search_query:
-            items = items.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(location__icontains=search_query)
-            )
-        
-        # Filter by type
-        if item_type:
-            items = items.filter(item_type=item_type)
-        
-        # Filter by category
-        if category:
-            items = items.filter(category=category)
-        
-        # Filter by date range
-        if date_from:
-            items = items.filter(date_lost_found__gte=date_from)
-        if date_to:
-            items = items.filter(date_lost_found__lte=date_to)
-    
-    # Pagination
-    paginator = Paginator(items, 12)  # 12 items per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    query = ItemQuery(ItemSearchForm(request.GET))
     
     context = {
-        'page_obj': page_obj,
-        'search_form': search_form,
-        'total_items': items.count(),
+        'page_obj': query.paginate(request),
+        'search_form': query.form,
+        'total_items': query.total,
         'title': 'Lost & Found Items'
     }
     return render(request, 'items/item_list.html', context)
@@ -77,17 +41,19 @@ def item_detail(request, pk):
     - Show contact details (only for verified users)
     - Increment view count
     - Show related items
+    - Show possible lost/found matches to the item's owner
     """
     item = get_object_or_404(Item, pk=pk, is_approved=True)
     
-    # Increment view count
-    item.increment_views()
+    # Count the view (buffered, written in batches off the request path)
+    view_counter.record(item.pk, request)
+    item.views_count += view_counter.pending(item.pk)
     
-    # Get related items (same category, different item)
-    related_items = Item.objects.filter(
-        category=item.category,
-        is_approved=True
-    ).exclude(pk=item.pk)[:4]
+    # Get related items (precomputed, see items/related.py)
+    related_items = get_related_items(item)
+    
+    # Possible matches of the opposite type (owner only)
+    possible_matches = matches_for(item) if request.user == item.user else []
     
     # Check if user can see contact details
     can_see_contact = request.user.is_authenticated and request.user.is_verified
@@ -95,6 +61,7 @@ def item_detail(request, pk):
     context = {
         'item': item,
         'related_items': related_items,
+        'possible_matches': possible_matches,
         'can_see_contact': can_see_contact,
         'title': item.title
     }
@@ -222,18 +189,12 @@ def my_items(request):
     - Show approval status
     - Quick actions (edit, delete, change status)
     """
-    items = Item.objects.filter(user=request.user).order_by('-created_at')
-    
-    # Separate by status
-    pending_items = items.filter(is_approved=False)
-    approved_items = items.filter(is_approved=True, status='active')
-    closed_items = items.filter(status__in=['claimed', 'returned', 'closed'])
+    # Counts per status in one query, and the items once
+    summary = owner_summary(request.user, limit=None)
     
     context = {
-        'items': items,
-        'pending_items': pending_items,
-        'approved_items': approved_items,
-        'closed_items': closed_items,
+        'items': summary.items,
+        'summary': summary,
         'title': 'My Items'
     }
     return render(request, 'items/my_items.html', context)
@@ -282,43 +243,13 @@ def lost_items(request):
     """
     View specifically for lost items.
     """
-    # Get search form to maintain consistency with list view
-    search_form = ItemSearchForm(request.GET)
-    
-    items = Item.objects.filter(
-        is_approved=True,
-        item_type='lost',
-        status='active'
-    ).select_related('user')
-    
-    # Apply search filters if needed
-    if search_form.is_valid():
-        search_query = search_form.cleaned_data.get('search')
-        category = search_form.cleaned_data.get('category')
-        date_from = search_form.cleaned_data.get('date_from')
-        date_to = search_form.cleaned_data.get('date_to')
-        
-        if search_query:
-            items = items.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(location__icontains=search_query)
-            )
-        if category:
-            items = items.filter(category=category)
-        if date_from:
-            items = items.filter(date_lost_found__gte=date_from)
-        if date_to:
-            items = items.filter(date_lost_found__lte=date_to)
-
-    # Pagination
-    paginator = Paginator(items, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Same search form as the list view, but only active lost items
+    query = ItemQuery(ItemSearchForm(request.GET), item_type='lost', status='active')
     
     context = {
-        'page_obj': page_obj,
-        'search_form': search_form,
+        'page_obj': query.paginate(request),
+        'search_form': query.form,
+        'total_items': query.total,
         'item_type': 'lost',
         'title': 'Lost Items'
     }
@@ -329,43 +260,13 @@ def found_items(request):
     """
     View specifically for found items.
     """
-    # Get search form to maintain consistency with list view
-    search_form = ItemSearchForm(request.GET)
-
-    items = Item.objects.filter(
-        is_approved=True,
-        item_type='found',
-        status='active'
-    ).select_related('user')
-    
-    # Apply search filters if needed
-    if search_form.is_valid():
-        search_query = search_form.cleaned_data.get('search')
-        category = search_form.cleaned_data.get('category')
-        date_from = search_form.cleaned_data.get('date_from')
-        date_to = search_form.cleaned_data.get('date_to')
-        
-        if search_query:
-            items = items.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(location__icontains=search_query)
-            )
-        if category:
-            items = items.filter(category=category)
-        if date_from:
-            items = items.filter(date_lost_found__gte=date_from)
-        if date_to:
-            items = items.filter(date_lost_found__lte=date_to)
-
-    # Pagination
-    paginator = Paginator(items, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Same search form as the list view, but only active found items
+    query = ItemQuery(ItemSearchForm(request.GET), item_type='found', status='active')
     
     context = {
-        'page_obj': page_obj,
-        'search_form': search_form,
+        'page_obj': query.paginate(request),
+        'search_form': query.form,
+        'total_items': query.total,
         'item_type': 'found',
         'title': 'Found Items'
     }
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User
+from django.utils import timezone
+from .backends import invalidate_users
+from .models import OutgoingEmail, User
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -105,7 +107,11 @@ class UserAdmin(BaseUserAdmin):
     @admin.action(description='✅ Verify selected users')
     def verify_users(self, request, queryset):
         """Bulk action to verify multiple users at once"""
+        # update() sends no signals: drop the cached snapshots here
+        # (ids first, the queryset may be filtered on is_verified)
+        user_ids = list(queryset.values_list('pk', flat=True))
         updated = queryset.update(is_verified=True)
+        invalidate_users(user_ids)
         self.message_user(
             request,
             f'{updated} user(s) have been verified successfully.'
@@ -114,7 +120,9 @@ class UserAdmin(BaseUserAdmin):
     @admin.action(description='❌ Unverify selected users')
     def unverify_users(self, request, queryset):
         """Bulk action to unverify multiple users"""
+        user_ids = list(queryset.values_list('pk', flat=True))
         updated = queryset.update(is_verified=False)
+        invalidate_users(user_ids)
         self.message_user(
             request,
             f'{updated} user(s) have been unverified.'
@@ -127,3 +135,28 @@ class UserAdmin(BaseUserAdmin):
         """
         qs = super().get_queryset(request)
         return qs
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    """
+    Emails queued by the outbox (users/outbox.py), for checking on
+    delivery problems and retrying failed emails.
+    """
+    
+    list_display = ['to', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['to', 'subject']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+    actions = ['retry_emails']
+    
+    @admin.action(description='🔁 Retry selected emails now')
+    def retry_emails(self, request, queryset):
+        """Queue failed (or waiting) emails for the next worker batch"""
+        updated = queryset.exclude(status=OutgoingEmail.SENT).update(
+            status=OutgoingEmail.PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+        self.message_user(request, f'{updated} email(s) will be retried.')
@@ -9,3 +9,9 @@ class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
     verbose_name = 'User Management'
+
+    def ready(self):
+        # Register signal handlers (cached user snapshots)
+        from . import signals  # noqa: F401
+        # Register system checks (cached sessions need a shared cache)
+        from . import checks  # noqa: F401
@@ -0,0 +1,91 @@
+"""
+Cached user resolution for authenticated requests.
+
+AuthenticationMiddleware (and the chat socket's AuthMiddleware) load
+request.user through the session's backend on every request. With
+CachedModelBackend that is a cache read: a compact snapshot of the
+user's columns, kept for USER_CACHE_TIMEOUT seconds and rebuilt into a
+User without touching the database. Logging in (authenticate) works
+like ModelBackend, except that a failed login ends there instead of
+hashing the password again in the ModelBackend listed after it.
+
+Snapshots leave out the password hash: they carry the session auth hash
+(an HMAC of it) instead, which is all the per-request session check
+needs (see User.get_session_auth_hash). The rebuilt User has its
+password deferred; reading it loads it from the database.
+
+Snapshots are dropped whenever a User is saved or deleted (see
+users.signals), and by anything that changes users with
+QuerySet.update(), which sends no signals, through invalidate_users()
+(e.g. the admin's verify_users/unverify_users actions). Saving covers
+password changes (which change the session auth hash) and last_login
+updates.
+
+Invalidation reaches one cache, so the backend needs a cache shared by
+every worker process; settings only enable it with one, and the
+users.E002 check refuses it on a per-process cache outside DEBUG.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db import router
+
+
+def user_cache_key(user_id):
+    return f'user-snapshot:{user_id}'
+
+
+def _fields(user_model):
+    # Password hashes never go to the cache
+    return [field.attname for field in user_model._meta.concrete_fields if field.attname != 'password']
+
+
+def snapshot(user):
+    """The cached form of a user: its column names, values and session auth hash."""
+    names = _fields(type(user))
+    return (tuple(names), tuple(getattr(user, name) for name in names), user.get_session_auth_hash())
+
+
+def from_snapshot(user_model, data):
+    """A User rebuilt from snapshot(), or None if the columns changed since."""
+    try:
+        names, values, session_auth_hash = data
+    except ValueError:
+        return None
+    if list(names) != _fields(user_model):
+        return None
+    user = user_model.from_db(router.db_for_read(user_model), names, values)
+    user._session_auth_hash = session_auth_hash
+    return user
+
+
+def invalidate_users(user_ids):
+    """Drop the cached snapshots of some users."""
+    cache.delete_many([user_cache_key(user_id) for user_id in user_ids])
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that resolves session users from the cache."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username=username, password=password, **kwargs)
+        if user is None and password is not None:
+            # Don't let the ModelBackend after this one check the password again
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        user_model = get_user_model()
+        key = user_cache_key(user_id)
+        data = cache.get(key)
+        user = from_snapshot(user_model, data) if data is not None else None
+        if user is None:
+            try:
+                user = user_model._default_manager.get(pk=user_id)
+            except user_model.DoesNotExist:
+                return None
+            cache.set(key, snapshot(user), settings.USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,42 @@
+"""
+System checks for the users app.
+Registered in UsersConfig.ready().
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+CACHED_SESSION_ENGINES = [
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+]
+
+
+def _process_local_cache():
+    return settings.CACHES['default']['BACKEND'] in settings.PROCESS_LOCAL_CACHES
+
+
+@register(Tags.caches, Tags.security)
+def check_cached_auth(app_configs, **kwargs):
+    """
+    Cached sessions and user snapshots must live in a cache shared by all
+    workers: with a per-process one, a logout, password change or
+    deactivation only reaches the worker that handled it.
+    """
+    if settings.DEBUG or not _process_local_cache():
+        return []
+    errors = []
+    if settings.SESSION_ENGINE in CACHED_SESSION_ENGINES:
+        errors.append(Error(
+            f'SESSION_ENGINE {settings.SESSION_ENGINE!r} needs a shared cache.',
+            hint='Set CACHE_BACKEND to a shared cache (e.g. Redis) or use database sessions.',
+            id='users.E001',
+        ))
+    if 'users.backends.CachedModelBackend' in settings.AUTHENTICATION_BACKENDS:
+        errors.append(Error(
+            'users.backends.CachedModelBackend needs a shared cache.',
+            hint='Set CACHE_BACKEND to a shared cache (e.g. Redis) or use ModelBackend.',
+            id='users.E002',
+        ))
+    return errors
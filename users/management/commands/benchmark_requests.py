@@ -0,0 +1,65 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from users.models import User
+
+
+# (label, SESSION_ENGINE, authentication backend)
+CONFIGURATIONS = [
+    ('db sessions + ModelBackend',
+     'django.contrib.sessions.backends.db', 'django.contrib.auth.backends.ModelBackend'),
+    ('cached_db + cached users',
+     'django.contrib.sessions.backends.cached_db', 'users.backends.CachedModelBackend'),
+]
+
+PAGES = ['home', 'chat:unread_count', 'users:profile', 'items:my_items']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare database queries and time per authenticated request with '
+        'database sessions and ModelBackend against cached sessions and '
+        'cached user snapshots (users.backends).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per page and configuration (default 200).')
+        parser.add_argument('--pages', nargs='+', default=PAGES,
+                            help='URL names to request (default: %s).' % ' '.join(PAGES))
+
+    def handle(self, *args, **options):
+        username = f'benchmark-{uuid.uuid4().hex[:8]}'
+        user = User.objects.create_user(
+            username=username, email=f'{username}@pucit.edu.pk', is_verified=True,
+        )
+        self.stdout.write(f'{"page":<20}  {"configuration":<28}  {"queries/req":>11}  {"ms/req":>7}')
+        try:
+            for page in options['pages']:
+                url = reverse(page)
+                for label, engine, backend in CONFIGURATIONS:
+                    queries, elapsed = self.run(user, url, engine, backend, options['requests'])
+                    self.stdout.write(f'{page:<20}  {label:<28}  {queries:>11.2f}  {elapsed:>7.2f}')
+        finally:
+            user.delete()
+
+    def run(self, user, url, engine, backend, requests):
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(SESSION_ENGINE=engine, AUTHENTICATION_BACKENDS=[backend], ALLOWED_HOSTS=hosts):
+            client = Client()
+            client.force_login(user, backend=backend)
+            # Warm up (first request fills the caches)
+            client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for _ in range(requests):
+                    client.get(url)
+                elapsed = time.perf_counter() - start
+        return len(queries) / requests, elapsed * 1000 / requests
@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.outbox import OutboxSender
+
+
+class Command(BaseCommand):
+    help = (
+        'Send queued emails (users.OutgoingEmail) over one reused SMTP '
+        'connection, rate-limited and with retries. Runs until stopped, '
+        'or until nothing is due with --once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Send what is due now and exit.')
+        parser.add_argument('--batch-size', type=int, default=settings.EMAIL_OUTBOX_BATCH_SIZE,
+                            help='Emails claimed per batch.')
+        parser.add_argument('--poll-interval', type=float, default=settings.EMAIL_OUTBOX_POLL_INTERVAL,
+                            help='Seconds to wait when nothing is due.')
+
+    def handle(self, *args, **options):
+        sender = OutboxSender()
+        total_sent = total_failed = 0
+        try:
+            while True:
+                sent, failed = sender.send_batch(options['batch_size'])
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f'Sent {sent} emails, {failed} failed')
+                    continue
+                if options['once']:
+                    break
+                # Idle: don't hold the SMTP connection open
+                sender.close()
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sender.close()
+        self.stdout.write(self.style.SUCCESS(f'Sent {total_sent} emails, {total_failed} failed.'))
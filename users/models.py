@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 class User(AbstractUser):
     """
@@ -70,7 +71,17 @@ class User(AbstractUser):
     def get_full_name(self):
         """Return the user's full name"""
         return f"{self.first_name} {self.last_name}".strip() or self.username
-    
+
+    def get_session_auth_hash(self):
+        """
+        Users rebuilt from a cached snapshot (users.backends) carry their
+        session auth hash instead of the password hash, until the
+        password is loaded or set.
+        """
+        if 'password' not in self.__dict__ and '_session_auth_hash' in self.__dict__:
+            return self._session_auth_hash
+        return super().get_session_auth_hash()
+
     @property
     def is_verified_user(self):
         """
@@ -78,3 +89,46 @@ class User(AbstractUser):
         This property can be used in templates and views.
         """
         return self.is_verified and self.is_active
+
+
+class OutgoingEmail(models.Model):
+    """
+    An email waiting to be sent by the outbox worker (users/outbox.py).
+    
+    Rows are written in the same transaction as whatever the email is
+    about (e.g. the new user), so an email is queued if and only if that
+    change is committed, and requests never wait for the mail provider.
+    """
+    
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+    
+    to = models.EmailField()
+    from_email = models.CharField(max_length=254, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Not sent before this time (retry backoff, or a worker's claim)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Outgoing email'
+        verbose_name_plural = 'Outgoing emails'
+        ordering = ['-created_at']
+        indexes = [
+            # Worker: WHERE status = 'pending' AND next_attempt_at <= now
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoing_email_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} to {self.to} ({self.status})"
@@ -0,0 +1,182 @@
+"""
+Transactional email outbox.
+
+Views don't talk to the mail provider. queue_email() stores an
+OutgoingEmail in the caller's transaction, and the outbox worker
+(`manage.py send_outbox`) sends what is due:
+
+- Batches of up to EMAIL_OUTBOX_BATCH_SIZE emails are claimed by pushing
+  their next_attempt_at forward by claim_timeout(), long enough to send
+  the whole batch at EMAIL_OUTBOX_RATE with every send taking up to
+  EMAIL_TIMEOUT, so several workers never send the same email (one that
+  dies leaves its claim to expire). Each email is claimed again right
+  before it is sent, and skipped if another worker has taken it over.
+- A batch goes out over one SMTP connection, kept open between batches,
+  at most EMAIL_OUTBOX_RATE emails per second to stay within the
+  provider's quota.
+- A failed email is retried after EMAIL_OUTBOX_RETRY_DELAY seconds,
+  doubling with each attempt, and given up on (status "failed") after
+  EMAIL_OUTBOX_MAX_ATTEMPTS attempts, or at once if the provider refuses
+  the recipient or the email can't be sent at all (e.g. a header with a
+  newline).
+"""
+
+import logging
+import smtplib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+logger = logging.getLogger(__name__)
+
+# Added to every claim, for the database round trips around the sends
+CLAIM_MARGIN = timedelta(minutes=1)
+
+
+def queue_email(subject, body, to, from_email=None):
+    """
+    Queue an email; it is sent once the current transaction commits.
+    Without from_email, DEFAULT_FROM_EMAIL at the time of sending is used.
+    """
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        to=to,
+        from_email=from_email or '',
+    )
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt, after `attempts` failed ones."""
+    return timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def claim_timeout(batch_size):
+    """How long `batch_size` claimed emails are left alone by other workers."""
+    interval = 1 / settings.EMAIL_OUTBOX_RATE if settings.EMAIL_OUTBOX_RATE > 0 else 0
+    return timedelta(seconds=batch_size * (interval + settings.EMAIL_TIMEOUT)) + CLAIM_MARGIN
+
+
+def claim_batch(batch_size=None):
+    """Claim up to `batch_size` due emails for this worker, oldest first."""
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutgoingEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        OutgoingEmail.objects.filter(pk__in=ids).update(next_attempt_at=now + claim_timeout(len(ids)))
+    return list(OutgoingEmail.objects.filter(pk__in=ids).order_by('pk'))
+
+
+class OutboxSender:
+    """Sends claimed emails over one reused connection, rate-limited."""
+
+    def __init__(self, connection=None):
+        self.connection = connection or get_connection()
+        self._last_send = 0.0
+
+    def close(self):
+        self.connection.close()
+
+    def _wait_for_rate(self):
+        interval = 1 / settings.EMAIL_OUTBOX_RATE if settings.EMAIL_OUTBOX_RATE > 0 else 0
+        delay = self._last_send + interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._last_send = time.monotonic()
+
+    def _reclaim(self, email):
+        """
+        Renew this worker's claim on one email for the time it takes to
+        send it. False if the batch claim ran out and another worker
+        claimed the email since.
+        """
+        claimed_until = timezone.now() + claim_timeout(1)
+        renewed = OutgoingEmail.objects.filter(
+            pk=email.pk, status=OutgoingEmail.PENDING, next_attempt_at=email.next_attempt_at
+        ).update(next_attempt_at=claimed_until)
+        email.next_attempt_at = claimed_until
+        return bool(renewed)
+
+    def send(self, email):
+        """
+        Send one email and record the outcome. Returns True if sent, False
+        if it failed, None if another worker has it now.
+        """
+        self._wait_for_rate()
+        if not self._reclaim(email):
+            return None
+        message = EmailMessage(
+            email.subject, email.body, email.from_email or None, [email.to], connection=self.connection
+        )
+        try:
+            # Opens the connection if needed and keeps it open
+            self.connection.open()
+            message.send()
+        except (smtplib.SMTPException, OSError) as e:
+            self._failed(email, e)
+            # Start over with a fresh connection
+            self.connection.close()
+            return False
+        except Exception as e:
+            # The message itself is broken (BadHeaderError, UnicodeError,
+            # ...); sending it again won't help
+            self._failed(email, e, permanent=True)
+            self.connection.close()
+            return False
+        email.status = OutgoingEmail.SENT
+        email.attempts += 1
+        email.sent_at = timezone.now()
+        email.last_error = ''
+        email.save(update_fields=['status', 'attempts', 'sent_at', 'last_error'])
+        return True
+
+    def _failed(self, email, error, permanent=False):
+        email.attempts += 1
+        email.last_error = f'{type(error).__name__}: {error}'
+        permanent = permanent or isinstance(error, smtplib.SMTPRecipientsRefused)
+        if permanent or email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            email.status = OutgoingEmail.FAILED
+            logger.error('Giving up on email %s to %s: %s', email.pk, email.to, email.last_error)
+        else:
+            email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+            logger.warning('Email %s to %s failed (attempt %d): %s',
+                           email.pk, email.to, email.attempts, email.last_error)
+        email.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error'])
+
+    def send_batch(self, batch_size=None):
+        """Claim and send one batch. Returns (sent, failed)."""
+        sent = failed = 0
+        for email in claim_batch(batch_size):
+            result = self.send(email)
+            if result:
+                sent += 1
+            elif result is not None:
+                failed += 1
+        return sent, failed
+
+
+def drain(batch_size=None, connection=None):
+    """Send everything that is due now. Returns (sent, failed)."""
+    sender = OutboxSender(connection)
+    sent = failed = 0
+    try:
+        while True:
+            batch_sent, batch_failed = sender.send_batch(batch_size)
+            if not batch_sent and not batch_failed:
+                return sent, failed
+            sent += batch_sent
+            failed += batch_failed
+    finally:
+        sender.close()
@@ -0,0 +1,20 @@
+"""
+Signal handlers for the users app.
+Connected in UsersConfig.ready().
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import invalidate_users
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def expire_user_snapshot(sender, instance, **kwargs):
+    """Drop the cached snapshot of a changed user"""
+    invalidate_users([instance.pk])
+    # Again once committed, in case a request cached the old row meanwhile
+    transaction.on_commit(lambda: invalidate_users([instance.pk]))
@@ -1,9 +1,90 @@
-from django.test import TestCase
+import socketserver
+import threading
+import time
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+
+from .backends import user_cache_key
+from .checks import check_cached_auth
+from .models import OutgoingEmail
+from .outbox import OutboxSender, claim_batch, drain, queue_email
 
 User = get_user_model()
 
 
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    A minimal SMTP stand-in on 127.0.0.1 for outbox tests: accepts every
+    email unless told to fail the next DATA commands or refuse recipients.
+    """
+    
+    allow_reuse_address = True
+    daemon_threads = True
+    
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), LocalSMTPHandler)
+        self.port = self.server_address[1]
+        self.connections = 0
+        self.messages = []
+        self.fail_data = 0
+        self.refused = set()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+    
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class LocalSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+    
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply('220 localhost ready')
+        recipients = []
+        for raw in self.rfile:
+            command = raw.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip(' <>')
+                if address in server.refused:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for data in self.rfile:
+                    if data.rstrip(b'\r\n') == b'.':
+                        break
+                    lines.append(data.decode())
+                if server.fail_data:
+                    server.fail_data -= 1
+                    self.reply('451 Try again later')
+                else:
+                    server.messages.append((recipients, ''.join(lines)))
+                    self.reply('250 Queued')
+                recipients = []
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                # MAIL, RSET, NOOP
+                if verb == 'RSET':
+                    recipients = []
+                self.reply('250 OK')
+
+
 class UserModelTests(TestCase):
     """
     Test cases for the custom User model.
@@ -114,3 +195,279 @@ class UserLoginTests(TestCase):
         
         # Should redirect after successful login
         self.assertEqual(response.status_code, 302)
+
+
+class EmailOutboxTests(TestCase):
+    """
+    Test cases for the email outbox, against a local SMTP stand-in.
+    """
+    
+    def setUp(self):
+        """Start the SMTP stand-in and point the SMTP backend at it"""
+        self.smtp = LocalSMTPServer()
+        self.addCleanup(self.smtp.stop)
+        smtp_settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.smtp.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            DEFAULT_FROM_EMAIL='noreply@pucit.edu.pk',
+            EMAIL_OUTBOX_RATE=0,
+            EMAIL_OUTBOX_RETRY_DELAY=60,
+            EMAIL_OUTBOX_MAX_ATTEMPTS=3,
+        )
+        smtp_settings.enable()
+        self.addCleanup(smtp_settings.disable)
+    
+    def queue(self, count):
+        return [
+            queue_email(f'Subject {i}', f'Body {i}', f'student{i}@pucit.edu.pk')
+            for i in range(count)
+        ]
+    
+    def test_registration_queues_email_without_sending(self):
+        """Test that registering writes the email but doesn't contact SMTP"""
+        response = self.client.post('/users/register/', {
+            'username': 'newstudent',
+            'email': 'newstudent@pucit.edu.pk',
+            'first_name': 'New',
+            'last_name': 'Student',
+            'password1': 'complexpass123',
+            'password2': 'complexpass123',
+        })
+        
+        self.assertRedirects(response, '/users/login/', fetch_redirect_response=False)
+        user = User.objects.get(username='newstudent')
+        self.assertFalse(user.is_active)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.to, 'newstudent@pucit.edu.pk')
+        self.assertEqual(email.status, OutgoingEmail.PENDING)
+        self.assertIn('/users/activate/', email.body)
+        self.assertEqual(self.smtp.connections, 0)
+        
+        self.assertEqual(drain(), (1, 0))
+        self.assertEqual(self.smtp.messages[0][0], ['newstudent@pucit.edu.pk'])
+    
+    def test_batch_is_sent_over_one_connection(self):
+        """Test that draining sends every due email over one SMTP connection"""
+        self.queue(5)
+        
+        self.assertEqual(drain(batch_size=2), (5, 0))
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(len(self.smtp.messages), 5)
+        self.assertFalse(OutgoingEmail.objects.exclude(status=OutgoingEmail.SENT).exists())
+    
+    def test_failed_email_is_retried_with_backoff(self):
+        """Test that a temporary failure is retried later, doubling the delay"""
+        first, second = self.queue(2)
+        self.smtp.fail_data = 1
+        
+        with self.assertLogs('users.outbox', 'WARNING'):
+            self.assertEqual(drain(), (1, 1))
+        first.refresh_from_db()
+        self.assertEqual(first.status, OutgoingEmail.PENDING)
+        self.assertEqual(first.attempts, 1)
+        self.assertIn('451', first.last_error)
+        self.assertAlmostEqual(
+            (first.next_attempt_at - timezone.now()).total_seconds(), 60, delta=5
+        )
+        second.refresh_from_db()
+        self.assertEqual(second.status, OutgoingEmail.SENT)
+        
+        # Not due yet
+        self.assertEqual(drain(), (0, 0))
+        OutgoingEmail.objects.filter(pk=first.pk).update(next_attempt_at=timezone.now())
+        self.smtp.fail_data = 1
+        with self.assertLogs('users.outbox', 'WARNING'):
+            self.assertEqual(drain(), (0, 1))
+        first.refresh_from_db()
+        self.assertAlmostEqual(
+            (first.next_attempt_at - timezone.now()).total_seconds(), 120, delta=5
+        )
+        OutgoingEmail.objects.filter(pk=first.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(drain(), (1, 0))
+    
+    def test_gives_up_on_refused_recipients_and_after_max_attempts(self):
+        """Test that emails end up failed instead of retrying forever"""
+        refused, flaky = self.queue(2)
+        self.smtp.refused.add(refused.to)
+        self.smtp.fail_data = 3
+        
+        for _ in range(3):
+            with self.assertLogs('users.outbox', 'WARNING'):
+                drain()
+            OutgoingEmail.objects.filter(status=OutgoingEmail.PENDING).update(
+                next_attempt_at=timezone.now() - timedelta(seconds=1)
+            )
+        
+        refused.refresh_from_db()
+        self.assertEqual(refused.status, OutgoingEmail.FAILED)
+        self.assertEqual(refused.attempts, 1)
+        flaky.refresh_from_db()
+        self.assertEqual(flaky.status, OutgoingEmail.FAILED)
+        self.assertEqual(flaky.attempts, 3)
+        self.assertEqual(drain(), (0, 0))
+    
+    @override_settings(EMAIL_OUTBOX_RATE=20)
+    def test_sending_is_rate_limited(self):
+        """Test that emails are spaced out to EMAIL_OUTBOX_RATE per second"""
+        self.queue(4)
+        
+        start = time.monotonic()
+        self.assertEqual(drain(), (4, 0))
+        self.assertGreaterEqual(time.monotonic() - start, 3 / 20)
+    
+    def test_unsendable_email_fails_at_once(self):
+        """Test that an email Django refuses to send is failed, not retried or left claimed"""
+        broken, good = self.queue(2)
+        OutgoingEmail.objects.filter(pk=broken.pk).update(subject='Hello\nBcc: everyone@pucit.edu.pk')
+        
+        with self.assertLogs('users.outbox', 'ERROR'):
+            self.assertEqual(drain(), (1, 1))
+        broken.refresh_from_db()
+        self.assertEqual(broken.status, OutgoingEmail.FAILED)
+        self.assertEqual(broken.attempts, 1)
+        self.assertIn('BadHeaderError', broken.last_error)
+        self.assertEqual(len(self.smtp.messages), 1)
+        self.assertIn(good.to, self.smtp.messages[0][0])
+    
+    @override_settings(EMAIL_OUTBOX_RATE=0.5, EMAIL_TIMEOUT=10)
+    def test_claim_covers_the_whole_batch(self):
+        """Test that a batch is claimed for as long as sending it may take"""
+        self.queue(30)
+        
+        before = timezone.now()
+        batch = claim_batch(30)
+        # 30 emails, 2 s apart, each waiting up to 10 s on the provider
+        self.assertGreater(batch[0].next_attempt_at - before, timedelta(seconds=30 * 12))
+        self.assertEqual(len(claim_batch(30)), 0)
+    
+    def test_email_taken_over_by_another_worker_is_skipped(self):
+        """Test that an email whose claim ran out and was claimed again isn't sent twice"""
+        self.queue(2)
+        taken, mine = claim_batch(2)
+        OutgoingEmail.objects.filter(pk=taken.pk).update(next_attempt_at=timezone.now() + timedelta(hours=1))
+        
+        sender = OutboxSender()
+        self.addCleanup(sender.close)
+        self.assertIsNone(sender.send(taken))
+        self.assertTrue(sender.send(mine))
+        self.assertEqual([recipients for recipients, _ in self.smtp.messages], [[mine.to]])
+        taken.refresh_from_db()
+        self.assertEqual(taken.status, OutgoingEmail.PENDING)
+        self.assertEqual(taken.attempts, 0)
+
+
+CACHED_AUTH = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+    'AUTHENTICATION_BACKENDS': [
+        'users.backends.CachedModelBackend',
+        'django.contrib.auth.backends.ModelBackend',
+    ],
+}
+
+
+@override_settings(**CACHED_AUTH)
+class CachedUserTests(TestCase):
+    """
+    Test cases for cached sessions and user snapshots.
+    """
+    
+    def setUp(self):
+        """Log in a verified user"""
+        self.user = User.objects.create_user(
+            username='cached',
+            email='cached@pucit.edu.pk',
+            password='testpass123',
+            first_name='Cached',
+            is_verified=True,
+        )
+        self.client.force_login(self.user)
+    
+    def test_authenticated_request_needs_no_queries(self):
+        """Test that the session and request.user come from the cache"""
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertContains(response, 'Cached')
+        self.assertTrue(response.context['user'].is_verified)
+    
+    def test_saving_a_user_drops_the_snapshot(self):
+        """Test that profile changes show up on the next request"""
+        self.client.get('/')
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertContains(self.client.get('/'), 'Renamed')
+    
+    def test_deactivated_user_is_logged_out(self):
+        """Test that a cached snapshot doesn't keep a deactivated user in"""
+        self.client.get('/')
+        self.user.is_active = False
+        self.user.save()
+        
+        response = self.client.get(reverse('users:profile'))
+        self.assertEqual(response.status_code, 302)
+    
+    def test_admin_verify_actions_drop_snapshots(self):
+        """Test that bulk (un)verifying users invalidates their snapshots"""
+        admin = User.objects.create_superuser(username='admin', email='admin@pucit.edu.pk', password='x')
+        self.client.get('/')
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        
+        admin_client = self.client_class()
+        admin_client.force_login(admin)
+        admin_client.post(reverse('admin:users_user_changelist'), {
+            'action': 'unverify_users',
+            '_selected_action': [self.user.pk],
+        })
+        
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        response = self.client.get('/')
+        self.assertFalse(response.context['user'].is_verified)
+    
+    def test_snapshot_has_no_password_hash(self):
+        """Test that password hashes never reach the cache"""
+        self.client.get('/')
+        names, values, session_auth_hash = cache.get(user_cache_key(self.user.pk))
+        self.assertNotIn('password', names)
+        self.assertNotIn(self.user.password, values)
+        self.assertEqual(session_auth_hash, self.user.get_session_auth_hash())
+    
+    def test_password_change_logs_other_sessions_out(self):
+        """Test that the session hash check still works with cached users"""
+        self.client.get('/')
+        self.user.set_password('newpass456')
+        self.user.save()
+        
+        response = self.client.get(reverse('users:profile'))
+        self.assertEqual(response.status_code, 302)
+    
+    def test_model_backend_sessions_still_resolve(self):
+        """Test that sessions logged in through ModelBackend stay logged in"""
+        client = self.client_class()
+        client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        
+        response = client.get(reverse('users:profile'))
+        self.assertEqual(response.status_code, 200)
+    
+    def test_failed_login_hashes_once(self):
+        """Test that a wrong password isn't checked again by ModelBackend"""
+        with self.assertNumQueries(1):
+            logged_in = self.client_class().login(username='cached', password='wrong')
+        self.assertFalse(logged_in)
+    
+    def test_check_refuses_process_local_cache(self):
+        """Test that cached auth on a per-process cache fails the system checks"""
+        with override_settings(DEBUG=False):
+            errors = check_cached_auth(None)
+        self.assertEqual([error.id for error in errors], ['users.E001', 'users.E002'])
+        with override_settings(DEBUG=True):
+            self.assertEqual(check_cached_auth(None), [])
+        with override_settings(DEBUG=False, CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp'},
+        }):
+            self.assertEqual(check_cached_auth(None), [])
@@ -4,15 +4,15 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.generic import CreateView
 from django.urls import reverse_lazy
-from django.core.mail import send_mail
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.sites.shortcuts import get_current_site
-from django.conf import settings
 from .forms import UserRegistrationForm, UserLoginForm
 from .models import User
+from .outbox import queue_email
 
 
 def register_view(request):
@@ -22,7 +22,7 @@ def register_view(request):
     Features:
     - Only @pucit.edu.pk emails allowed (handled by form)
     - New users are created with is_verified=False and is_active=False
-    - Sends verification email with token
+    - Queues a verification email with token (sent by the outbox worker)
     """
     if request.user.is_authenticated:
         return redirect('home')
@@ -30,21 +30,25 @@ def register_view(request):
     if request.method == 'POST':
         form = UserRegistrationForm(request.POST)
         if form.is_valid():
-            user = form.save(commit=False)
-            user.is_active = False  # Prevent login until verified
-            user.is_verified = False
-            user.save()
-            
-            # Generate verification token
-            current_site = get_current_site(request)
-            mail_subject = 'Activate your Campus Connect account'
-            uid = urlsafe_base64_encode(force_bytes(user.pk))
-            token = default_token_generator.make_token(user)
-            
-            # Construct activation link
-            activation_link = f"http://{current_site.domain}/users/activate/{uid}/{token}/"
-            
-            message = f"""
+            # The user and their verification email are saved together:
+            # the outbox worker sends it, so the request doesn't wait for
+            # the mail provider and a failed send doesn't lose the account
+            with transaction.atomic():
+                user = form.save(commit=False)
+                user.is_active = False  # Prevent login until verified
+                user.is_verified = False
+                user.save()
+                
+                # Generate verification token
+                current_site = get_current_site(request)
+                mail_subject = 'Activate your Campus Connect account'
+                uid = urlsafe_base64_encode(force_bytes(user.pk))
+                token = default_token_generator.make_token(user)
+                
+                # Construct activation link
+                activation_link = f"http://{current_site.domain}/users/activate/{uid}/{token}/"
+                
+                message = f"""
             Hi {user.first_name},
             
             Please click on the link below to verify your email and activate your account:
@@ -52,24 +56,14 @@ def register_view(request):
             
             If you did not register for this account, please ignore this email.
             """
+                
+                queue_email(mail_subject, message, user.email)
             
-            try:
-                send_mail(
-                    mail_subject,
-                    message,
-                    settings.EMAIL_HOST_USER,
-                    [user.email],
-                    fail_silently=False,
-                )
-                messages.success(
-                    request,
-                    f'Account created! A verification email has been sent to {user.email}. '
-                    'Please check your inbox to activate your account.'
-                )
-            except Exception as e:
-                messages.error(request, f'Error sending email: {str(e)}')
-                user.delete() # Delete user if email fails
-                return redirect('users:register')
+            messages.success(
+                request,
+                f'Account created! A verification email will be sent to {user.email} shortly. '
+                'Please check your inbox to activate your account.'
+            )
             
             return redirect('users:login')
         else:
@@ -204,31 +198,16 @@ def dashboard_view(request):
             'Your account is pending verification. Some features are limited.'
         )
     
-    # Get items statistics if user is authenticated
-    items_stats = {}
-    recent_items = []
+    # The user's item counts and recent items (two queries in all)
+    summary = None
     
     if request.user.is_authenticated:
-        from items.models import Item
-        
-        # User's items statistics
-        user_items = Item.objects.filter(user=request.user)
-        items_stats = {
-            'total': user_items.count(),
-            'pending': user_items.filter(is_approved=False).count(),
-            'approved': user_items.filter(is_approved=True, status='active').count(),
-            'closed': user_items.filter(status__in=['claimed', 'returned', 'closed']).count(),
-        }
+        from items.summary import owner_summary
         
-        # Recent approved items (all users)
-        recent_items = Item.objects.filter(
-            is_approved=True,
-            status='active'
-        ).select_related('user').order_by('-created_at')[:5]
+        summary = owner_summary(request.user)
     
     context = {
         'title': 'Dashboard - Campus Connect',
-        'items_stats': items_stats,
-        'recent_items': recent_items,
+        'summary': summary,
     }
     return render(request, 'users/dashboard.html', context)